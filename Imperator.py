@@ -1,25 +1,54 @@
 import os
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
-import pandas as pd
+try:
+    import tkinter as tk
+    from tkinter import filedialog, messagebox, simpledialog, ttk
+except ImportError:  # serveur sans Tk : seules les fonctions de traitement sont utilisables
+    tk = filedialog = messagebox = simpledialog = ttk = None
+import functools
+import threading
 import time
-from mistralai import Mistral
-from PyPDF2 import PdfReader, PdfWriter
-import tempfile
+import itertools
 from dotenv import load_dotenv
 import re
+import sys
+import argparse
+import queue
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from nettoyage import NUMEROTATION, PROFILS, nettoyer_pages, nettoyer_texte
+from classeurs import lire_paires
+from sortie_excel import sortie_pour
+import archive_ocr
+from clients_mistral import PoolClients, en_pool
+import appariement_llm
+import cache_ocr
+import estimation
+import langues
+from decoupage_pdf import DECOUPES, lecteur_pdf, lots_pdf, nombre_pages
+from doublons import filtrer_quasi_doublons, indexer_paires
+from table_paires import TablePaires
+import metriques
+import profilage
 
 # --- Chargement des variables d’environnement ---
 load_dotenv()
-client = Mistral(api_key=os.getenv("MISTRAL_KEY"))
+# Pool de clés Mistral (MISTRAL_KEYS ou MISTRAL_KEY, voir clients_mistral.py) ;
+# MISTRAL_SERVER_URL permet de viser un serveur local (bench/faux_serveurs.py)
+clients = PoolClients.depuis_env()
 
 # 🔹 Agents différents selon le mode choisi
-AGENT_ID_RECTO_VERSO = os.getenv("MISTRAL_AGENT_RECTO_VERSO")
-AGENT_ID_COMBINE = os.getenv("MISTRAL_AGENT_RECTO_VERSO")
-AGENT_ID_MANUEL = os.getenv("MISTRAL_AGENT_RECTO_VERSO")
+AGENT_ID_RECTO_VERSO = clients.agent("recto_verso")
+AGENT_ID_COMBINE = clients.agent("combine")
+AGENT_ID_MANUEL = clients.agent("manuel")
 
-ANKI_CONNECT_URL = "http://localhost:8765"
+ANKI_CONNECT_URL = os.getenv("ANKI_CONNECT_URL", "http://localhost:8765")
+TAILLE_LOT_ANKI = 500
+
+# Requêtes Mistral simultanées par clé (chaque clé du pool a son propre limiteur)
+MAX_REQUETES_MISTRAL = int(os.getenv("MISTRAL_MAX_REQUETES", "4"))
+
+# Lignes d'une fin de page qui peuvent être reportées sur la page suivante (appariement recto / verso)
+DEBORDEMENT = int(os.getenv("IMPERATOR_DEBORDEMENT", "8"))
 
 
 # --- Vérifier la connexion à AnkiConnect ---
@@ -33,124 +62,214 @@ def test_anki_connection():
     return False
 
 
-# --- Envoyer un fichier Excel vers Anki ---
-def send_to_anki(excel_path, deck_name="RectoVerso", model_name="Basic", field_front="Recto", field_back="Verso"):
+# --- Envoyer un fichier Excel vers Anki (sans interface) ---
+def envoyer_excel_vers_anki(excel_path, deck_name="RectoVerso", model_name="Basic", field_front="Recto", field_back="Verso"):
+    """Ajoute les cartes du fichier dans Anki et renvoie le nombre de notes créées."""
     if not os.path.exists(excel_path):
-        messagebox.showerror("Erreur", f"Le fichier {excel_path} n’existe pas.")
-        return
+        raise FileNotFoundError(f"Le fichier {excel_path} n’existe pas.")
 
     if not test_anki_connection():
-        messagebox.showerror(
-            "Erreur",
+        raise ConnectionError(
             "AnkiConnect ne répond pas.\nAssure-toi qu’Anki est ouvert et que le module AnkiConnect est installé."
         )
-        return
 
-    df = pd.read_excel(excel_path)
     added = 0
+    # Lecture en flux (classeurs.py) et addNotes par lots : une requête pour TAILLE_LOT_ANKI cartes
+    for lot in lots_de_notes(lire_paires(excel_path, field_front, field_back), deck_name, model_name,
+                             field_front, field_back):
+        with metriques.span("anki"):
+            res = requests.post(ANKI_CONNECT_URL, json={
+                "action": "addNotes", "version": 6, "params": {"notes": lot}}).json()
+        metriques.compter("appels_anki")
+        added += sum(1 for note_id in (res.get("result") or []) if note_id)
+
+    metriques.compter("notes_anki", added)
+    return added
+
+
+def lots_de_notes(paires, deck_name="RectoVerso", model_name="Basic", field_front="Recto", field_back="Verso",
+                  taille=None):
+    """Regroupe un flux de paires (recto, verso) en listes de notes AnkiConnect."""
+    taille = taille or TAILLE_LOT_ANKI
+    lot = []
+    for recto, verso in paires:
+        lot.append({
+            "deckName": deck_name,
+            "modelName": model_name,
+            "fields": {field_front: recto, field_back: verso},
+            "tags": ["auto_import"],
+        })
+        if len(lot) >= taille:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
 
-    for _, row in df.iterrows():
-        recto = str(row.get(field_front, "")).strip()
-        verso = str(row.get(field_back, "")).strip()
-        if not recto or not verso:
-            continue
 
-        payload = {
-            "action": "addNote",
-            "version": 6,
-            "params": {
-                "note": {
-                    "deckName": deck_name,
-                    "modelName": model_name,
-                    "fields": {field_front: recto, field_back: verso},
-                    "tags": ["auto_import"]
-                }
-            }
-        }
-
-        res = requests.post(ANKI_CONNECT_URL, json=payload).json()
-        if res.get("error") is None:
-            added += 1
+# --- Envoyer un fichier Excel vers Anki ---
+def send_to_anki(excel_path, deck_name="RectoVerso", model_name="Basic", field_front="Recto", field_back="Verso"):
+    try:
+        with metriques.execution(mode="anki", deck=deck_name) as m:
+            added = envoyer_excel_vers_anki(excel_path, deck_name, model_name, field_front, field_back)
+    except (FileNotFoundError, ConnectionError) as e:
+        messagebox.showerror("Erreur", str(e))
+        return
+    ecrire_metriques(m, excel_path)
 
     messagebox.showinfo("Anki", f"✅ {added} cartes ajoutées au deck '{deck_name}' avec succès !")
 
 
+# --- Lecture des cartes (Recto, Verso) d'un DataFrame ---
+def cartes_depuis_dataframe(df, field_front="Recto", field_back="Verso"):
+    if field_front not in df.columns or field_back not in df.columns:
+        return []
+    # Colonnes entières converties d'un coup (iterrows crée une Series par ligne) ; cellules vides ignorées
+    rectos = df[field_front].fillna("").astype(str).str.strip()
+    versos = df[field_back].fillna("").astype(str).str.strip()
+    return [(recto, verso) for recto, verso in zip(rectos, versos) if recto and verso]
+
+
 # --- UTILITAIRE EXCEL : append sécurisé ---
 def safe_append_to_excel(new_data, output_excel):
-    df_new = pd.DataFrame(new_data, columns=["Recto", "Verso"])
-    if os.path.exists(output_excel):
-        try:
-            df_existing = pd.read_excel(output_excel)
-            df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-        except Exception:
-            df_combined = df_new
-    else:
-        df_combined = df_new
+    # Verrou fichier + ajouts concurrents fusionnés en une écriture (voir sortie_excel.py)
+    with metriques.span("ecriture_excel"):
+        sortie_pour(output_excel).ajouter(new_data)
 
-    df_combined.drop_duplicates(subset=["Recto", "Verso"], inplace=True)
-    df_combined.to_excel(output_excel, index=False)
+
+def ecrire_metriques(m, output_excel):
+    """Écrit le rapport JSON / Prometheus de l'exécution à côté du fichier de sortie."""
+    try:
+        m.ecrire(output_excel)
+    except OSError as e:
+        print(f"⚠️ Métriques non écrites : {e}")
+    estimation.historiser(m.rapport())
+
+
+# --- Sélection de pages ---
+def analyser_pages(spec, total_pages):
+    """"1-10,15,20-" -> indices (à partir de 0) triés des pages choisies ; spec vide -> toutes les pages."""
+    if not spec or not spec.strip():
+        return list(range(total_pages))
+    pages = set()
+    for morceau in spec.replace(" ", "").split(","):
+        if not morceau:
+            continue
+        m = re.fullmatch(r"(\d*)(-?)(\d*)", morceau)
+        if not m or not (m.group(1) or m.group(3)):
+            raise ValueError(f"Plage de pages invalide : {morceau!r} (ex. 1-10,15)")
+        debut = int(m.group(1) or 1)
+        fin = int(m.group(3) or total_pages) if m.group(2) else debut
+        if debut < 1 or debut > fin or debut > total_pages:
+            raise ValueError(f"Plage de pages invalide : {morceau!r} (le PDF a {total_pages} pages)")
+        pages.update(range(debut - 1, min(fin, total_pages)))
+    return sorted(pages)
 
 
 # --- OCR par lots ---
-def process_pdf_with_mistral(pdf_path, agent_id, pages_per_batch=10):
-    reader = PdfReader(pdf_path)
-    total_pages = len(reader.pages)
+def process_pdf_with_mistral(pdf_path, agent_id, pages_per_batch=10, pages=None, shards=1):
+    """Texte OCR des pages choisies, pages dans l'ordre (voir pages_ocr)."""
+    return "\n".join(texte for _, texte in pages_ocr(pdf_path, pages_per_batch, pages, shards))
+
+
+def pages_ocr(pdf_path, pages_per_batch=10, pages=None, shards=1, moitie=None):
+    """OCR des pages choisies (`pages`, ex. "1-10,15") ; renvoie [(numéro de page, markdown)].
+
+    Les pages déjà passées à l'OCR (aperçu, traitement précédent) sont lues dans le
+    cache (cache_ocr.py). Avec shards > 1, les pages restantes sont réparties en
+    `shards` plages contiguës traitées en parallèle. Avec `moitie` ("gauche", "haut"...),
+    seule cette moitié de chaque page passe à l'OCR (decoupage_pdf.rogner).
+    """
+    selection = analyser_pages(pages, nombre_pages(pdf_path))
+    empreinte, en_cache = cache_ocr.pages_en_cache(pdf_path, [i + 1 for i in selection], cache_ocr.variante(moitie))
+    selection = [i for i in selection if i + 1 not in en_cache]
+    if shards <= 1 or len(selection) <= pages_per_batch:
+        faites = ocr_pages(pdf_path, selection, pages_per_batch, empreinte, moitie)
+    else:
+        taille = -(-len(selection) // shards)
+        plages = [selection[i:i + taille] for i in range(0, len(selection), taille)]
+        # Chaque lot ouvre son propre PdfReader (decoupage_pdf) : rien n'est partagé entre threads
+        with ThreadPoolExecutor(max_workers=len(plages)) as pool:
+            futurs = [pool.submit(metriques.propager(ocr_pages), pdf_path, plage, pages_per_batch, empreinte, moitie)
+                      for plage in plages]
+            faites = [page for futur in futurs for page in futur.result()]
+    return sorted([*en_cache.items(), *faites])
+
+
+def ocr_pages(pdf_path, indices, pages_per_batch=10, empreinte=None, moitie=None):
+    """OCR des pages `indices` du PDF, par lots de `pages_per_batch` ; renvoie [(numéro de page, markdown)].
+
+    Chaque lot est mis en cache dès sa réception (sous `empreinte`) : un traitement
+    interrompu (erreur, budget atteint) reprend sans repayer les pages déjà faites.
+    """
     all_text = []
-    for start in range(0, total_pages, pages_per_batch):
-        end = min(start + pages_per_batch, total_pages)
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_pdf:
-            pdf_writer = PdfWriter()
-            for i in range(start, end):
-                pdf_writer.add_page(reader.pages[i])
-            pdf_writer.write(temp_pdf)
-            temp_path = temp_pdf.name
-
-        with open(temp_path, "rb") as f:
-            upload_res = client.files.upload(
-                file={"file_name": f"chunk_{start+1}_to_{end}.pdf", "content": f},
-                purpose="ocr"
-            )
-        file_id = upload_res.id
-        signed = client.files.get_signed_url(file_id=file_id)
-        document_url = signed.url
-
-        ocr_res = client.ocr.process(
+    for nom, contenu, lot in lots_pdf(pdf_path, indices, pages_per_batch, moitie):
+        # Les trois appels d'un lot restent sur la même clé (le fichier n'existe que pour elle)
+        ocr_res = clients.appeler(functools.partial(ocr_lot, nom=nom, contenu=contenu),
+                                  depense={"pages": len(lot), "appels_api": 3})
+        del contenu  # plus aucune référence (partial libéré) : libéré avant la construction du lot suivant
+        metriques.compter("chunks")
+        metriques.compter("appels_api", 3)
+
+        textes = textes_des_pages(ocr_res, lot)
+        cache_ocr.memoriser(empreinte, textes, cache_ocr.variante(moitie))
+        all_text.extend(textes)
+    return all_text
+
+
+def ocr_lot(client, nom, contenu):
+    """Upload d'un lot, URL signée puis OCR, avec un client donné."""
+    with metriques.span("upload"):
+        upload_res = client.files.upload(file={"file_name": nom, "content": contenu}, purpose="ocr")
+    with metriques.span("url_signee"):
+        signed = client.files.get_signed_url(file_id=upload_res.id)
+    with metriques.span("ocr"):
+        return client.ocr.process(
             model="mistral-ocr-latest",
-            document={"type": "document_url", "document_url": document_url},
+            document={"type": "document_url", "document_url": signed.url},
             include_image_base64=False
         )
 
-        pages = getattr(ocr_res, "pages", None) or getattr(ocr_res, "output", None)
-        if not pages:
-            continue
-        for page in pages:
-            if hasattr(page, "markdown"):
-                all_text.append(page.markdown)
-            elif isinstance(page, str):
-                all_text.append(page)
-        os.remove(temp_path)
-    return "\n".join(all_text)
+
+def textes_des_pages(ocr_res, lot):
+    """[(numéro de page, markdown)] d'une réponse OCR pour le lot `lot` (indices des pages envoyées).
+
+    Chaque page est rattachée par son `index` dans le lot, pas par sa position : une page
+    absente de la réponse ne décale pas les suivantes (elle n'est pas mise en cache et
+    sera refaite au prochain traitement).
+    """
+    pages = getattr(ocr_res, "pages", None) or getattr(ocr_res, "output", None) or []
+    metriques.compter("pages", len(pages))
+    textes = []
+    for rang, page in enumerate(pages):
+        texte = page if isinstance(page, str) else getattr(page, "markdown", None)
+        index = getattr(page, "index", rang)
+        if texte is not None and 0 <= index < len(lot):
+            textes.append((lot[index] + 1, texte))
+    if len(textes) < len(lot):
+        recues = {numero for numero, _ in textes}
+        manquantes = [i + 1 for i in lot if i + 1 not in recues]
+        print(f"⚠️ Page(s) absente(s) de la réponse OCR : {', '.join(map(str, manquantes))}")
+    return textes
 
 
 # =======================================================
 # 🔹 NOUVELLES FONCTIONS DE CLEANING ET VÉRIFICATION
 # =======================================================
 
-def nettoyer_texte_brut(texte):
-    """Nettoie le texte OCR : supprime les titres, espaces, caractères inutiles."""
-    texte = re.sub(r'\b(Thème|Corrigé|Exercice|Partie|VOCABULAIRE|Chapitre|Première|Exercices|Troisièm e )\b.*', '', texte, flags=re.IGNORECASE)
-    texte = re.sub(r'#{1,}|={2,}|-{2,}', '', texte)
-    texte = re.sub(r'\s{2,}', ' ', texte)
-    lignes = [l.strip() for l in texte.split('\n') if l.strip()]
-    return lignes
+def nettoyer_texte_brut(texte, profil="defaut"):
+    """Nettoie le texte OCR : supprime les titres, espaces, caractères inutiles (voir nettoyage.PROFILS)."""
+    with metriques.span("nettoyage"):
+        return nettoyer_texte(texte, profil)
 
 
-def verifier_traduction(L1, L2, client, seuil_similarite=0.6):
-    """
-    Vérifie si la phrase  correspond bien à la traduction .
-    Retourne True si les deux phrases ont le même sens.
-    """
-    prompt = f"""
+def nettoyer_pages_brutes(pages, profil="defaut"):
+    """Nettoie les pages OCR [(numéro, markdown)] ; chaque ligne garde sa page (nettoyage.LignesPaginees)."""
+    with metriques.span("nettoyage"):
+        return nettoyer_pages(pages, profil)
+
+
+def prompt_verification(L1, L2):
+    return f"""
     Tu es un vérificateur bilingue. 
     Compare ces deux phrases et réponds par OUI si la seconde est une traduction fidèle de la première, sinon NON.
     Phrase  : "{L1}"
@@ -158,32 +277,70 @@ def verifier_traduction(L1, L2, client, seuil_similarite=0.6):
     Réponse attendue : OUI ou NON uniquement.
     """
 
-    try:
-        response = client.chat.complete(
-            model="mistral-large-latest",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=3,
-            temperature=0.0
-        )
 
-        # ✅ Nouvelle structure de réponse
-        if hasattr(response, "choices") and len(response.choices) > 0:
-            content = response.choices[0].message.content.strip().upper()
-        else:
-            print("⚠️ Format inattendu de la réponse :", response)
-            return False
+def jetons_verification(L1, L2):
+    """Jetons d'une vérification (prompt ≈ 4 caractères par jeton, réponse de 3 jetons au plus)."""
+    return len(prompt_verification(L1, L2)) // 4 + 3
+
+
+def lire_verification(response):
+    """Compte l'appel et renvoie True si la réponse du modèle commence par OUI."""
+    metriques.compter("appels_api")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        metriques.compter("tokens", getattr(usage, "total_tokens", 0) or 0)
+
+    # ✅ Nouvelle structure de réponse
+    if hasattr(response, "choices") and len(response.choices) > 0:
+        content = response.choices[0].message.content.strip().upper()
+    else:
+        print("⚠️ Format inattendu de la réponse :", response)
+        return False
+
+    return content.startswith("OUI")
+
 
-        return content.startswith("OUI")
+def verifier_traduction(L1, L2, client=None, seuil_similarite=0.6):
+    """
+    Vérifie si la phrase  correspond bien à la traduction .
+    Retourne True si les deux phrases ont le même sens.
+    """
+    try:
+        with metriques.span("verification"):
+            response = (en_pool(client) or clients).appeler(lambda c: c.chat.complete(
+                model="mistral-large-latest",
+                messages=[{"role": "user", "content": prompt_verification(L1, L2)}],
+                max_tokens=3,
+                temperature=0.0
+            ), depense={"jetons": jetons_verification(L1, L2)})
+        return lire_verification(response)
+    except estimation.BudgetAtteint:
+        raise
     except Exception as e:
         print(f"⚠️ Erreur vérification : {e}")
         return False
 
 
-
 def apparier_phrases(recto_lines, verso_lines, mistral_client=None, verifier=False):
     """Essaie d’apparier les phrases  + vérifie la traduction si demandé."""
-    numero_regex = re.compile(r'^\s*(?<!\d)(\d{1,2})(?!\d)[\.\)]?\s+')
     data = []
+    for i, j in indices_appariement(recto_lines, verso_lines):
+        L1 = recto_lines[i]
+        L2 = verso_lines[j]
+
+        # Vérification facultative
+        if verifier:
+            if verifier_traduction(L1, L2, mistral_client):
+                data.append({"Recto": L1, "Verso": L2})
+        else:
+            data.append({"Recto": L1, "Verso": L2})
+
+    return data
+
+
+def indices_appariement(recto_lines, verso_lines):
+    """Génère les couples d'indices (i, j) des lignes recto / verso appariées."""
+    numero_regex = re.compile(r'^\s*(?<!\d)(\d{1,2})(?!\d)[\.\)]?\s+')
     i = j = 0
     while i < len(recto_lines) and j < len(verso_lines):
         L1 = recto_lines[i]
@@ -201,77 +358,451 @@ def apparier_phrases(recto_lines, verso_lines, mistral_client=None, verifier=Fal
                 j += 1
                 continue
 
-        # Vérification facultative
-        if verifier:
-            if verifier_traduction(L1, L2, mistral_client):
-                data.append({"Recto": L1, "Verso": L2})
-        else:
-            data.append({"Recto": L1, "Verso": L2})
-
+        yield i, j
         i += 1
         j += 1
 
-    return data
+
+def indices_par_page(recto_lines, verso_lines, debordement=DEBORDEMENT):
+    """Comme indices_appariement, mais page k du recto contre page k du verso.
+
+    Une erreur d'alignement ne dépasse plus sa page. Les lignes restées seules en
+    bas d'une page (au plus `debordement`) sont reportées en tête de la page
+    suivante, si l'autre côté y a justement des lignes en trop.
+    """
+    pages_recto, pages_verso = recto_lines.par_page(), verso_lines.par_page()
+    reste_r, reste_v = [], []
+    for page in sorted(pages_recto.keys() | pages_verso.keys()):
+        page_r, page_v = pages_recto.get(page, []), pages_verso.get(page, [])
+        surplus = len(page_v) - len(page_r)
+        r = reste_r[len(reste_r) - min(len(reste_r), max(0, surplus)):] + page_r
+        v = reste_v[len(reste_v) - min(len(reste_v), max(0, -surplus)):] + page_v
+        dernier_i = dernier_j = -1
+        for i, j in indices_appariement([recto_lines[k] for k in r], [verso_lines[k] for k in v]):
+            yield r[i], v[j]
+            dernier_i, dernier_j = i, j
+        reste_r = r[max(dernier_i + 1, len(r) - debordement):]
+        reste_v = v[max(dernier_j + 1, len(v) - debordement):]
+
+
+def page_de(lignes, i):
+    """Page source de la ligne i (0 si les lignes n'ont pas de provenance)."""
+    pages = getattr(lignes, "pages", None)
+    return pages[i] if pages and i >= 0 else 0
+
+
+def separer_lignes(lignes, separateur):
+    """Découpe les lignes "recto <separateur> verso" en couples (recto, verso)."""
+    for _, recto, verso in _separer(lignes, separateur):
+        yield recto, verso
+
+
+def _separer(lignes, separateur):
+    for k, l in enumerate(lignes):
+        if separateur in l:
+            recto, verso = map(str.strip, l.split(separateur, 1))
+            yield k, recto, verso
+
+
+NUMERO_LIGNE = re.compile(NUMEROTATION)
+
+
+def table_appariee(recto_lines, verso_lines, document=None, sans_numero=False):
+    """Paires recto / verso alignées, en TablePaires (ligne : rang de la ligne recto).
+
+    Si les lignes connaissent leur page (LignesPaginees), l'alignement se fait page par page.
+    `sans_numero` : le numéro de ligne, qui a servi à l'alignement, est retiré des cartes.
+    """
+    if getattr(recto_lines, "pages", None) and getattr(verso_lines, "pages", None):
+        indices = indices_par_page(recto_lines, verso_lines)
+    else:
+        indices = indices_appariement(recto_lines, verso_lines)
+    carte = (lambda ligne: NUMERO_LIGNE.sub("", ligne, count=1)) if sans_numero else (lambda ligne: ligne)
+    table = TablePaires()
+    for i, j in indices:
+        table.ajouter(carte(recto_lines[i]), carte(verso_lines[j]), document, page_de(recto_lines, i), i)
+    return table
+
+
+SEPARATEURS = {"combine": "|", "manuel": ":"}
+
+
+def candidats_mode(mode, lignes, document=None, appariement="regles"):
+    """Paires candidates du mode ; `lignes` : (recto, verso) en recto_verso et en combine découpé
+    en moitiés (ocr_moities), lignes du PDF sinon.
+
+    Les langues du profil de nettoyage du mode servent à écarter les lignes (recto / verso)
+    ou les paires (combine / manuel) dans une autre langue (langues.py).
+    appariement="llm" confie l'appariement aux agents (appariement_llm.py) au lieu des règles locales.
+    """
+    cibles = PROFILS[mode]["langues"]
+    cote_a_cote = isinstance(lignes, tuple)
+    if cote_a_cote:
+        with metriques.span("langues"):
+            lignes = tuple(langues.filtrer_lignes(cote, cibles) for cote in lignes)
+    with metriques.span("appariement"):
+        if appariement == "llm":
+            table = appariement_llm.apparier("recto_verso" if cote_a_cote else mode, lignes, clients, document)
+        elif cote_a_cote:
+            # Moitiés de pages combinées : numéros gardés pour l'alignement, retirés ensuite comme en combine
+            table = table_appariee(*lignes, document, sans_numero=PROFILS[mode]["numerotation"])
+        else:
+            table = table_separee(lignes, SEPARATEURS[mode], document)
+    if mode == "recto_verso":
+        return table
+    with metriques.span("langues"):
+        return langues.controler_paires(table, cibles)
+
+
+def table_separee(lignes, separateur, document=None):
+    """Paires des lignes "recto <separateur> verso", en TablePaires."""
+    table = TablePaires()
+    for k, recto, verso in _separer(lignes, separateur):
+        table.ajouter(recto, verso, document, page_de(lignes, k), k)
+    return table
 
 
 # =======================================================
 # 🔹 MODES DE TRAITEMENT
 # =======================================================
 
-def imperator(pdf_verso, pdf_recto, output_excel, progress_callback=None, verifier=False):
-    """Mode Recto/Verso avec nettoyage et appariement automatique"""
-    start_time = time.time()
+def ocr_et_nettoyage(pdf_path, agent_id, profil, pages=None, shards=1, moitie=None):
+    """Renvoie (pages OCR brutes [(numéro, markdown)], lignes nettoyées avec leur page)."""
+    brutes = pages_ocr(pdf_path, pages=pages, shards=shards, moitie=moitie)
+    return brutes, nettoyer_pages_brutes(brutes, profil=profil)
 
-    recto_res = process_pdf_with_mistral(pdf_recto, AGENT_ID_RECTO_VERSO)
-    verso_res = process_pdf_with_mistral(pdf_verso, AGENT_ID_RECTO_VERSO)
 
-    recto_lines = nettoyer_texte_brut(recto_res)
-    verso_lines = nettoyer_texte_brut(verso_res)
+def ocr_moities(pdf_path, moities, pages=None, shards=1):
+    """OCR des deux moitiés de chaque page (`moities` : "colonnes" ou "lignes", voir DECOUPES), en parallèle.
 
-    data = apparier_phrases(recto_lines, verso_lines, mistral_client=client, verifier=verifier)
+    Renvoie {"recto": (pages brutes, lignes), "verso": ...} : recto = gauche / haut, verso = droite / bas.
+    Chaque moitié est nettoyée comme un côté du mode recto_verso (numérotation gardée pour l'alignement).
+    """
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        futurs = {role: pool.submit(metriques.propager(ocr_et_nettoyage), pdf_path, None, "recto_verso", pages,
+                                    shards, moitie)
+                  for role, moitie in zip(("recto", "verso"), DECOUPES[moities])}
+        return {role: futur.result() for role, futur in futurs.items()}
 
-    safe_append_to_excel(data, output_excel)
-    elapsed = round(time.time() - start_time, 2)
-    progress_callback(100, f"Terminé ✅ ({elapsed}s)")
+
+def verifier_paires(candidats, verifier=False):
+    """TablePaires des candidats jugés fidèles par le modèle (tous si `verifier` est faux)."""
+    if not verifier:
+        return candidats
+    return candidats.selection([i for i, (r, v) in enumerate(candidats) if verifier_traduction(r, v, clients)])
+
+
+def archiver_ocr(output_excel, mode, documents, data, pages=None, verifier=False, candidats=None, appariement="regles",
+                 moities=None):
+    """Garde l'OCR brut à côté de la sortie pour pouvoir rejouer nettoyage / appariement (archive_ocr.py)."""
+    with metriques.span("archive_ocr"):
+        archive_ocr.archiver(output_excel, mode, documents, data, pages=pages, verifier=verifier,
+                             candidats=candidats, appariement=appariement, moities=moities)
+
+
+def imperator(pdf_verso, pdf_recto, output_excel, progress_callback=None, verifier=False, pages=None, shards=1,
+              appariement="regles"):
+    """Mode Recto/Verso avec nettoyage et appariement automatique"""
+    start_time = time.time()
+    with metriques.execution(mode="recto_verso") as m:
+        # Recto et verso sont indépendants : OCR en parallèle (limiteurs du pool de clés),
+        # chaque côté est nettoyé dès que son OCR est terminé.
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            futur_recto = pool.submit(metriques.propager(ocr_et_nettoyage), pdf_recto, AGENT_ID_RECTO_VERSO, "recto_verso",
+                                      pages, shards)
+            futur_verso = pool.submit(metriques.propager(ocr_et_nettoyage), pdf_verso, AGENT_ID_RECTO_VERSO, "recto_verso",
+                                      pages, shards)
+            recto_brut, recto_lines = futur_recto.result()
+            verso_brut, verso_lines = futur_verso.result()
+
+        candidats = candidats_mode("recto_verso", (recto_lines, verso_lines), os.path.basename(pdf_recto), appariement)
+        data = verifier_paires(filtrer_quasi_doublons(candidats, output_excel), verifier)
+        metriques.compter("paires", len(data))
+
+        safe_append_to_excel(data, output_excel)
+        indexer_paires(data, output_excel)
+        archiver_ocr(output_excel, "recto_verso", {"recto": (pdf_recto, recto_brut), "verso": (pdf_verso, verso_brut)},
+                     data, pages, verifier, candidats, appariement)
+    terminer_execution(m, output_excel, start_time, progress_callback)
     return output_excel
 
 
-def imperator_combine(pdf_combine, output_excel, progress_callback=None, verifier=False):
-    """Mode fichier combiné"""
+def imperator_combine(pdf_combine, output_excel, progress_callback=None, verifier=False, pages=None, shards=1,
+                      appariement="regles", moities=None):
+    """Mode fichier combiné.
+
+    Avec `moities` ("colonnes" ou "lignes"), chaque page est coupée localement en deux :
+    les moitiés passent à l'OCR en parallèle et sont appariées comme un recto / verso,
+    page par page, sans séparateur à retrouver ni appel d'appariement.
+    """
     start_time = time.time()
-    res = process_pdf_with_mistral(pdf_combine, AGENT_ID_COMBINE)
-    lignes = nettoyer_texte_brut(res)
+    with metriques.execution(mode="combine", **({"moities": moities} if moities else {})) as m:
+        if moities:
+            cotes = ocr_moities(pdf_combine, moities, pages, shards)
+            lignes = (cotes["recto"][1], cotes["verso"][1])
+            documents = {role: (pdf_combine, brut) for role, (brut, _) in cotes.items()}
+        else:
+            brut, lignes = ocr_et_nettoyage(pdf_combine, AGENT_ID_COMBINE, "combine", pages, shards)
+            documents = {"pdf": (pdf_combine, brut)}
 
-    data = []
-    for l in lignes:
-        if "|" in l:
-            esp, fra = map(str.strip, l.split("|", 1))
-            if not verifier or verifier_traduction(esp, fra, client):
-                data.append({"Recto": esp, "Verso": fra})
+        candidats = candidats_mode("combine", lignes, os.path.basename(pdf_combine), appariement)
+        data = verifier_paires(filtrer_quasi_doublons(candidats, output_excel), verifier)
+        metriques.compter("paires", len(data))
 
-    safe_append_to_excel(data, output_excel)
-    elapsed = round(time.time() - start_time, 2)
-    progress_callback(100, f"Terminé ✅ ({elapsed}s)")
+        safe_append_to_excel(data, output_excel)
+        indexer_paires(data, output_excel)
+        archiver_ocr(output_excel, "combine", documents, data, pages, verifier, candidats, appariement, moities)
+    terminer_execution(m, output_excel, start_time, progress_callback)
     return output_excel
 
 
-def imperator_manuel(pdf_unique, output_excel, progress_callback=None, verifier=False):
+def imperator_manuel(pdf_unique, output_excel, progress_callback=None, verifier=False, pages=None, shards=1,
+                     appariement="regles"):
     """Mode Manuel"""
     start_time = time.time()
-    res = process_pdf_with_mistral(pdf_unique, AGENT_ID_MANUEL)
-    lignes = nettoyer_texte_brut(res)
+    with metriques.execution(mode="manuel") as m:
+        brut, lignes = ocr_et_nettoyage(pdf_unique, AGENT_ID_MANUEL, "manuel", pages, shards)
+
+        candidats = candidats_mode("manuel", lignes, os.path.basename(pdf_unique), appariement)
+        data = verifier_paires(filtrer_quasi_doublons(candidats, output_excel), verifier)
+        metriques.compter("paires", len(data))
+
+        safe_append_to_excel(data, output_excel)
+        indexer_paires(data, output_excel)
+        archiver_ocr(output_excel, "manuel", {"pdf": (pdf_unique, brut)}, data, pages, verifier, candidats,
+                     appariement)
+    terminer_execution(m, output_excel, start_time, progress_callback)
+    return output_excel
+
+
+# =======================================================
+# 🔹 APERÇU (quelques pages avant le traitement complet)
+# =======================================================
+
+PAGES_APERCU = 5
+
+
+def apercu(mode, pdfs, pages_apercu=PAGES_APERCU, pages=None, verifier=False, shards=1, appariement="regles",
+           moities=None):
+    """OCR, nettoyage et appariement des `pages_apercu` premières pages choisies, sans rien écrire.
+
+    `pdfs` dans l'ordre de MODES (verso, recto en recto_verso). Les pages OCR vont dans le
+    cache : le traitement complet ne les repaie pas. Renvoie {"paires" (TablePaires),
+    "pages_apercu", "estimation" (voir estimation.extrapoler), "suggestion" (texte ou None)}.
+    `moities` : combine coupé en deux (voir imperator_combine).
+    """
+    # Rôle -> (PDF, moitié des pages passée à l'OCR), le document principal en dernier
+    if mode == "recto_verso":
+        documents = {"verso": (pdfs[0], None), "recto": (pdfs[1], None)}
+    elif mode == "combine" and moities:
+        documents = {"verso": (pdfs[0], DECOUPES[moities][1]), "recto": (pdfs[0], DECOUPES[moities][0])}
+    else:
+        documents = {"pdf": (pdfs[0], None)}
+    roles = tuple(documents)
+    profil = "recto_verso" if "recto" in documents else mode
+    selections = {role: analyser_pages(pages, nombre_pages(pdf)) for role, (pdf, _) in documents.items()}
+    echantillons = {role: selection[:max(1, pages_apercu)] for role, selection in selections.items()}
+
+    with metriques.execution(mode=mode, apercu=True) as m:
+        with ThreadPoolExecutor(max_workers=len(documents)) as pool:
+            futurs = {role: pool.submit(metriques.propager(ocr_et_nettoyage), pdf, None, profil,
+                                        ",".join(str(i + 1) for i in echantillons[role]), shards, moitie)
+                      for role, (pdf, moitie) in documents.items()}
+            lignes = {role: futur.result()[1] for role, futur in futurs.items()}
+        document = os.path.basename(documents[roles[-1]][0])
+        if "recto" in lignes:
+            paires = candidats_mode(mode, (lignes["recto"], lignes["verso"]), document, appariement)
+        else:
+            paires = candidats_mode(mode, lignes["pdf"], document, appariement)
+    rapport = m.rapport()
+
+    # Pages restant à payer : celles de la sélection complète absentes du cache (l'échantillon y est déjà)
+    a_ocr = {role: len(selections[role]) - len(cache_ocr.pages_connues(pdf, [i + 1 for i in selections[role]],
+                                                                       cache_ocr.variante(moitie)))
+             for role, (pdf, moitie) in documents.items()}
+    jetons_moyens = sum(jetons_verification(r, v) for r, v in paires) // max(1, len(paires))
+    resultat = {
+        "mode": mode,
+        "paires": paires,
+        "pages_apercu": len(echantillons[roles[-1]]),
+        "estimation": estimation.extrapoler(
+            rapport, len(echantillons[roles[-1]]), len(selections[roles[-1]]), sum(a_ocr.values()),
+            sum(estimation.lots(n) for n in a_ocr.values()), len(paires), jetons_moyens, verifier,
+            # verifier_paires vérifie les paires l'une après l'autre
+            parallelisme_ocr=min(clients.capacite, shards * len(documents)), parallelisme_api=1),
+        "suggestion": None,
+    }
+    resultat["estimation"]["pages"] = sum(len(s) for s in selections.values())
+
+    if "pdf" in lignes:
+        # Mauvais mode ? Les séparateurs des lignes nettoyées le trahissent
+        compte = {autre: sum(SEPARATEURS[autre] in l for l in lignes["pdf"]) for autre in SEPARATEURS}
+        autre = "manuel" if mode == "combine" else "combine"
+        if compte[autre] >= 3 and compte[autre] > 2 * compte[mode]:
+            resultat["suggestion"] = (f"Le mode {autre} semble plus adapté : {compte[autre]} lignes avec "
+                                      f"« {SEPARATEURS[autre]} » contre {compte[mode]} avec « {SEPARATEURS[mode]} ».")
+    if not paires and resultat["suggestion"] is None:
+        resultat["suggestion"] = "Aucune paire sur l'échantillon : vérifier le mode et les pages choisies."
+    return resultat
+
+
+def resume_apercu(resultat, exemples=15):
+    """Texte lisible d'un aperçu : quelques paires, estimation du traitement complet, suggestion."""
+    e = resultat["estimation"]
+    lignes = [f"Aperçu ({resultat['mode']}, {resultat['pages_apercu']} page(s)) : {len(resultat['paires'])} paires"]
+    for recto, verso, _, page, _ in itertools.islice(resultat["paires"].lignes(), exemples):
+        lignes.append(f"  p.{page or '?'}  {recto}  →  {verso}")
+    if 0 < exemples < len(resultat["paires"]):
+        lignes.append(f"  … et {len(resultat['paires']) - exemples} autres")
+    lignes.append(
+        f"Traitement complet estimé : {e['pages']} pages ({e['pages_a_ocr']} à passer à l'OCR), "
+        f"~{e['paires']} paires, {e['appels_api']} appels API, ~{e['jetons']} jetons, "
+        f"~{estimation.formater_duree(e['duree_secondes'])}, ~{e['cout']:.2f} $")
+    if resultat["suggestion"]:
+        lignes.append(f"⚠️ {resultat['suggestion']}")
+    return "\n".join(lignes)
+
+
+# =======================================================
+# 🔹 ESTIMATION AVANT LANCEMENT (sans appel API)
+# =======================================================
+
+CARACTERES_COUCHE_TEXTE = 20   # en dessous, la page est considérée comme scannée
 
-    data = []
-    for l in lignes:
-        if ":" in l:
-            esp, fra = map(str.strip, l.split(":", 1))
-            if not verifier or verifier_traduction(esp, fra, client):
-                data.append({"Recto": esp, "Verso": fra})
 
-    safe_append_to_excel(data, output_excel)
+def inspecter_pdf(pdf_path, mode, pages=None, echantillon=5, moitie=None):
+    """Inspection locale d'un PDF : pages choisies, pages déjà en cache OCR, couche texte.
+
+    Quand la plupart des pages de l'échantillon ont une couche texte, elle donne le
+    nombre de lignes candidates par page (`paires_par_page`, None sinon). Avec `moitie`
+    (combine coupé en deux), seule cette moitié des pages est comptée.
+    """
+    candidates = []
+    with lecteur_pdf(pdf_path) as reader:
+        total = len(reader.pages)
+        selection = analyser_pages(pages, total)
+        pas = max(1, len(selection) // max(1, echantillon))
+        for i in selection[::pas][:echantillon]:
+            try:
+                texte = reader.pages[i].extract_text() or ""
+            except Exception:  # PDF scanné ou mal formé : pas de couche texte exploitable
+                texte = ""
+            if len(texte.strip()) >= CARACTERES_COUCHE_TEXTE:
+                if moitie:  # la couche texte couvre toute la page : une ligne sur deux est de chaque côté
+                    candidates.append(len(nettoyer_texte(texte, "recto_verso")) / 2)
+                    continue
+                lignes = nettoyer_texte(texte, mode)
+                candidates.append(len(lignes) if mode == "recto_verso"
+                                  else sum(SEPARATEURS[mode] in ligne for ligne in lignes))
+    en_cache = len(cache_ocr.pages_connues(pdf_path, [i + 1 for i in selection], cache_ocr.variante(moitie))) \
+        if selection else 0
+    testees = len(selection[::pas][:echantillon])
+    couche_texte = len(candidates) / testees if testees else 0.0
+    return {
+        "pdf": pdf_path,
+        "moitie": moitie,
+        "pages_document": total,
+        "pages": len(selection),
+        "en_cache": en_cache,
+        "couche_texte": round(couche_texte, 2),
+        "paires_par_page": sum(candidates) / len(candidates) if couche_texte >= 0.5 else None,
+    }
+
+
+def estimer(mode, pdfs, pages=None, verifier=False, shards=1, appariement="regles", historique=(), asynchrone=False,
+            moities=None):
+    """Prévision d'un traitement (estimation.prevoir) : PDF inspectés localement, taux des exécutions
+    passées (historique, plus les *.metrics.json des dossiers `historique`). Aucun appel API.
+
+    `asynchrone` : traitement par un Job (OCR et vérifications en parallèle sur tout le pool).
+    `moities` : combine coupé en deux, chaque moitié compte comme un document (verso, puis recto)."""
+    if mode == "combine" and moities:
+        documents = [inspecter_pdf(pdfs[0], mode, pages, moitie=moitie) for moitie in reversed(DECOUPES[moities])]
+        pdfs = (pdfs[0], pdfs[0])
+    else:
+        documents = [inspecter_pdf(pdf, mode, pages) for pdf in pdfs]
+    prevision = estimation.prevoir(
+        mode, documents, estimation.charger_historique(historique), verifier, appariement,
+        parallelisme_ocr=clients.capacite if asynchrone else min(clients.capacite, shards * len(pdfs)),
+        parallelisme_api=clients.capacite, parallelisme_verification=clients.capacite if asynchrone else 1)
+    return {**prevision, "mode": mode, "documents": documents}
+
+
+def resume_estimation(prevision):
+    """Texte lisible d'une prévision (estimer)."""
+    lignes = [f"Estimation ({prevision['mode']}) :"]
+    for d in prevision["documents"]:
+        texte = "couche texte" if d["paires_par_page"] is not None else "scanné"
+        moitie = f" ({d['moitie']})" if d.get("moitie") else ""
+        lignes.append(f"  {os.path.basename(d['pdf'])}{moitie} : {d['pages']}/{d['pages_document']} pages, "
+                      f"{d['en_cache']} en cache OCR, {texte} ({d['couche_texte']:.0%} des pages testées)")
+    historique = prevision["executions_historique"]
+    lignes.append(
+        f"  {prevision['pages_a_ocr']} pages à passer à l'OCR, ~{prevision['paires']} paires, "
+        f"{prevision['appels_api']} appels API, ~{prevision['jetons']} jetons, "
+        f"~{estimation.formater_duree(prevision['duree_secondes'])} (capacité {clients.capacite} requêtes), "
+        f"~{prevision['cout']:.2f} $")
+    lignes.append(f"  Taux tirés de {historique} exécution(s) passée(s) du mode" if historique
+                  else "  Pas d'historique pour ce mode : taux par défaut ou des autres modes")
+    return "\n".join(lignes)
+
+
+# Fonctions de traitement par mode ; les PDF sont passés dans l'ordre de leur signature
+MODES = {
+    "recto_verso": imperator,
+    "combine": imperator_combine,
+    "manuel": imperator_manuel,
+}
+
+
+# Conventions de nommage des PDF (file de l'interface, dossier surveillé) :
+#   <nom>_recto.pdf + <nom>_verso.pdf -> recto_verso ; <nom>_combine.pdf -> combine ; <nom>_manuel.pdf -> manuel
+MOTIF_NOM = re.compile(r"^(?P<base>.+?)[_-](?P<role>recto|verso|combine|manuel)\.pdf$", re.IGNORECASE)
+
+
+def regrouper_pdf(chemins, mode_defaut=None):
+    """Regroupe des PDF en jobs [(mode, pdfs)] d'après leur nom ; renvoie (jobs, fichiers ignorés).
+
+    Un PDF sans suffixe reconnu est traité seul dans `mode_defaut` si c'est un mode à un
+    PDF (combine / manuel) ; un recto sans son verso (ou l'inverse) est ignoré.
+    """
+    jobs, ignores, cotes = [], [], {}
+    for chemin in sorted(chemins):
+        m = MOTIF_NOM.match(os.path.basename(chemin))
+        if m is None:
+            if mode_defaut in ("combine", "manuel") and chemin.lower().endswith(".pdf"):
+                jobs.append((mode_defaut, (chemin,)))
+            else:
+                ignores.append(chemin)
+            continue
+        role = m.group("role").lower()
+        if role in ("combine", "manuel"):
+            jobs.append((role, (chemin,)))
+        else:
+            cotes[(os.path.dirname(chemin), m.group("base").lower(), role)] = chemin
+    for (dossier, base, role), chemin in cotes.items():
+        if role == "recto" and (dossier, base, "verso") in cotes:
+            jobs.append(("recto_verso", (cotes[(dossier, base, "verso")], chemin)))
+        elif role == "recto" or (dossier, base, "recto") not in cotes:
+            ignores.append(chemin)
+    return jobs, ignores
+
+
+def lancer_mode(mode, pdfs, output_excel, profil=None, **options):
+    """Lance le mode demandé ; avec `profil` (dossier), l'exécution est profilée (voir profilage.py)."""
+    if mode != "combine":
+        options.pop("moities", None)  # seules les pages combinées se coupent en deux
+    if profil:
+        resultat, _ = profilage.profiler(MODES[mode], *pdfs, output_excel, dossier=profil, **options)
+        return resultat
+    return MODES[mode](*pdfs, output_excel, **options)
+
+
+def terminer_execution(m, output_excel, start_time, progress_callback=None):
+    ecrire_metriques(m, output_excel)
     elapsed = round(time.time() - start_time, 2)
-    progress_callback(100, f"Terminé ✅ ({elapsed}s)")
-    return output_excel
+    if progress_callback:
+        progress_callback(100, f"Terminé ✅ ({elapsed}s)")
 
 
 # =======================================================
@@ -279,10 +810,10 @@ def imperator_manuel(pdf_unique, output_excel, progress_callback=None, verifier=
 # =======================================================
 
 class MistralApp:
-    def __init__(self, root):
+    def __init__(self, root, dossier_profil=None):
         self.root = root
         self.root.title("📘 OCR Mistral - Multi Mode + Anki")
-        self.root.geometry("600x760")
+        self.root.geometry("660x850")
         self.root.resizable(False, False)
 
         # --- Variables ---
@@ -293,6 +824,15 @@ class MistralApp:
         self.output_excel = tk.StringVar(value="resultats_traitement.xlsx")
         self.output_excel_anki = tk.StringVar(value="cartes_anki.xlsx")
         self.verifier_traductions = tk.BooleanVar(value=False)
+        self.appariement_llm = tk.BooleanVar(value=False)
+        self.profiler = tk.BooleanVar(value=bool(dossier_profil))
+        self.pages = tk.StringVar()
+        self.shards = tk.IntVar(value=1)
+        self.pages_apercu = tk.IntVar(value=PAGES_APERCU)
+        self.budget = tk.StringVar()
+        self.moities = tk.StringVar(value="non")
+        self.dossier_profil = dossier_profil or "profil"
+        self.traitement_en_cours = False
 
         self.deck_name = tk.StringVar(value="RectoVerso")
         self.model_name = tk.StringVar(value="Basic")
@@ -316,10 +856,31 @@ class MistralApp:
         self.update_file_inputs()
 
         # --- Options ---
-        ttk.Checkbutton(root, text="🔍 Vérifier les traductions (lent mais précis)", variable=self.verifier_traductions).pack(pady=(0, 10))
+        frm_pages = ttk.Frame(root)
+        frm_pages.pack(pady=(0, 5))
+        ttk.Label(frm_pages, text="📑 Pages (ex. 1-10,15 ; vide = toutes) :").grid(row=0, column=0, sticky="e", padx=5)
+        ttk.Entry(frm_pages, textvariable=self.pages, width=18).grid(row=0, column=1)
+        ttk.Label(frm_pages, text="Shards :").grid(row=0, column=2, sticky="e", padx=5)
+        ttk.Spinbox(frm_pages, from_=1, to=32, textvariable=self.shards, width=4).grid(row=0, column=3)
+        ttk.Label(frm_pages, text="Aperçu :").grid(row=0, column=4, sticky="e", padx=5)
+        ttk.Spinbox(frm_pages, from_=1, to=50, textvariable=self.pages_apercu, width=4).grid(row=0, column=5)
+        ttk.Label(frm_pages, text="💰 Budget ($, vide = sans limite) :").grid(row=1, column=0, sticky="e", padx=5, pady=(5, 0))
+        ttk.Entry(frm_pages, textvariable=self.budget, width=18).grid(row=1, column=1, pady=(5, 0))
+        ttk.Label(frm_pages, text="✂️ Combiné coupé :").grid(row=1, column=2, columnspan=2, sticky="e", padx=5, pady=(5, 0))
+        ttk.Combobox(frm_pages, textvariable=self.moities, values=("non", *DECOUPES), state="readonly",
+                     width=9).grid(row=1, column=4, columnspan=2, sticky="w", pady=(5, 0))
+        ttk.Checkbutton(root, text="🔍 Vérifier les traductions (lent mais précis)", variable=self.verifier_traductions).pack(pady=(0, 5))
+        ttk.Checkbutton(root, text="🤖 Appariement par les agents Mistral (LLM)", variable=self.appariement_llm).pack(pady=(0, 5))
+        ttk.Checkbutton(root, text="⏱ Profiler l'exécution (CPU / mémoire)", variable=self.profiler).pack(pady=(0, 10))
 
         # --- Bouton traitement ---
-        ttk.Button(root, text="▶ Lancer le traitement", command=self.run_processing).pack(pady=10)
+        frm_boutons = ttk.Frame(root)
+        frm_boutons.pack(pady=10)
+        ttk.Button(frm_boutons, text="📊 Estimer", command=self.estimer).pack(side="left", padx=5)
+        ttk.Button(frm_boutons, text="👁️ Aperçu", command=self.lancer_apercu).pack(side="left", padx=5)
+        ttk.Button(frm_boutons, text="▶ Lancer le traitement", command=self.run_processing).pack(side="left", padx=5)
+        ttk.Button(frm_boutons, text="📚 File de documents…", command=self.ouvrir_file).pack(side="left", padx=5)
+        self.file_documents = None
 
         # --- Progression ---
         self.progress = ttk.Progressbar(root, length=350, mode="determinate")
@@ -398,33 +959,162 @@ class MistralApp:
 
     # --- Traitement selon le mode ---
     def run_processing(self):
+        if self.traitement_en_cours:
+            return
+        mode = self.mode.get()
+        profil = self.dossier_profil if self.profiler.get() else None
+        try:
+            plafond = self.budget_formulaire()
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e))
+            return
+        fichiers = self._fichiers(mode)
+        if fichiers is None:
+            return
+        # Le traitement tourne dans un thread : la fenêtre reste active et, le plafond
+        # atteint, propose de relever le budget (comme la file de documents)
+        messages = queue.Queue()
+        budget = None if plafond is None else estimation.Budget(
+            cout=plafond, attendre=True, en_pause=lambda _, message: messages.put(("pause", message)))
+        options = {"progress_callback": lambda valeur, message: messages.put(("progression", valeur, message)),
+                   **self.options_traitement()}
+        issue = {}
+
+        def traiter():
+            try:
+                with estimation.avec_budget(budget):
+                    issue["sortie"] = lancer_mode(mode, *fichiers, profil=profil, **options)
+            except Exception as e:
+                issue["erreur"] = e
+
+        self.traitement_en_cours = True
+        fil = threading.Thread(target=traiter, name="traitement", daemon=True)
+        fil.start()
+        self.root.after(100, self.suivre_traitement, fil, messages, budget, issue, profil)
+
+    def suivre_traitement(self, fil, messages, budget, issue, profil):
+        """Applique les messages du thread de traitement (boucle Tk), puis affiche son issue."""
+        termine = not fil.is_alive()  # lu avant de vider la file : aucun message ne peut suivre
+        while True:
+            try:
+                message = messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == "progression":
+                self.update_progress(*message[1:])
+            else:
+                self.demander_budget(budget, message[1])
+        if not termine:
+            self.root.after(100, self.suivre_traitement, fil, messages, budget, issue, profil)
+            return
+        self.traitement_en_cours = False
+
+        erreur = issue.get("erreur")
+        if isinstance(erreur, estimation.BudgetAtteint):
+            messagebox.showwarning("Budget", f"⏸ Traitement arrêté, {erreur}.\nLes pages déjà passées à l'OCR sont "
+                                             "en cache : relancer avec un budget plus élevé reprend sans les repayer.")
+        elif erreur is not None:
+            messagebox.showerror("Erreur", f"Une erreur est survenue : {erreur}")
+        else:
+            message = f"Traitement terminé 🎉\nFichier mis à jour : {issue['sortie']}"
+            if profil:
+                message += f"\nProfil écrit dans : {os.path.abspath(profil)}"
+            messagebox.showinfo("Succès", message)
+
+    def demander_budget(self, budget, message):
+        """Pause du traitement principal : nouveau budget, ou Annuler pour l'arrêter."""
+        self.update_progress(self.progress["value"], f"⏸ Pause, {message}")
+        plafond = simpledialog.askfloat(
+            "Budget", f"⏸ Pause, {message}.\nNouveau budget ($) ; Annuler = arrêter le traitement :",
+            parent=self.root, minvalue=0.0, initialvalue=round(2 * (budget.limites["cout"] or 0), 2))
+        if plafond is None:
+            budget.abandonner()
+        else:
+            budget.reprendre(cout=plafond)
+
+    def _fichiers(self, mode):
+        """(pdfs, sortie) du mode choisi ; None si les fichiers manquent (message déjà affiché)."""
+        if mode == "recto_verso":
+            recto, verso, output = self.pdf_recto.get(), self.pdf_verso.get(), self.output_excel.get()
+            if not recto or not verso:
+                messagebox.showerror("Erreur", "Merci de sélectionner les deux fichiers PDF.")
+                return None
+            return (verso, recto), output
+
+        pdf, output = self.pdf_unique.get(), self.output_excel.get()
+        if not pdf:
+            messagebox.showerror("Erreur", "Merci de sélectionner un fichier PDF combiné." if mode == "combine"
+                                 else "Merci de sélectionner un fichier PDF pour le mode manuel.")
+            return None
+        return (pdf,), output
+
+    def budget_formulaire(self):
+        """Plafond en $ saisi (None si vide) ; ValueError s'il n'est pas un nombre positif."""
+        texte = self.budget.get().strip().replace(",", ".")
+        if not texte:
+            return None
+        try:
+            plafond = float(texte)
+        except ValueError:
+            raise ValueError(f"Budget invalide : {texte}") from None
+        if plafond <= 0:
+            raise ValueError("Le budget doit être positif.")
+        return plafond
+
+    def pdfs_formulaire(self):
+        """PDF du mode choisi, dans l'ordre de MODES ; None (message affiché) s'il en manque."""
+        mode = self.mode.get()
+        pdfs = (self.pdf_verso.get(), self.pdf_recto.get()) if mode == "recto_verso" else (self.pdf_unique.get(),)
+        if not all(pdfs):
+            messagebox.showerror("Erreur", "Merci de sélectionner le(s) fichier(s) PDF.")
+            return None
+        return pdfs
+
+    # --- Estimation ---
+    def estimer(self):
+        pdfs = self.pdfs_formulaire()
+        if pdfs is None:
+            return
+        options = self.options_traitement()
+        try:
+            prevision = estimer(self.mode.get(), pdfs, pages=options["pages"], verifier=options["verifier"],
+                                shards=options["shards"], appariement=options["appariement"],
+                                moities=options["moities"])
+        except Exception as e:
+            messagebox.showerror("Erreur", f"Une erreur est survenue : {e}")
+            return
+        messagebox.showinfo("Estimation", resume_estimation(prevision))
+
+    # --- Aperçu ---
+    def lancer_apercu(self):
         mode = self.mode.get()
-        verifier = self.verifier_traductions.get()
+        pdfs = self.pdfs_formulaire()
+        if pdfs is None:
+            return
+        options = self.options_traitement()
+        self.update_progress(0, f"Aperçu de {self.pages_apercu.get()} page(s)…")
         try:
-            if mode == "recto_verso":
-                recto, verso, output = self.pdf_recto.get(), self.pdf_verso.get(), self.output_excel.get()
-                if not recto or not verso:
-                    messagebox.showerror("Erreur", "Merci de sélectionner les deux fichiers PDF.")
-                    return
-                output_path = imperator(verso, recto, output, progress_callback=self.update_progress, verifier=verifier)
-
-            elif mode == "combine":
-                pdf, output = self.pdf_unique.get(), self.output_excel.get()
-                if not pdf:
-                    messagebox.showerror("Erreur", "Merci de sélectionner un fichier PDF combiné.")
-                    return
-                output_path = imperator_combine(pdf, output, progress_callback=self.update_progress, verifier=verifier)
-
-            elif mode == "manuel":
-                pdf, output = self.pdf_unique.get(), self.output_excel.get()
-                if not pdf:
-                    messagebox.showerror("Erreur", "Merci de sélectionner un fichier PDF pour le mode manuel.")
-                    return
-                output_path = imperator_manuel(pdf, output, progress_callback=self.update_progress, verifier=verifier)
-
-            messagebox.showinfo("Succès", f"Traitement terminé 🎉\nFichier mis à jour : {output_path}")
+            resultat = apercu(mode, pdfs, max(1, int(self.pages_apercu.get() or 1)), pages=options["pages"],
+                              verifier=options["verifier"], shards=options["shards"],
+                              appariement=options["appariement"], moities=options["moities"])
         except Exception as e:
             messagebox.showerror("Erreur", f"Une erreur est survenue : {e}")
+            return
+        self.update_progress(0, "Aperçu prêt")
+        FenetreApercu(self, resultat)
+
+    # --- File de documents ---
+    def ouvrir_file(self):
+        if self.file_documents is None:
+            self.file_documents = FileDocuments(self)
+        self.file_documents.afficher()
+
+    def options_traitement(self):
+        """Options communes (vérification, pages, shards, découpe des pages combinées) lues dans le formulaire."""
+        return {"verifier": self.verifier_traductions.get(), "pages": self.pages.get().strip() or None,
+                "shards": max(1, int(self.shards.get() or 1)),
+                "appariement": "llm" if self.appariement_llm.get() else "regles",
+                "moities": None if self.moities.get() == "non" else self.moities.get()}
 
     # --- Envoi vers Anki ---
     def send_to_anki(self):
@@ -438,8 +1128,372 @@ class MistralApp:
         )
 
 
+class FenetreApercu:
+    """Paires de l'aperçu, estimation du traitement complet et bouton pour le lancer."""
+
+    def __init__(self, app, resultat):
+        self.app = app
+        self.fenetre = tk.Toplevel(app.root)
+        self.fenetre.title(f"👁️ Aperçu ({resultat['mode']}, {resultat['pages_apercu']} page(s))")
+        self.fenetre.geometry("820x520")
+
+        arbre = ttk.Treeview(self.fenetre, columns=("page", "recto", "verso"), show="headings", height=16)
+        for colonne, titre, largeur in [("page", "Page", 60), ("recto", "Recto", 370), ("verso", "Verso", 370)]:
+            arbre.heading(colonne, text=titre)
+            arbre.column(colonne, width=largeur, anchor="center" if colonne == "page" else "w")
+        for recto, verso, _, page, _ in resultat["paires"].lignes():
+            arbre.insert("", "end", values=(page or "?", recto, verso))
+        arbre.pack(fill="both", expand=True, padx=10, pady=(10, 5))
+
+        # Le résumé texte sans ses lignes d'exemple : les paires sont dans le tableau
+        ttk.Label(self.fenetre, text=resume_apercu(resultat, exemples=0), justify="left",
+                  wraplength=790).pack(fill="x", padx=10)
+
+        frm_bas = ttk.Frame(self.fenetre)
+        frm_bas.pack(fill="x", padx=10, pady=8)
+        ttk.Button(frm_bas, text="🚀 Lancer le traitement complet", command=self.lancer).pack(side="left")
+        ttk.Button(frm_bas, text="Fermer", command=self.fenetre.destroy).pack(side="right")
+
+    def lancer(self):
+        self.fenetre.destroy()
+        self.app.run_processing()
+
+
+class TacheFile:
+    """Un document (ou un couple recto / verso) de la file de l'interface."""
+
+    def __init__(self, numero, mode, pdfs):
+        self.numero = numero
+        self.mode = mode
+        self.pdfs = pdfs
+        self.statut = "en attente"   # en attente → en file → en cours (⇄ en pause) → terminé | échec
+        self.message = ""
+        self.duree = None
+        self.paires = None
+        self.erreur = None
+        self.budget = None
+
+    @property
+    def libelle(self):
+        return " + ".join(os.path.basename(p) for p in self.pdfs)
+
+
+class FileDocuments:
+    """Fenêtre de file : plusieurs documents traités en parallèle, statut par job, relance des échecs."""
+
+    SYMBOLES = {"en attente": "⏳", "en file": "🕒", "en cours": "🔄", "en pause": "⏸", "terminé": "✅", "échec": "❌"}
+
+    def __init__(self, app):
+        self.app = app
+        self.fenetre = tk.Toplevel(app.root)
+        self.fenetre.title("📚 File de documents")
+        self.fenetre.geometry("820x460")
+        # Fermer la fenêtre la cache seulement : les jobs en cours continuent
+        self.fenetre.protocol("WM_DELETE_WINDOW", self.fenetre.withdraw)
+
+        self.taches = {}             # identifiant de ligne du Treeview → TacheFile
+        self.numero = 0
+        self.parallelisme = tk.IntVar(value=2)
+        self.pool = None
+        self.taille_pool = 0
+        # Les threads du pool ne touchent pas à Tk : ils déposent les mises à jour ici
+        self.evenements = queue.Queue()
+
+        frm_haut = ttk.Frame(self.fenetre)
+        frm_haut.pack(fill="x", padx=10, pady=8)
+        ttk.Button(frm_haut, text="➕ Fichiers", command=self.ajouter_fichiers).pack(side="left")
+        ttk.Button(frm_haut, text="📁 Dossier", command=self.ajouter_dossier).pack(side="left", padx=5)
+        ttk.Button(frm_haut, text="🗑 Retirer", command=self.retirer).pack(side="left")
+        ttk.Label(frm_haut, text="Parallélisme :").pack(side="left", padx=(20, 5))
+        ttk.Spinbox(frm_haut, from_=1, to=16, textvariable=self.parallelisme, width=4).pack(side="left")
+
+        colonnes = ("documents", "mode", "statut", "duree", "paires")
+        self.arbre = ttk.Treeview(self.fenetre, columns=colonnes, show="headings", height=14)
+        for colonne, titre, largeur in [("documents", "Document(s)", 330), ("mode", "Mode", 90),
+                                        ("statut", "Statut", 230), ("duree", "Durée", 70), ("paires", "Paires", 70)]:
+            self.arbre.heading(colonne, text=titre)
+            self.arbre.column(colonne, width=largeur, anchor="w" if colonne in ("documents", "statut") else "center")
+        self.arbre.pack(fill="both", expand=True, padx=10)
+        self.arbre.bind("<Double-1>", self.afficher_erreur)
+
+        frm_bas = ttk.Frame(self.fenetre)
+        frm_bas.pack(fill="x", padx=10, pady=8)
+        ttk.Button(frm_bas, text="▶ Lancer la file", command=self.lancer).pack(side="left")
+        ttk.Button(frm_bas, text="🔁 Relancer les échecs", command=self.relancer_echecs).pack(side="left", padx=5)
+        ttk.Button(frm_bas, text="▶ Reprendre (budget)", command=self.reprendre).pack(side="left")
+        self.resume = ttk.Label(frm_bas, text="File vide")
+        self.resume.pack(side="right")
+
+        self.fenetre.after(100, self.pomper)
+
+    def afficher(self):
+        self.fenetre.deiconify()
+        self.fenetre.lift()
+
+    # --- Ajout de documents ---
+    def ajouter_fichiers(self):
+        chemins = filedialog.askopenfilenames(parent=self.fenetre, filetypes=[("Fichiers PDF", "*.pdf")])
+        if chemins:
+            self.ajouter(chemins)
+
+    def ajouter_dossier(self):
+        dossier = filedialog.askdirectory(parent=self.fenetre)
+        if dossier:
+            self.ajouter([os.path.join(dossier, nom) for nom in os.listdir(dossier) if nom.lower().endswith(".pdf")])
+
+    def ajouter(self, chemins):
+        jobs, ignores = regrouper_pdf(chemins, mode_defaut=self.app.mode.get())
+        for mode, pdfs in jobs:
+            self.numero += 1
+            tache = TacheFile(self.numero, mode, pdfs)
+            iid = self.arbre.insert("", "end", values=self.valeurs(tache))
+            self.taches[iid] = tache
+        if ignores:
+            messagebox.showwarning("File", "Fichiers ignorés (recto sans verso, ou nom sans _recto / _verso en "
+                                           "mode Recto/Verso) :\n" + "\n".join(map(os.path.basename, ignores)),
+                                   parent=self.fenetre)
+        self.mettre_a_jour_resume()
+
+    def retirer(self):
+        for iid in self.arbre.selection():
+            if self.taches[iid].statut not in ("en file", "en cours", "en pause"):
+                self.arbre.delete(iid)
+                del self.taches[iid]
+        self.mettre_a_jour_resume()
+
+    # --- Exécution ---
+    def lancer(self):
+        a_lancer = [(iid, t) for iid, t in self.taches.items() if t.statut == "en attente"]
+        if not a_lancer:
+            return
+        try:
+            plafond = self.app.budget_formulaire()
+        except ValueError as e:
+            messagebox.showerror("Erreur", str(e), parent=self.fenetre)
+            return
+        n = max(1, int(self.parallelisme.get() or 1))
+        actives = any(t.statut in ("en file", "en cours", "en pause") for t in self.taches.values())
+        if self.pool is None or (n != self.taille_pool and not actives):
+            if self.pool is not None:
+                self.pool.shutdown(wait=False)
+            self.pool = ThreadPoolExecutor(max_workers=n, thread_name_prefix="file")
+            self.taille_pool = n
+        sortie = self.app.output_excel.get()
+        options = self.app.options_traitement()
+        for iid, tache in a_lancer:
+            tache.statut, tache.message, tache.erreur = "en file", "", None
+            # Un budget par job : le plafond atteint, le job se met en pause (les autres continuent)
+            tache.budget = None if plafond is None else estimation.Budget(
+                cout=plafond, attendre=True,
+                en_pause=lambda _, message, iid=iid: self.evenements.put((iid, "en pause", message)))
+            self.arbre.item(iid, values=self.valeurs(tache))
+            self.pool.submit(self.executer, iid, tache, sortie, options)
+        self.mettre_a_jour_resume()
+
+    def relancer_echecs(self):
+        """Remet les jobs en échec dans la file ; les jobs terminés ne sont pas refaits."""
+        for iid, tache in self.taches.items():
+            if tache.statut == "échec":
+                tache.statut = "en attente"
+                self.arbre.item(iid, values=self.valeurs(tache))
+        self.lancer()
+
+    def reprendre(self):
+        """Relève le budget des jobs en pause sélectionnés ; Annuler arrête le job (relançable ensuite)."""
+        for iid in self.arbre.selection():
+            tache = self.taches[iid]
+            if tache.statut != "en pause" or tache.budget is None:
+                continue
+            etat = tache.budget.etat()
+            plafond = simpledialog.askfloat(
+                "Budget", f"{tache.libelle} : {etat['pause']}.\nNouveau budget ($) ; Annuler = arrêter le job :",
+                parent=self.fenetre, minvalue=0.0, initialvalue=round(2 * (etat["limites"]["cout"] or 0), 2))
+            if plafond is None:
+                tache.budget.abandonner()
+                continue
+            # Avant de relancer le job : son événement "terminé" ne peut plus passer devant
+            self.evenements.put((iid, "en cours", "Reprise"))
+            tache.budget.reprendre(cout=plafond)
+
+    def executer(self, iid, tache, sortie, options):
+        """Thread du pool : traite un job et signale son avancement à la fenêtre."""
+        self.evenements.put((iid, "en cours", "OCR…"))
+        debut = time.time()
+        try:
+            # Exécution ouverte ici : lancer_mode la réutilise, on lit ensuite ses compteurs
+            with estimation.avec_budget(tache.budget), metriques.execution(mode=tache.mode, job=tache.numero) as m:
+                lancer_mode(tache.mode, tache.pdfs, sortie,
+                            progress_callback=lambda _, message: self.evenements.put((iid, "en cours", message)),
+                            **options)
+            tache.paires = m.compteurs.get("paires", 0)
+            statut, message = "terminé", ""
+        except Exception as e:
+            tache.erreur = f"{type(e).__name__}: {e}"
+            statut, message = "échec", str(e)
+        tache.duree = time.time() - debut
+        self.evenements.put((iid, statut, message))
+
+    def pomper(self):
+        """Applique les mises à jour des threads au Treeview (boucle Tk)."""
+        modifie = False
+        while True:
+            try:
+                iid, statut, message = self.evenements.get_nowait()
+            except queue.Empty:
+                break
+            tache = self.taches.get(iid)
+            if tache is None:
+                continue
+            tache.statut, tache.message = statut, message
+            self.arbre.item(iid, values=self.valeurs(tache))
+            modifie = True
+        if modifie:
+            self.mettre_a_jour_resume()
+        self.fenetre.after(100, self.pomper)
+
+    # --- Affichage ---
+    def valeurs(self, tache):
+        statut = f"{self.SYMBOLES[tache.statut]} {tache.statut}"
+        if tache.message and tache.statut in ("en cours", "en pause", "échec"):
+            statut += f" – {tache.message}"
+        duree = f"{tache.duree:.1f} s" if tache.duree is not None else ""
+        paires = tache.paires if tache.paires is not None and tache.statut == "terminé" else ""
+        return tache.libelle, tache.mode, statut, duree, paires
+
+    def mettre_a_jour_resume(self):
+        compte = {}
+        for tache in self.taches.values():
+            compte[tache.statut] = compte.get(tache.statut, 0) + 1
+        if not self.taches:
+            self.resume.config(text="File vide")
+            return
+        paires = sum(t.paires or 0 for t in self.taches.values() if t.statut == "terminé")
+        self.resume.config(text=f"{compte.get('terminé', 0)}/{len(self.taches)} terminés, "
+                                f"{compte.get('en cours', 0)} en cours, {compte.get('en pause', 0)} en pause, "
+                                f"{compte.get('échec', 0)} échec(s) – "
+                                f"{paires} paires")
+
+    def afficher_erreur(self, _evenement):
+        for iid in self.arbre.selection():
+            tache = self.taches[iid]
+            if tache.erreur:
+                messagebox.showerror(tache.libelle, tache.erreur, parent=self.fenetre)
+
+
+# --- Ligne de commande ---
+def demander_budget(budget, message):
+    """Pause en console : propose de relever chaque plafond du budget (vide = arrêter)."""
+    print(f"⏸ Pause, {message}")
+    nouveaux = {}
+    for nom, limite in budget.limites.items():
+        if limite is None:
+            continue
+        try:
+            reponse = input(f"Nouveau plafond {nom} (actuel {limite:g} ; vide = arrêter) : ").strip()
+        except EOFError:
+            reponse = ""
+        if not reponse:
+            budget.abandonner()
+            return
+        try:
+            nouveaux[nom] = float(reponse) if nom == "cout" else int(reponse)
+        except ValueError:
+            print(f"⚠️ Valeur invalide : {reponse}")
+            budget.abandonner()
+            return
+    budget.reprendre(**nouveaux)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR Mistral → paires Recto/Verso. Sans mode : interface graphique.")
+    parser.add_argument("mode", nargs="?", choices=sorted(MODES))
+    parser.add_argument("--recto", help="PDF recto (mode recto_verso)")
+    parser.add_argument("--verso", help="PDF verso (mode recto_verso)")
+    parser.add_argument("--pdf", help="PDF unique (modes combine / manuel)")
+    parser.add_argument("--sortie", default="resultats_traitement.xlsx", help="Fichier Excel de sortie")
+    parser.add_argument("--verifier", action="store_true", help="Vérifier les traductions (lent mais précis)")
+    parser.add_argument("--pages", help='Pages à traiter, ex. "1-10,15" (toutes par défaut)')
+    parser.add_argument("--shards", type=int, default=1, help="Découper le PDF en N plages traitées en parallèle")
+    parser.add_argument("--appariement", choices=("regles", "llm"), default="regles",
+                        help="Apparier par règles locales (défaut) ou par les agents Mistral, par fenêtres parallèles")
+    parser.add_argument("--moities", choices=sorted(DECOUPES),
+                        help="Mode combine : couper chaque page en deux (colonnes : gauche / droite, lignes : "
+                             "haut / bas), OCR des moitiés en parallèle et appariement local")
+    parser.add_argument("--batch", action="store_true",
+                        help="Passer l'OCR et les vérifications par l'API batch (traitement de nuit, voir batch_mistral.py)")
+    parser.add_argument("--batch-intervalle", type=float, default=30, help="Secondes entre deux interrogations du batch")
+    parser.add_argument("--profil", metavar="DOSSIER", help="Profiler l'exécution et écrire les rapports dans DOSSIER")
+    parser.add_argument("--estimer", action="store_true",
+                        help="Estimer pages OCR, appels API, jetons, durée et coût sans rien lancer, puis s'arrêter")
+    parser.add_argument("--historique", nargs="+", default=(), metavar="DOSSIER",
+                        help="Dossiers de *.metrics.json à ajouter à l'historique pour --estimer (ex. METRIQUES_DIR)")
+    parser.add_argument("--budget", type=float, metavar="DOLLARS",
+                        help="Plafond de dépense : pause (ou arrêt hors console) quand il est atteint")
+    parser.add_argument("--budget-pages", type=int, metavar="N", help="Plafond de pages passées à l'OCR")
+    parser.add_argument("--apercu", type=int, metavar="N",
+                        help="Traiter seulement les N premières pages, afficher les paires et l'estimation, puis s'arrêter")
+    args = parser.parse_args(argv)
+
+    if args.mode is None:
+        if tk is None:
+            parser.error("Tk n'est pas disponible : indiquer un mode pour travailler en ligne de commande")
+        root = tk.Tk()
+        MistralApp(root, dossier_profil=args.profil)
+        root.mainloop()
+        return
+
+    if args.mode == "recto_verso":
+        if not args.recto or not args.verso:
+            parser.error("le mode recto_verso demande --recto et --verso")
+        pdfs = (args.verso, args.recto)
+    else:
+        if not args.pdf:
+            parser.error(f"le mode {args.mode} demande --pdf")
+        pdfs = (args.pdf,)
+
+    if args.moities and args.mode != "combine":
+        parser.error("--moities ne s'applique qu'au mode combine")
+    if args.moities and args.batch:
+        parser.error("--moities ne s'applique pas au mode --batch")
+    options = {"moities": args.moities} if args.moities else {}
+
+    if args.estimer:
+        print(resume_estimation(estimer(args.mode, pdfs, pages=args.pages, verifier=args.verifier, shards=args.shards,
+                                        appariement=args.appariement, historique=args.historique, **options)))
+        return
+
+    if args.apercu:
+        print(resume_apercu(apercu(args.mode, pdfs, args.apercu, pages=args.pages, verifier=args.verifier,
+                                   shards=args.shards, appariement=args.appariement, **options)))
+        return
+
+    budget = None
+    if args.budget is not None or args.budget_pages is not None:
+        if args.batch:
+            parser.error("--budget ne s'applique pas au mode --batch (un seul job soumis d'avance)")
+        budget = estimation.Budget(cout=args.budget, pages=args.budget_pages, attendre=sys.stdin.isatty(),
+                                   en_pause=demander_budget)
+
+    if args.batch:
+        import batch_mistral
+        output = batch_mistral.imperator_batch(args.mode, pdfs, args.sortie,
+                                               progress_callback=lambda _, message: print(message),
+                                               verifier=args.verifier, pages=args.pages,
+                                               intervalle=args.batch_intervalle)
+    else:
+        try:
+            with estimation.avec_budget(budget):
+                output = lancer_mode(args.mode, pdfs, args.sortie, profil=args.profil,
+                                     progress_callback=lambda _, message: print(message), verifier=args.verifier,
+                                     pages=args.pages, shards=args.shards, appariement=args.appariement, **options)
+        except estimation.BudgetAtteint as e:
+            parser.exit(3, f"⏸ Traitement arrêté, {e}. Les pages déjà passées à l'OCR sont en cache : "
+                           f"relancer avec un budget plus élevé reprend sans les repayer.\n")
+    print(f"Fichier mis à jour : {output}")
+    if args.profil:
+        print(f"Profil écrit dans : {os.path.abspath(args.profil)}")
+
+
 # --- Lancement ---
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = MistralApp(root)
-    root.mainloop()
+    main()
@@ -0,0 +1,217 @@
+"""Appariement des lignes OCR par les agents Mistral configurés, par fenêtres parallèles.
+
+Les lignes nettoyées sont découpées en fenêtres qui se recouvrent (taille estimée
+en jetons, pour tenir dans le contexte et laisser la place à la réponse). Chaque
+fenêtre est envoyée à l'agent du mode (MISTRAL_AGENT_RECTO_VERSO / _COMBINE /
+_MANUEL, sur la clé qui le possède ; à défaut, au modèle de chat) qui doit
+répondre en JSON strict :
+
+    {"paires": [{"ligne": 12, "recto": "...", "verso": "..."}]}
+
+Quand les lignes connaissent leur page, les fenêtres sont faites de pages entières
+(et, en recto_verso, le verso envoyé est celui des mêmes pages). Les fenêtres partent en parallèle (capacité du pool de clés). Une réponse tronquée
+ou qui n'est pas du JSON valide est redemandée en deux demi-fenêtres. Les paires
+trouvées deux fois dans les recouvrements ne sont gardées qu'une fois.
+
+    python3 -u Imperator.py combine --pdf livre.pdf --appariement llm
+"""
+import bisect
+import json
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import metriques
+from doublons import normaliser
+from table_paires import TablePaires
+
+FENETRE_JETONS = int(os.getenv("IMPERATOR_FENETRE_JETONS", "3000"))
+CHEVAUCHEMENT = int(os.getenv("IMPERATOR_CHEVAUCHEMENT", "6"))
+SORTIE_MAX_JETONS = 8192
+LIGNES_MIN = 4            # une fenêtre plus petite n'est plus redécoupée
+MODELE_DEFAUT = "mistral-large-latest"
+
+CONSIGNES = {
+    "recto_verso": "La section RECTO contient les phrases d'origine et la section VERSO leurs traductions, "
+                   "dans le même ordre mais avec des décalages possibles (lignes manquantes, bruit) : "
+                   "apparie chaque ligne RECTO à sa traduction dans VERSO.",
+    "combine": "Chaque paire est une expression et sa traduction, sur une même ligne (souvent séparées "
+               "par « | ») ou sur deux lignes voisines.",
+    "manuel": "Chaque paire est une expression et sa traduction, souvent séparées par « : ».",
+}
+
+
+def estimer_jetons(texte):
+    """Estimation grossière (≈ 4 caractères par jeton), suffisante pour dimensionner les fenêtres."""
+    return len(texte) // 4 + 1
+
+
+def fenetres(lignes, jetons_max=FENETRE_JETONS, chevauchement=CHEVAUCHEMENT, debut=0, fin=None):
+    """Plages [début, fin) d'au plus `jetons_max` jetons ; chacune reprend les `chevauchement`
+    dernières lignes de la précédente."""
+    plages, n = [], len(lignes) if fin is None else fin
+    while debut < n:
+        fin, jetons = debut, 0
+        while fin < n and (fin == debut or jetons + estimer_jetons(lignes[fin]) <= jetons_max):
+            jetons += estimer_jetons(lignes[fin]) + 2
+            fin += 1
+        plages.append((debut, fin))
+        if fin >= n:
+            break
+        debut = max(fin - chevauchement, debut + 1)
+    return plages
+
+
+def fenetres_par_page(lignes, pages, jetons_max=FENETRE_JETONS, chevauchement=CHEVAUCHEMENT):
+    """Comme fenetres, mais les coupures tombent entre deux pages : une fenêtre regroupe des pages
+    entières (une page trop longue est découpée seule) et reprend la fin de la page précédente."""
+    blocs, debut = [], 0
+    for i in range(1, len(pages) + 1):
+        if i == len(pages) or pages[i] != pages[debut]:
+            blocs.append((debut, i))
+            debut = i
+    plages, groupe, jetons = [], None, 0
+
+    def ajouter(debut, fin):
+        # Débordement : la fenêtre reprend la fin de la page précédente
+        plages.append((max(0, debut - chevauchement) if plages else debut, fin))
+
+    for debut, fin in blocs:
+        cout = sum(estimer_jetons(lignes[i]) + 2 for i in range(debut, fin))
+        if groupe and jetons + cout > jetons_max:
+            ajouter(*groupe)
+            groupe, jetons = None, 0
+        if cout > jetons_max:
+            morceaux = fenetres(lignes, jetons_max, chevauchement, debut, fin)
+            ajouter(*morceaux[0])
+            plages.extend(morceaux[1:])
+            continue
+        groupe, jetons = (groupe[0] if groupe else debut, fin), jetons + cout
+    if groupe:
+        ajouter(*groupe)
+    return plages
+
+
+def _numeroter(lignes, debut, fin):
+    return "\n".join(f"[{i}] {lignes[i]}" for i in range(debut, fin))
+
+
+def prompt_appariement(mode, recto, debut, fin, verso=None, plage_verso=None):
+    if verso is not None:
+        texte = (f"RECTO :\n{_numeroter(recto, debut, fin)}\n\n"
+                 f"VERSO :\n{_numeroter(verso, *plage_verso)}")
+    else:
+        texte = f"LIGNES :\n{_numeroter(recto, debut, fin)}"
+    return (
+        "Tu reçois des lignes numérotées issues de l'OCR d'un manuel de vocabulaire bilingue. "
+        f"{CONSIGNES[mode]} Ignore les titres, consignes, numéros de page et le bruit.\n"
+        "Réponds uniquement avec un objet JSON de la forme "
+        '{"paires": [{"ligne": <numéro de la ligne du recto>, "recto": "...", "verso": "..."}]}, '
+        "en recopiant les textes tels quels, sans traduire ni corriger.\n\n" + texte
+    )
+
+
+def lire_paires_json(contenu, debut, fin):
+    """Valide la réponse de l'agent ; renvoie [(ligne, recto, verso)] ou lève ValueError."""
+    try:
+        donnees = json.loads(contenu)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"réponse non JSON : {e}") from None
+    if not isinstance(donnees, dict) or not isinstance(donnees.get("paires"), list):
+        raise ValueError('objet {"paires": [...]} attendu')
+    paires = []
+    for p in donnees["paires"]:
+        if not isinstance(p, dict) or not isinstance(p.get("recto"), str) or not isinstance(p.get("verso"), str):
+            raise ValueError(f"paire invalide : {p!r}")
+        recto, verso = p["recto"].strip(), p["verso"].strip()
+        if not recto or not verso:
+            continue
+        ligne = p.get("ligne")
+        paires.append((ligne if isinstance(ligne, int) and debut <= ligne < fin else -1, recto, verso))
+    return paires
+
+
+def _demander(clients, mode, message, max_tokens):
+    """Un appel à l'agent du mode ; le budget réserve le prompt et la réponse la plus longue."""
+    def appel(client, agent_id):
+        requete = {"messages": [{"role": "user", "content": message}], "max_tokens": max_tokens,
+                   "response_format": {"type": "json_object"}}
+        if agent_id:
+            return client.agents.complete(agent_id=agent_id, **requete)
+        return client.chat.complete(model=MODELE_DEFAUT, temperature=0.0, **requete)
+
+    with metriques.span("appariement_llm"):
+        reponse = clients.appeler(appel, mode=mode, depense={"jetons": estimer_jetons(message) + max_tokens})
+    metriques.compter("appels_api")
+    usage = getattr(reponse, "usage", None)
+    if usage is not None:
+        metriques.compter("tokens", getattr(usage, "total_tokens", 0) or 0)
+    return reponse.choices[0]
+
+
+def _plage_verso(debut, fin, recto, verso, chevauchement):
+    """Plage du verso qui correspond (mêmes pages, sinon proportionnellement, avec marge) aux lignes
+    recto [début, fin)."""
+    n_recto, n_verso = len(recto), len(verso)
+    if getattr(recto, "pages", None) and getattr(verso, "pages", None):
+        return (max(0, bisect.bisect_left(verso.pages, recto.pages[debut]) - chevauchement),
+                min(n_verso, bisect.bisect_right(verso.pages, recto.pages[fin - 1]) + chevauchement))
+    rapport = n_verso / max(1, n_recto)
+    return (max(0, math.floor(debut * rapport) - chevauchement),
+            min(n_verso, math.ceil(fin * rapport) + chevauchement))
+
+
+def traiter_fenetre(clients, mode, recto, debut, fin, verso=None, chevauchement=CHEVAUCHEMENT):
+    """Paires [(ligne, recto, verso)] d'une fenêtre ; redécoupée en deux si la réponse est inutilisable."""
+    plage_verso = _plage_verso(debut, fin, recto, verso, chevauchement) if verso is not None else None
+    message = prompt_appariement(mode, recto, debut, fin, verso, plage_verso)
+    max_tokens = min(SORTIE_MAX_JETONS, int(estimer_jetons(message) * 1.5) + 256)
+    choix = _demander(clients, mode, message, max_tokens)
+    try:
+        if choix.finish_reason == "length":
+            raise ValueError("réponse tronquée")
+        return lire_paires_json(choix.message.content, debut, fin)
+    except ValueError as e:
+        if fin - debut <= LIGNES_MIN:
+            print(f"⚠️ Fenêtre {debut}-{fin} abandonnée : {e}")
+            return []
+        metriques.compter("retries")
+        milieu = (debut + fin) // 2
+        recouvrement = min(chevauchement, (milieu - debut) // 2)
+        return (traiter_fenetre(clients, mode, recto, debut, milieu + recouvrement, verso, chevauchement)
+                + traiter_fenetre(clients, mode, recto, milieu - recouvrement, fin, verso, chevauchement))
+
+
+def apparier(mode, lignes, clients, document=None, jetons_max=FENETRE_JETONS, chevauchement=CHEVAUCHEMENT):
+    """Apparie les lignes nettoyées par LLM ; `lignes` : (recto, verso) en recto_verso, sinon la liste
+    des lignes du PDF. Renvoie une TablePaires (ligne : rang de la ligne recto, page si connue).
+
+    Avec des lignes paginées (nettoyage.LignesPaginees), les fenêtres suivent les pages."""
+    if mode == "recto_verso":
+        recto, verso = lignes
+        jetons_max //= 2  # la moitié du budget pour la plage du verso
+    else:
+        recto, verso = lignes, None
+    pages = getattr(recto, "pages", None)
+    plages = fenetres_par_page(recto, pages, jetons_max, chevauchement) if pages else fenetres(
+        recto, jetons_max, chevauchement)
+    if not plages:
+        return TablePaires()
+
+    with ThreadPoolExecutor(max_workers=max(1, min(len(plages), clients.capacite))) as pool:
+        futurs = [pool.submit(metriques.propager(traiter_fenetre), clients, mode, recto, debut, fin, verso,
+                              chevauchement)
+                  for debut, fin in plages]
+        resultats = [futur.result() for futur in futurs]
+    metriques.compter("fenetres_llm", len(plages))
+
+    # Ordre du document ; une paire vue dans deux fenêtres (recouvrement) n'est gardée qu'une fois
+    trouvees = sorted((ligne if ligne >= 0 else math.inf, rang, ligne, r, v)
+                      for rang, paires in enumerate(resultats) for ligne, r, v in paires)
+    table, vues = TablePaires(), set()
+    for _, _, ligne, r, v in trouvees:
+        cle = (normaliser(r), normaliser(v))
+        if cle not in vues:
+            vues.add(cle)
+            table.ajouter(r, v, document, pages[ligne] if pages and ligne >= 0 else 0, ligne)
+    return table
@@ -0,0 +1,238 @@
+"""Archive de l'OCR brut et rejeu hors ligne du nettoyage / de l'appariement.
+
+Chaque traitement archive, à côté de sa sortie, le markdown brut de chaque page :
+
+    resultats_traitement.ocr/
+        combine_livre_1a2b3c4d/
+            meta.json           mode, documents, pages, date, vérification, appariement, filtres...
+            pdf/page_0001.md    (recto/ et verso/ en recto_verso et en combine coupé en moitiés)
+            paires.jsonl        paires produites lors du traitement
+            ecartees.jsonl      candidates écartées (quasi-doublons, vérification)
+
+Le rejeu relance le nettoyage page par page, le filtre de langue, l'appariement
+recto / verso et les séparateurs combine / manuel sur l'archive, en parallèle et sans aucun appel API, puis
+compare les nouvelles paires aux anciennes :
+
+    python archive_ocr.py resultats_traitement.ocr --workers 4 --rapport diff.json
+    python archive_ocr.py resultats_traitement.ocr --appliquer --excel rejeu.xlsx
+
+Le filtre de langue est réglé comme lors du traitement, et les candidates écartées
+alors par l'index de quasi-doublons ou par la vérification le sont encore. Les
+traitements appariés par LLM ne sont pas rejoués.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import doublons
+import langues
+from cache_ocr import empreinte_fichier
+
+# IMPERATOR_ARCHIVE_OCR=0 désactive l'archivage
+ARCHIVAGE_ACTIF = os.getenv("IMPERATOR_ARCHIVE_OCR", "1") != "0"
+
+
+def dossier_archive(output_excel):
+    return os.path.splitext(output_excel)[0] + ".ocr"
+
+
+def archiver(output_excel, mode, documents, paires, pages=None, verifier=False, candidats=None,
+             appariement="regles", moities=None):
+    """Archive un traitement.
+
+    `documents` : {"recto": (chemin_pdf, [(numéro de page, markdown)]), "verso": ...} ou {"pdf": ...}.
+    `candidats` : paires avant quasi-doublons et vérification ; celles absentes de `paires`
+    sont notées comme écartées. `moities` : découpe des pages combinées ("colonnes", "lignes").
+    Renvoie le dossier du traitement (ou None si l'archivage est désactivé ou impossible).
+    """
+    if not ARCHIVAGE_ACTIF:
+        return None
+    try:
+        empreintes = {role: empreinte_fichier(chemin) for role, (chemin, _) in documents.items()}
+        # Sans découpe, la clé reste celle des archives existantes
+        parametres = [mode, sorted(empreintes.items()), pages] + ([moities] if moities else [])
+        cle = hashlib.sha256(json.dumps(parametres).encode()).hexdigest()[:8]
+        principal = documents.get("recto", documents.get("pdf"))[0]
+        nom = re.sub(r"[^\w.-]", "_", os.path.splitext(os.path.basename(principal))[0])
+        dossier = os.path.join(dossier_archive(output_excel), f"{mode}_{nom}_{cle}")
+
+        meta = {"mode": mode, "pages": pages, "moities": moities, "verifier": verifier, "appariement": appariement,
+                "filtre_langues": langues.ACTIF, "quasi_doublons": doublons.ACTION,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "documents": {}}
+        for role, (chemin, pages_texte) in documents.items():
+            os.makedirs(os.path.join(dossier, role), exist_ok=True)
+            for numero, texte in pages_texte:
+                with open(os.path.join(dossier, role, f"page_{numero:04d}.md"), "w", encoding="utf-8") as f:
+                    f.write(texte)
+            meta["documents"][role] = {"chemin": os.path.abspath(chemin), "empreinte": empreintes[role],
+                                       "pages": [numero for numero, _ in pages_texte]}
+        _ecrire_paires(os.path.join(dossier, "paires.jsonl"), paires)
+        if candidats is not None:
+            gardees = {_couple(p) for p in paires}
+            _ecrire_paires(os.path.join(dossier, "ecartees.jsonl"), [c for c in candidats if _couple(c) not in gardees])
+        with open(os.path.join(dossier, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        return dossier
+    except OSError as e:
+        print(f"⚠️ OCR brut non archivé : {e}")
+        return None
+
+
+def _couple(p):
+    return (p["Recto"], p["Verso"]) if isinstance(p, dict) else tuple(p[:2])
+
+
+def _ecrire_paires(chemin, paires):
+    with open(chemin, "w", encoding="utf-8") as f:
+        for p in paires:
+            recto, verso = _couple(p)
+            f.write(json.dumps({"Recto": recto, "Verso": verso}, ensure_ascii=False) + "\n")
+
+
+def _lire_paires(chemin):
+    if not os.path.exists(chemin):
+        return []
+    with open(chemin, encoding="utf-8") as f:
+        return [json.loads(ligne) for ligne in f if ligne.strip()]
+
+
+def lire_pages(dossier, role):
+    """Pages OCR brutes d'un document archivé, dans l'ordre : [(numéro de page, markdown)] (comme pages_ocr)."""
+    with open(os.path.join(dossier, "meta.json"), encoding="utf-8") as f:
+        numeros = json.load(f)["documents"][role]["pages"]
+    pages = []
+    for numero in numeros:
+        with open(os.path.join(dossier, role, f"page_{numero:04d}.md"), encoding="utf-8") as f:
+            pages.append((numero, f.read()))
+    return pages
+
+
+def lire_texte(dossier, role):
+    """Texte OCR brut d'un document archivé, pages dans l'ordre (comme process_pdf_with_mistral)."""
+    return "\n".join(texte for _, texte in lire_pages(dossier, role))
+
+
+def traitements(racine):
+    """Dossiers de traitement d'une archive (ou `racine` elle-même si c'est un traitement)."""
+    if os.path.exists(os.path.join(racine, "meta.json")):
+        return [racine]
+    return sorted(entree.path for entree in os.scandir(racine)
+                  if entree.is_dir() and os.path.exists(os.path.join(entree.path, "meta.json")))
+
+
+def rejouer_traitement(dossier):
+    """Recalcule les paires d'un traitement archivé avec les règles actuelles (aucun appel API).
+
+    Le filtre de langue est celui du traitement ; les candidates écartées alors (quasi-doublons,
+    vérification) le sont encore. Un traitement apparié par LLM n'est pas rejoué ("ignore").
+    """
+    from Imperator import candidats_mode, nettoyer_pages_brutes
+
+    with open(os.path.join(dossier, "meta.json"), encoding="utf-8") as f:
+        meta = json.load(f)
+    mode = meta["mode"]
+    resultat = {"dossier": dossier, "mode": mode, "verifier": meta.get("verifier", False)}
+    if meta.get("appariement", "regles") == "llm":
+        return {**resultat, "ignore": "apparié par LLM : pas de rejeu sans appel API"}
+
+    filtre_langues, langues.ACTIF = langues.ACTIF, meta.get("filtre_langues", langues.ACTIF)
+    try:
+        if "recto" in meta["documents"]:  # recto_verso, ou combine coupé en deux moitiés (recto : gauche / haut)
+            recto = nettoyer_pages_brutes(lire_pages(dossier, "recto"), profil="recto_verso")
+            verso = nettoyer_pages_brutes(lire_pages(dossier, "verso"), profil="recto_verso")
+            nouvelles = list(candidats_mode(mode, (recto, verso)).dicts())
+        else:
+            lignes = nettoyer_pages_brutes(lire_pages(dossier, "pdf"), profil=mode)
+            nouvelles = list(candidats_mode(mode, lignes).dicts())
+    finally:
+        langues.ACTIF = filtre_langues
+    ecartees = {_couple(p) for p in _lire_paires(os.path.join(dossier, "ecartees.jsonl"))}
+    nouvelles = [p for p in nouvelles if _couple(p) not in ecartees]
+    return {**resultat, "anciennes": _lire_paires(os.path.join(dossier, "paires.jsonl")), "nouvelles": nouvelles}
+
+
+def comparer(anciennes, nouvelles):
+    """Différence entre deux listes de paires {"Recto", "Verso"}."""
+    avant = {(p["Recto"], p["Verso"]) for p in anciennes}
+    apres = {(p["Recto"], p["Verso"]) for p in nouvelles}
+    return {
+        "avant": len(avant),
+        "apres": len(apres),
+        "ajoutees": sorted(apres - avant),
+        "supprimees": sorted(avant - apres),
+    }
+
+
+def rejouer(racine, workers=None, appliquer=False, excel=None, exemples=5):
+    """Rejoue tous les traitements de l'archive en parallèle ; renvoie le rapport de différences."""
+    dossiers = traitements(racine)
+    rapport = {"archive": os.path.abspath(racine), "traitements": {}, "total": {"avant": 0, "apres": 0,
+                                                                             "ajoutees": 0, "supprimees": 0}}
+    toutes = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for resultat in pool.map(rejouer_traitement, dossiers):
+            nom = os.path.basename(resultat["dossier"])
+            if "ignore" in resultat:
+                rapport["traitements"][nom] = {"mode": resultat["mode"], "ignore": resultat["ignore"]}
+                continue
+            diff = comparer(resultat["anciennes"], resultat["nouvelles"])
+            rapport["traitements"][nom] = {
+                "mode": resultat["mode"],
+                "avant": diff["avant"],
+                "apres": diff["apres"],
+                "ajoutees": len(diff["ajoutees"]),
+                "supprimees": len(diff["supprimees"]),
+                "exemples_ajoutees": diff["ajoutees"][:exemples],
+                "exemples_supprimees": diff["supprimees"][:exemples],
+                # Paires vérifiées par le modèle au traitement : le rejeu (sans API) ne revérifie pas
+                "verifiees_a_l_origine": resultat["verifier"],
+            }
+            for cle in ("avant", "apres"):
+                rapport["total"][cle] += diff[cle]
+            for cle in ("ajoutees", "supprimees"):
+                rapport["total"][cle] += len(diff[cle])
+            if appliquer:
+                _ecrire_paires(os.path.join(resultat["dossier"], "paires.jsonl"), resultat["nouvelles"])
+            toutes.extend(resultat["nouvelles"])
+    if excel:
+        from classeurs import ecrire_paires
+        ecrire_paires(excel, toutes)
+    return rapport
+
+
+def afficher(rapport):
+    for nom, r in rapport["traitements"].items():
+        if "ignore" in r:
+            print(f"{nom:<50} {r['mode']:<12} ignoré : {r['ignore']}")
+            continue
+        print(f"{nom:<50} {r['mode']:<12} {r['avant']:>7} → {r['apres']:<7} +{r['ajoutees']} -{r['supprimees']}")
+        for recto, verso in r["exemples_ajoutees"]:
+            print(f"    + {recto} | {verso}")
+        for recto, verso in r["exemples_supprimees"]:
+            print(f"    - {recto} | {verso}")
+    t = rapport["total"]
+    print(f"\nTotal : {t['avant']} → {t['apres']} paires (+{t['ajoutees']} / -{t['supprimees']})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="Dossier <sortie>.ocr (ou un de ses traitements)")
+    parser.add_argument("--workers", type=int, help="Processus en parallèle (défaut : nombre de cœurs)")
+    parser.add_argument("--rapport", help="Fichier JSON où écrire le rapport de différences")
+    parser.add_argument("--appliquer", action="store_true", help="Remplacer les paires archivées par les nouvelles")
+    parser.add_argument("--excel", help="Écrire toutes les nouvelles paires dans ce fichier (.xlsx, .csv...)")
+    args = parser.parse_args(argv)
+
+    rapport = rejouer(args.archive, args.workers, args.appliquer, args.excel)
+    afficher(rapport)
+    if args.rapport:
+        with open(args.rapport, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
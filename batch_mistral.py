@@ -0,0 +1,258 @@
+"""Mode batch (traitements de nuit) : OCR et vérifications via l'API batch de Mistral.
+
+Au lieu d'une requête par lot de pages et par paire à vérifier, toutes les
+requêtes d'un traitement sont écrites en JSONL, soumises comme un job batch,
+puis le résultat est fusionné dans les paires. Coût réduit et débit global
+élevé, au prix de la latence (de quelques minutes à quelques heures).
+
+    python3 -u Imperator.py combine --pdf livre.pdf --verifier --batch
+    python3 -u Imperator.py recto_verso --recto fr.pdf --verso es.pdf --batch --batch-intervalle 120
+
+Les fichiers JSONL et l'état des jobs sont gardés dans <sortie>.batch/ : si le
+processus est interrompu, le relancer reprend l'attente des jobs déjà soumis au
+lieu de les soumettre à nouveau.
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import time
+
+from mistralai import models
+
+import Imperator
+import metriques
+from decoupage_pdf import lot_pdf, nombre_pages
+from doublons import filtrer_quasi_doublons, indexer_paires
+from Imperator import (
+    analyser_pages, archiver_ocr, lire_verification, nettoyer_pages_brutes, ocr_lot, prompt_verification,
+    safe_append_to_excel, candidats_mode, terminer_execution, textes_des_pages,
+)
+
+ENDPOINT_CHAT = "/v1/chat/completions"
+ENDPOINT_OCR = "/v1/ocr"
+STATUTS_FINAUX = ("SUCCESS", "FAILED", "TIMEOUT_EXCEEDED", "CANCELLED")
+
+
+class EtatBatch:
+    """État persistant des jobs d'un traitement (<sortie>.batch/etat.json)."""
+
+    def __init__(self, dossier):
+        self.dossier = dossier
+        self.chemin = os.path.join(dossier, "etat.json")
+        os.makedirs(dossier, exist_ok=True)
+        self.donnees = {"cle": None, "lots": {}}
+        if os.path.exists(self.chemin):
+            with open(self.chemin, encoding="utf-8") as f:
+                self.donnees = json.load(f)
+
+    def job(self, nom, empreinte):
+        lot = self.donnees["lots"].get(nom)
+        return lot["job_id"] if lot and lot["empreinte"] == empreinte else None
+
+    def enregistrer(self, nom, empreinte, job_id, cle):
+        self.donnees["cle"] = cle
+        self.donnees["lots"][nom] = {"empreinte": empreinte, "job_id": job_id,
+                                     "soumis": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._sauvegarder()
+
+    def oublier(self, nom):
+        """Retire le job du lot : la prochaine exécution le soumettra à nouveau."""
+        if self.donnees["lots"].pop(nom, None) is not None:
+            self._sauvegarder()
+
+    def _sauvegarder(self):
+        with open(self.chemin, "w", encoding="utf-8") as f:
+            json.dump(self.donnees, f, indent=2)
+
+
+def ecrire_requetes(chemin, requetes):
+    """Écrit les requêtes (custom_id, corps) au format JSONL de l'API batch ; renvoie leur nombre."""
+    n = 0
+    with open(chemin, "w", encoding="utf-8") as f:
+        for custom_id, corps in requetes:
+            f.write(json.dumps({"custom_id": custom_id, "body": corps}, ensure_ascii=False) + "\n")
+            n += 1
+    return n
+
+
+def soumettre(client, chemin_jsonl, endpoint, model, metadata=None):
+    """Envoie le fichier JSONL et crée le job batch ; renvoie son identifiant."""
+    with open(chemin_jsonl, "rb") as f:
+        fichier = client.files.upload(file={"file_name": os.path.basename(chemin_jsonl), "content": f.read()},
+                                      purpose="batch")
+    job = client.batch.jobs.create(input_files=[fichier.id], endpoint=endpoint, model=model, metadata=metadata)
+    metriques.compter("appels_api", 2)
+    return job.id
+
+
+def attendre(client, job_id, intervalle=30, delai_max=None, rappel=None):
+    """Interroge le job jusqu'à un statut final ; `rappel(job)` est appelé à chaque interrogation."""
+    debut = time.monotonic()
+    while True:
+        job = client.batch.jobs.get(job_id=job_id)
+        metriques.compter("appels_api")
+        if rappel:
+            rappel(job)
+        if job.status in STATUTS_FINAUX:
+            return job
+        if delai_max is not None and time.monotonic() - debut > delai_max:
+            raise TimeoutError(f"Job batch {job_id} toujours {job.status} après {delai_max}s")
+        time.sleep(intervalle)
+
+
+def lire_resultats(client, job):
+    """Télécharge le fichier de sortie du job ; renvoie {custom_id: corps de la réponse} (réussites seulement)."""
+    if not job.output_file:
+        return {}
+    reponse = client.files.download(file_id=job.output_file)
+    reponse.read()
+    resultats = {}
+    for ligne in io.StringIO(reponse.content.decode("utf-8")):
+        if not ligne.strip():
+            continue
+        sortie = json.loads(ligne)
+        corps = (sortie.get("response") or {})
+        if corps.get("status_code") == 200 and not sortie.get("error"):
+            resultats[sortie["custom_id"]] = corps.get("body")
+    return resultats
+
+
+def executer_lot(cle, etat, nom, empreinte, preparer, endpoint, model, intervalle=30, delai_max=None,
+                 progress_callback=None):
+    """Soumet (ou reprend) un job batch et renvoie ses résultats {custom_id: corps}.
+
+    `preparer()` renvoie les requêtes (custom_id, corps) ; elle n'est appelée que si le job
+    n'a pas déjà été soumis lors d'une exécution précédente.
+    """
+    client = cle.client
+    job_id = etat.job(nom, empreinte)
+    if job_id is None:
+        chemin = os.path.join(etat.dossier, f"{nom}.jsonl")
+        n = ecrire_requetes(chemin, preparer())
+        if n == 0:
+            return {}
+        with metriques.span("batch_soumission"):
+            job_id = soumettre(client, chemin, endpoint, model, metadata={"lot": nom})
+        etat.enregistrer(nom, empreinte, job_id, cle.nom)
+        print(f"📤 Job batch {nom} soumis ({n} requêtes) : {job_id}")
+    else:
+        print(f"↩️ Reprise du job batch {nom} : {job_id}")
+
+    def rappel(job):
+        if progress_callback and job.total_requests:
+            progress_callback(int(100 * job.completed_requests / job.total_requests),
+                              f"Batch {nom} : {job.completed_requests}/{job.total_requests} ({job.status})")
+
+    with metriques.span("batch_attente"):
+        job = attendre(client, job_id, intervalle, delai_max, rappel)
+    if job.status != "SUCCESS":
+        etat.oublier(nom)  # sinon chaque relance reprendrait ce job mort
+        raise RuntimeError(f"Job batch {nom} ({job_id}) terminé en {job.status} ; relancer le soumet à nouveau")
+    with metriques.span("batch_resultats"):
+        return lire_resultats(client, job)
+
+
+def _empreinte(*parties):
+    return hashlib.sha256(json.dumps(parties, ensure_ascii=False, default=str).encode()).hexdigest()
+
+
+def _empreinte_fichier(chemin):
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+def ocr_batch(cle, etat, documents, pages=None, pages_per_batch=10, **options):
+    """OCR de plusieurs PDF en un seul job batch ; renvoie {rôle: [(numéro de page, markdown)]}.
+
+    Les lots absents des résultats (requête en échec) sont refaits en appel direct.
+    """
+    # Seuls (PDF, indices) sont gardés : les octets d'un lot sont construits au moment de l'envoi
+    lots = {}
+    for role, pdf_path in documents.items():
+        selection = analyser_pages(pages, nombre_pages(pdf_path))
+        for k, debut in enumerate(range(0, len(selection), pages_per_batch)):
+            lots[f"{role}:{k}"] = (pdf_path, selection[debut:debut + pages_per_batch])
+
+    def preparer():
+        for custom_id, (pdf_path, indices) in lots.items():
+            nom, contenu, _ = lot_pdf(pdf_path, indices)
+            with metriques.span("upload"):
+                fichier = cle.client.files.upload(file={"file_name": nom, "content": contenu}, purpose="ocr")
+                url = cle.client.files.get_signed_url(file_id=fichier.id).url
+            metriques.compter("appels_api", 2)
+            yield custom_id, {"document": {"type": "document_url", "document_url": url},
+                              "include_image_base64": False}
+
+    empreinte = _empreinte({r: _empreinte_fichier(p) for r, p in documents.items()}, pages, pages_per_batch)
+    resultats = executer_lot(cle, etat, "ocr", empreinte, preparer, ENDPOINT_OCR, "mistral-ocr-latest", **options)
+
+    pages_par_role = {role: [] for role in documents}
+    for custom_id, (pdf_path, indices) in lots.items():
+        corps = resultats.get(custom_id)
+        if corps is not None:
+            ocr_res = models.OCRResponse.model_validate(corps)
+        else:
+            print(f"⚠️ Lot {custom_id} absent du batch : OCR direct")
+            nom, contenu, _ = lot_pdf(pdf_path, indices)
+            ocr_res = Imperator.clients.appeler(functools.partial(ocr_lot, nom=nom, contenu=contenu),
+                                                depense={"pages": len(indices), "appels_api": 3})
+            metriques.compter("appels_api", 3)
+        metriques.compter("chunks")
+        pages_par_role[custom_id.split(":")[0]].extend(textes_des_pages(ocr_res, indices))
+    return pages_par_role
+
+
+def verification_batch(cle, etat, candidats, **options):
+    """Vérifie les candidats (TablePaires) en un job batch ; renvoie la table de ceux jugés fidèles."""
+    requetes = [(str(i), {"messages": [{"role": "user", "content": prompt_verification(r, v)}],
+                          "max_tokens": 3, "temperature": 0.0})
+                for i, (r, v) in enumerate(candidats)]
+    resultats = executer_lot(cle, etat, "verification", _empreinte(list(candidats)), lambda: requetes,
+                             ENDPOINT_CHAT, "mistral-large-latest", **options)
+    gardees = []
+    for i, (recto, verso) in enumerate(candidats):
+        corps = resultats.get(str(i))
+        if corps is None:
+            print(f"⚠️ Vérification absente du batch, paire écartée : {recto}")
+            continue
+        if lire_verification(models.ChatCompletionResponse.model_validate(corps)):
+            gardees.append(i)
+    return candidats.selection(gardees)
+
+
+def imperator_batch(mode, pdfs, output_excel, progress_callback=None, verifier=False, pages=None,
+                    ocr_en_batch=True, intervalle=30, delai_max=None):
+    """Traitement complet en mode batch ; `pdfs` dans l'ordre de Imperator.MODES (verso, recto) ou (pdf,)."""
+    start_time = time.time()
+    documents = {"recto": pdfs[1], "verso": pdfs[0]} if mode == "recto_verso" else {"pdf": pdfs[0]}
+    etat = EtatBatch(os.path.splitext(output_excel)[0] + ".batch")
+    options = {"intervalle": intervalle, "delai_max": delai_max, "progress_callback": progress_callback}
+
+    with metriques.execution(mode=mode, batch=True) as m, Imperator.clients.reserver(etat.donnees["cle"]) as cle:
+        if ocr_en_batch:
+            brutes = ocr_batch(cle, etat, documents, pages, **options)
+        else:
+            brutes = {role: Imperator.pages_ocr(pdf, pages=pages) for role, pdf in documents.items()}
+
+        profil = "recto_verso" if mode == "recto_verso" else mode
+        lignes = {role: nettoyer_pages_brutes(brutes[role], profil=profil) for role in brutes}
+        if mode == "recto_verso":
+            candidats = candidats_mode(mode, (lignes["recto"], lignes["verso"]), os.path.basename(documents["recto"]))
+        else:
+            candidats = candidats_mode(mode, lignes["pdf"], os.path.basename(documents["pdf"]))
+
+        filtres = filtrer_quasi_doublons(candidats, output_excel)
+        data = verification_batch(cle, etat, filtres, **options) if verifier and filtres else filtres
+        metriques.compter("paires", len(data))
+
+        safe_append_to_excel(data, output_excel)
+        indexer_paires(data, output_excel)
+        archiver_ocr(output_excel, mode, {role: (documents[role], brutes[role]) for role in documents},
+                     data, pages, verifier, candidats)
+    terminer_execution(m, output_excel, start_time, progress_callback)
+    return output_excel
@@ -0,0 +1,95 @@
+"""Découpage en lots d'un gros PDF scanné : pic de mémoire et taille des lots.
+
+    python bench/bench_decoupage.py --pages 50 500
+    python bench/bench_decoupage.py --pages 50 500 --ressources-partagees --ancien
+
+Le PDF (une image incompressible par page) est écrit objet par objet dans un
+dossier temporaire. Le pic de mémoire (tracemalloc) de decoupage_pdf.lots_pdf ne
+doit pas suivre la taille du document : le script sort en erreur si celui du plus
+gros document dépasse 1,5 fois celui du plus petit. --ancien mesure aussi
+l'ancien découpage (un seul PdfReader(chemin) pour tout le document).
+"""
+import argparse
+import gc
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import donnees  # noqa: E402
+from decoupage_pdf import lots_pdf, nombre_pages  # noqa: E402
+
+TOLERANCE = 1.5
+
+
+def lots_pdf_ancien(chemin, indices, pages_per_batch=10):
+    """Découpage d'avant decoupage_pdf : fichier entier en mémoire, lecteur partagé par tous les lots."""
+    from PyPDF2 import PdfReader, PdfWriter
+
+    reader = PdfReader(chemin)
+    for start in range(0, len(indices), pages_per_batch):
+        lot = indices[start:start + pages_per_batch]
+        writer = PdfWriter()
+        for i in lot:
+            writer.add_page(reader.pages[i])
+        tampon = io.BytesIO()
+        writer.write(tampon)
+        yield f"chunk_{lot[0] + 1}_to_{lot[-1] + 1}.pdf", tampon.getvalue(), lot
+
+
+def mesurer(decouper, chemin, pages_per_batch):
+    """Consomme les lots un à un (comme ocr_pages) ; renvoie (pic, plus gros lot, durée)."""
+    indices = list(range(nombre_pages(chemin)))
+    gc.collect()
+    tracemalloc.start()
+    debut = time.perf_counter()
+    plus_gros = 0
+    for _, contenu, _ in decouper(chemin, indices, pages_per_batch):
+        plus_gros = max(plus_gros, len(contenu))
+        del contenu
+    duree = time.perf_counter() - debut
+    _, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return pic, plus_gros, duree
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, nargs="+", default=[50, 500])
+    parser.add_argument("--octets-image", type=int, default=100_000)
+    parser.add_argument("--pages-par-lot", type=int, default=10)
+    parser.add_argument("--ressources-partagees", action="store_true",
+                        help="un seul /Resources listant toutes les images, partagé par toutes les pages")
+    parser.add_argument("--ancien", action="store_true", help="mesurer aussi l'ancien découpage")
+    args = parser.parse_args()
+
+    methodes = {"lots_pdf": lots_pdf}
+    if args.ancien:
+        methodes["ancien"] = lots_pdf_ancien
+    print(f"{'pages':>6} {'fichier (Mo)':>13} {'méthode':>9} {'pic (Mo)':>9} {'plus gros lot (Mo)':>19} {'durée (s)':>10}")
+    pics = {}
+    with tempfile.TemporaryDirectory() as dossier:
+        for n in args.pages:
+            chemin = donnees.pdf_scanne(os.path.join(dossier, f"scan_{n}.pdf"), n, args.octets_image,
+                                        args.ressources_partagees)
+            taille = os.path.getsize(chemin)
+            for nom, decouper in methodes.items():
+                pic, plus_gros, duree = mesurer(decouper, chemin, args.pages_par_lot)
+                pics[nom, n] = pic
+                print(f"{n:>6} {taille / 1e6:>13.1f} {nom:>9} {pic / 1e6:>9.1f} {plus_gros / 1e6:>19.2f} {duree:>10.2f}")
+            os.remove(chemin)
+
+    petit, gros = min(args.pages), max(args.pages)
+    rapport = pics["lots_pdf", gros] / pics["lots_pdf", petit]
+    print(f"\nPic lots_pdf {gros} pages / {petit} pages : x{rapport:.2f} (tolérance x{TOLERANCE})")
+    if gros > petit and rapport > TOLERANCE:
+        print("⚠️ Mémoire non bornée : le pic suit la taille du document")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Benchmark de l'index de quasi-doublons (MinHash + LSH) : temps de recherche, rappel, faux positifs.
+
+    python bench/bench_doublons.py --tailles 1000 10000 50000 [--requetes 500]
+
+Pour chaque taille d'index, on cherche des variantes bruitées de paires indexées
+(faute de frappe, guillemets, casse : doivent être trouvées) et des paires
+nouvelles (ne doivent pas l'être), et on compare au parcours complet des signatures.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import donnees  # noqa: E402
+from doublons import IndexQuasiDoublons  # noqa: E402
+
+
+def corpus_synthetique(n, graine):
+    """Paires de phrases sur un vocabulaire de quelques milliers de pseudo-mots (proche d'un vrai corpus)."""
+    rnd = random.Random(graine)
+    syllabes = [c + v for c in "bcdfglmnprstv" for v in "aeiou"]
+    vocabulaire = ["".join(rnd.choice(syllabes) for _ in range(rnd.randint(1, 4))) for _ in range(5000)]
+    return [(donnees.phrase(rnd, vocabulaire), donnees.phrase(rnd, vocabulaire)) for _ in range(n)]
+
+
+def variante(rnd, texte):
+    """Même phrase à une faute d'OCR près, avec des guillemets et une casse différents."""
+    i = rnd.randrange(len(texte))
+    texte = texte[:i] + rnd.choice("aeiourn") + texte[i + 1:]
+    return f"« {texte.upper() if rnd.random() < 0.3 else texte} »"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--requetes", type=int, default=500)
+    args = parser.parse_args()
+
+    rnd = random.Random(0)
+    print(f"{'paires':>8} {'ajout (s)':>10} {'LSH (ms/req)':>13} {'parcours (ms/req)':>18} {'rappel':>7} {'faux +':>7}")
+    for n in args.tailles:
+        with tempfile.TemporaryDirectory() as dossier:
+            index = IndexQuasiDoublons(os.path.join(dossier, "index.sqlite"))
+            corpus = corpus_synthetique(n, graine=1)
+            debut = time.perf_counter()
+            index.ajouter(corpus)
+            t_ajout = time.perf_counter() - debut
+
+            connues = [(variante(rnd, r), v) for r, v in rnd.sample(corpus, min(args.requetes, n))]
+            nouvelles = corpus_synthetique(args.requetes, graine=2)
+
+            debut = time.perf_counter()
+            trouvees = sum(index.chercher(r, v) is not None for r, v in connues)
+            fausses = sum(index.chercher(r, v) is not None for r, v in nouvelles)
+            t_lsh = (time.perf_counter() - debut) / (len(connues) + len(nouvelles))
+
+            signatures = np.array([index.signature(r, v) for r, v in corpus])
+            debut = time.perf_counter()
+            for r, v in connues[:50]:
+                (signatures == index.signature(r, v)).mean(axis=1).argmax()
+            t_parcours = (time.perf_counter() - debut) / min(50, len(connues))
+            index.fermer()
+
+        print(f"{n:>8} {t_ajout:>10.2f} {t_lsh * 1000:>13.2f} {t_parcours * 1000:>18.2f} "
+              f"{trouvees / len(connues):>7.1%} {fausses / len(nouvelles):>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
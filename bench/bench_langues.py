@@ -0,0 +1,72 @@
+"""Filtre de langue : débit (lignes/s) et lignes écartées à tort / à raison.
+
+    python bench/bench_langues.py --lignes 10000 100000
+
+Un document synthétique (français, puis espagnol) reçoit toutes les 20 lignes une
+consigne dans l'autre langue cible, une en anglais et une ligne de bruit (filet,
+numéro de page) : elles devraient être écartées, les phrases du document gardées.
+Les lignes courtes ou ambiguës sont gardées exprès, ce qui laisse passer une partie
+des intruses (ex. « p. 45 »).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import donnees  # noqa: E402
+import langues  # noqa: E402
+
+INTRUSES = {
+    "fr": {"autre cible": ["Traduce las frases siguientes al francés.", "Lee el texto y contesta a las preguntas."],
+           "anglais": ["Read the text and answer the questions below.", "Vocabulary list for unit three"]},
+    "es": {"autre cible": ["Traduisez les phrases suivantes en espagnol.", "Complétez le dialogue avec les mots."],
+           "anglais": ["Complete the dialogue with the words in the box.", "Listen and repeat after the teacher."]},
+}
+BRUIT = ["— 12 —", "***", "p. 45"]
+CATEGORIES = ("autre cible", "anglais", "bruit")
+
+
+def document(n, langue, graine):
+    rnd = random.Random(graine)
+    mots = donnees.MOTS_FR if langue == "fr" else donnees.MOTS_ES
+    lignes, categorie = [], []
+    for i in range(n):
+        lignes.append(f"{i % 99 + 1}. {donnees.phrase(rnd, mots)}")
+        categorie.append(None)
+        if i % 20 == 19:
+            intruses = [(c, rnd.choice(l)) for c, l in INTRUSES[langue].items()] + [("bruit", rnd.choice(BRUIT))]
+            for c, ligne in intruses:
+                lignes.append(ligne)
+                categorie.append(c)
+    return lignes, categorie
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--lignes", type=int, nargs="+", default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    langues.identifiant_pour(("fr", "es"))  # entraînement hors mesure
+    print(f"{'lignes':>8} {'langue':>7} {'lignes/s':>10} {'phrases écartées':>17} "
+          + " ".join(f"{'écartées : ' + c:>22}" for c in CATEGORIES))
+    for n in args.lignes:
+        for langue in ("fr", "es"):
+            lignes, categorie = document(n, langue, graine=n)
+            debut = time.perf_counter()
+            gardees = langues.filtrer_lignes(lignes, ("fr", "es"))
+            duree = time.perf_counter() - debut
+            restantes = set(gardees)
+
+            def taux_ecartees(cat):
+                concernees = [l for l, c in zip(lignes, categorie) if c == cat]
+                return sum(l not in restantes for l in concernees) / len(concernees)
+
+            print(f"{len(lignes):>8} {langue:>7} {len(lignes) / duree:>10.0f} {taux_ecartees(None):>17.2%} "
+                  + " ".join(f"{taux_ecartees(c):>22.1%}" for c in CATEGORIES))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark du moteur de nettoyage sur des dumps OCR de plusieurs Mo.
+
+    python bench/bench_nettoyage.py --mo 4 8 16 [--profil recto_verso] [--fichier dump.md]
+"""
+import argparse
+import io
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nettoyage import PROFILS, nettoyer_lignes, nettoyer_texte  # noqa: E402
+
+
+def nettoyer_ancien(texte):
+    """Ancienne version de nettoyer_texte_brut (trois re.sub sur tout le texte), pour comparaison."""
+    texte = re.sub(r'\b(Thème|Corrigé|Exercice|Partie|VOCABULAIRE|Chapitre|Première|Exercices|Troisièm e )\b.*', '', texte, flags=re.IGNORECASE)
+    texte = re.sub(r'#{1,}|={2,}|-{2,}', '', texte)
+    texte = re.sub(r'\s{2,}', ' ', texte)
+    return [l.strip() for l in texte.split('\n') if l.strip()]
+
+
+def generer_dump(taille_mo, graine=0):
+    """Génère un faux dump OCR markdown d'environ `taille_mo` Mo."""
+    rnd = random.Random(graine)
+    mots = ("la", "maison", "est", "grande", "el", "perro", "come", "une", "pomme", "rouge",
+            "nous", "vamos", "playa", "demain", "mañana", "été", "niño", "école", "trabajo")
+    cible = taille_mo * 1024 * 1024
+    morceaux, taille, n = [], 0, 0
+    while taille < cible:
+        n += 1
+        if n % 40 == 1:
+            ligne = f"# THÈME {n // 40 + 1} -- Exercice {n}"
+        elif n % 17 == 0:
+            ligne = "=" * 12
+        else:
+            ligne = f"{n % 99 + 1}. " + " ".join(rnd.choice(mots) for _ in range(rnd.randint(4, 14))) + "."
+        morceaux.append(ligne)
+        morceaux.append("")
+        taille += len(ligne) + 2
+    return "\n".join(morceaux)
+
+
+def chronometrer(fonction, *args):
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    return time.perf_counter() - debut, resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mo", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--profil", default="defaut", choices=sorted(PROFILS))
+    parser.add_argument("--fichier", help="Dump OCR réel à utiliser à la place du texte synthétique")
+    args = parser.parse_args()
+
+    if args.fichier:
+        with open(args.fichier, encoding="utf-8") as f:
+            dumps = [(os.path.getsize(args.fichier) / 1024 / 1024, f.read())]
+    else:
+        dumps = [(mo, generer_dump(mo)) for mo in args.mo]
+
+    print(f"{'Mo':>6} {'ancien (s)':>11} {'moteur (s)':>11} {'flux (s)':>9} {'Mo/s':>8} {'lignes':>9}")
+    for mo, texte in dumps:
+        t_ancien, _ = chronometrer(nettoyer_ancien, texte)
+        t_moteur, lignes = chronometrer(nettoyer_texte, texte, args.profil)
+        # Lecture en flux depuis un fichier : aucune copie complète du texte en mémoire
+        t_flux, _ = chronometrer(lambda: sum(1 for _ in nettoyer_lignes(io.StringIO(texte), args.profil)))
+        print(f"{mo:>6.1f} {t_ancien:>11.3f} {t_moteur:>11.3f} {t_flux:>9.3f} {mo / t_moteur:>8.1f} {len(lignes):>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Microbenchmarks des étapes locales du pipeline (aucun appel réseau).
+
+    python bench/bench_pipeline.py --tailles 1000 10000 100000 --sortie bench/resultats/actuel.json
+    python bench/bench_pipeline.py --comparer bench/resultats/reference.json --tolerance 0.25
+
+Chaque étape est chronométrée (meilleur de --repetitions) puis rejouée sous
+tracemalloc pour mesurer le pic mémoire. Avec --comparer, le script sort en
+erreur si une étape est plus lente (ou plus gourmande) que la référence
+au-delà de la tolérance.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd  # noqa: E402
+
+import donnees  # noqa: E402
+from classeurs import ecrire_paires, lire_paires  # noqa: E402
+from Imperator import (  # noqa: E402
+    apparier_phrases, cartes_depuis_dataframe, lots_de_notes, nettoyer_texte_brut, safe_append_to_excel,
+    separer_lignes,
+)
+
+# Excel est limité à 1 048 576 lignes : au-delà, l'étape est ignorée
+LIGNES_MAX_EXCEL = 1_048_575
+
+
+def etapes(n, dossier):
+    """Renvoie {nom: préparation} pour une taille n ; la préparation renvoie la fonction chronométrée,
+    ou (fonction, remise) quand l'état doit être remis à zéro (hors chrono) avant chaque répétition."""
+    def nettoyage():
+        texte = donnees.texte_ocr(n, donnees.MOTS_FR)
+        return lambda: nettoyer_texte_brut(texte, profil="recto_verso")
+
+    def appariement():
+        recto = nettoyer_texte_brut(donnees.texte_ocr(n, donnees.MOTS_FR, graine=1), profil="recto_verso")
+        verso = nettoyer_texte_brut(donnees.texte_ocr(n, donnees.MOTS_ES, graine=2), profil="recto_verso")
+        return lambda: apparier_phrases(recto, verso)
+
+    def separateur_combine():
+        lignes = donnees.lignes_separees(n, "|")
+        return lambda: list(separer_lignes(lignes, "|"))
+
+    def separateur_manuel():
+        lignes = donnees.lignes_separees(n, ":")
+        return lambda: list(separer_lignes(lignes, ":"))
+
+    def excel_append():
+        existant = donnees.paires(n, graine=3)
+        nouveaux = donnees.paires(max(1, n // 10), graine=4)
+        chemin = os.path.join(dossier, f"append_{n}.xlsx")
+        original = os.path.join(dossier, f"append_{n}.original.xlsx")
+        pd.DataFrame(existant, columns=["Recto", "Verso"]).to_excel(original, index=False)
+        # Chaque répétition part du même classeur : sinon elle mesure celui, plus gros, de la précédente
+        return lambda: safe_append_to_excel(nouveaux, chemin), lambda: shutil.copyfile(original, chemin)
+
+    def anki_dataframe():
+        df = pd.DataFrame(donnees.paires(n, graine=5), columns=["Recto", "Verso"])
+        return lambda: cartes_depuis_dataframe(df)
+
+    def anki_flux():
+        chemin = os.path.join(dossier, f"flux_{n}.xlsx")
+        ecrire_paires(chemin, donnees.paires(n, graine=6))
+        return lambda: sum(len(lot) for lot in lots_de_notes(lire_paires(chemin)))
+
+    toutes = {
+        "nettoyage": nettoyage,
+        "appariement": appariement,
+        "separateur_combine": separateur_combine,
+        "separateur_manuel": separateur_manuel,
+        "excel_append": excel_append,
+        "anki_dataframe": anki_dataframe,
+        "anki_flux": anki_flux,
+    }
+    if n > LIGNES_MAX_EXCEL:
+        del toutes["excel_append"], toutes["anki_flux"]
+    return toutes
+
+
+def _preparer(preparer):
+    etape = preparer()
+    return etape if isinstance(etape, tuple) else (etape, lambda: None)
+
+
+def mesurer(preparer, repetitions, memoire):
+    fonction, remise = _preparer(preparer)
+    durees = []
+    for _ in range(repetitions):
+        remise()
+        debut = time.perf_counter()
+        fonction()
+        durees.append(time.perf_counter() - debut)
+    resultat = {"secondes": min(durees)}
+    if memoire:
+        fonction, remise = _preparer(preparer)
+        remise()
+        tracemalloc.start()
+        fonction()
+        resultat["pic_memoire_octets"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return resultat
+
+
+def commit_git():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def comparer(actuel, reference, tolerance):
+    """Renvoie la liste des régressions (étape, taille, mesure, ancien, nouveau)."""
+    regressions = []
+    for taille, mesures in actuel["resultats"].items():
+        for etape, valeurs in mesures.items():
+            ancien = reference["resultats"].get(taille, {}).get(etape)
+            if not ancien:
+                continue
+            for cle in ("secondes", "pic_memoire_octets"):
+                if cle in valeurs and cle in ancien and valeurs[cle] > ancien[cle] * (1 + tolerance):
+                    regressions.append((etape, taille, cle, ancien[cle], valeurs[cle]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tailles", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--etapes", nargs="+", help="Limiter aux étapes indiquées")
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument("--sans-memoire", action="store_true", help="Ne pas mesurer le pic mémoire")
+    parser.add_argument("--sortie", help="Fichier JSON où enregistrer les résultats")
+    parser.add_argument("--comparer", help="Fichier JSON de référence")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Dégradation tolérée (0.25 = +25%%)")
+    args = parser.parse_args()
+
+    rapport = {
+        "commit": commit_git(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "resultats": {},
+    }
+
+    with tempfile.TemporaryDirectory() as dossier:
+        for n in args.tailles:
+            rapport["resultats"][str(n)] = {}
+            for nom, preparer in etapes(n, dossier).items():
+                if args.etapes and nom not in args.etapes:
+                    continue
+                res = mesurer(preparer, args.repetitions, not args.sans_memoire)
+                rapport["resultats"][str(n)][nom] = res
+                memoire = res.get("pic_memoire_octets")
+                memoire = f"{memoire / 1024 / 1024:9.1f} Mo" if memoire is not None else ""
+                print(f"{nom:<20} {n:>9} lignes  {res['secondes']:9.4f} s  {memoire}", flush=True)
+
+    if args.sortie:
+        os.makedirs(os.path.dirname(os.path.abspath(args.sortie)), exist_ok=True)
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2)
+
+    if args.comparer:
+        with open(args.comparer, encoding="utf-8") as f:
+            reference = json.load(f)
+        regressions = comparer(rapport, reference, args.tolerance)
+        for etape, taille, cle, ancien, nouveau in regressions:
+            print(f"❌ Régression {etape} ({taille} lignes, {cle}) : {ancien:.4g} → {nouveau:.4g}")
+        if regressions:
+            sys.exit(1)
+        print(f"✅ Aucune régression (référence {reference.get('commit')})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Mémoire par paire : liste de dicts {"Recto", "Verso"} / DataFrame / TablePaires.
+
+    python bench/bench_table.py --paires 100000 1000000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import donnees  # noqa: E402
+from table_paires import TablePaires  # noqa: E402
+
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
+
+def generer(n):
+    """Textes produits un à un (comme l'appariement), sans garder de copie à côté de la structure mesurée."""
+    rnd = random.Random(3)
+    for i in range(n):
+        yield f"{donnees.phrase(rnd, donnees.MOTS_FR)} #{i}", f"{donnees.phrase(rnd, donnees.MOTS_ES)} #{i}"
+
+
+def mesurer(construire, n):
+    gc.collect()
+    tracemalloc.start()
+    debut = time.perf_counter()
+    structure = construire(n)
+    duree = time.perf_counter() - debut
+    courant, pic = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return structure, courant, pic, duree
+
+
+def en_dicts(n):
+    return [{"Recto": r, "Verso": v} for r, v in generer(n)]
+
+
+def en_dataframe(n):
+    return pd.DataFrame(en_dicts(n))
+
+
+def en_table(n):
+    table = TablePaires()
+    for r, v in generer(n):
+        table.ajouter(r, v, "livre.pdf", page=1)
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--paires", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    texte = sum(len(r.encode()) + len(v.encode()) for r, v in generer(10_000)) / 10_000
+    print(f"Texte UTF-8 moyen : {texte:.0f} octets par paire\n")
+    structures = [("dicts", en_dicts), ("TablePaires", en_table)]
+    if pd is not None:
+        structures.insert(1, ("DataFrame", en_dataframe))
+    print(f"{'paires':>9} {'structure':<12} {'octets/paire':>13} {'pic/paire':>10} {'construction (s)':>17} {'parcours (s)':>13}")
+    for n in args.paires:
+        for nom, construire in structures:
+            structure, courant, pic, duree = mesurer(construire, n)
+            debut = time.perf_counter()
+            if nom == "DataFrame":
+                for _ in zip(structure["Recto"], structure["Verso"]):
+                    pass
+            else:
+                for _ in structure:
+                    pass
+            parcours = time.perf_counter() - debut
+            print(f"{n:>9} {nom:<12} {courant / n:>13.0f} {pic / n:>10.0f} {duree:>17.2f} {parcours:>13.2f}")
+            del structure
+        # Vue sans copie : la tranche partage le stockage
+        table = en_table(n)
+        debut = time.perf_counter()
+        vues = [table[i:i + 1000] for i in range(0, n, 1000)]
+        print(f"{'':>9} {len(vues)} tranches de 1000 paires en {time.perf_counter() - debut:.4f} s "
+              f"(stockage partagé : {table.taille_octets() / n:.0f} octets/paire)\n")
+
+
+if __name__ == "__main__":
+    main()
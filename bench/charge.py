@@ -0,0 +1,176 @@
+"""Test de charge de bout en bout contre les faux serveurs Mistral et AnkiConnect.
+
+    python bench/charge.py --jobs 8 --concurrence 4 --pages 30 --latence 0.05 --taux-429 0.02
+    python bench/charge.py --modes combine manuel --verifier --sortie charge.json
+
+Lance imperator / imperator_combine / imperator_manuel sur des PDF synthétiques,
+puis send_to_anki sur les classeurs produits, et mesure débit, latences p50/p99
+(par job et par route côté serveur) et nombre de requêtes.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# Chaque passe doit payer son OCR : pas de cache entre les mesures, ni d'historique faussé
+os.environ.setdefault("IMPERATOR_CACHE_OCR", "0")
+os.environ.setdefault("IMPERATOR_HISTORIQUE", "0")
+
+import donnees  # noqa: E402
+import Imperator  # noqa: E402
+from clients_mistral import PoolClients  # noqa: E402
+from faux_serveurs import Config, FauxAnkiConnect, FauxMistral  # noqa: E402
+
+MODES = ("recto_verso", "combine", "manuel", "anki")
+
+
+def centile(valeurs, p):
+    if not valeurs:
+        return None
+    valeurs = sorted(valeurs)
+    rang = min(len(valeurs) - 1, max(0, round(p / 100 * (len(valeurs) - 1))))
+    return valeurs[rang]
+
+
+def preparer_entrees(dossier, n_jobs, pages):
+    """Crée les PDF synthétiques de chaque job."""
+    entrees = {"recto_verso": [], "combine": [], "manuel": []}
+    for k in range(n_jobs):
+        recto = donnees.pdf_synthetique(os.path.join(dossier, f"job{k}_recto.pdf"), pages, "fr")
+        verso = donnees.pdf_synthetique(os.path.join(dossier, f"job{k}_verso.pdf"), pages, "es")
+        entrees["recto_verso"].append((verso, recto))
+        entrees["combine"].append((donnees.pdf_synthetique(os.path.join(dossier, f"job{k}_combine.pdf"), pages, "combine"),))
+        entrees["manuel"].append((donnees.pdf_synthetique(os.path.join(dossier, f"job{k}_manuel.pdf"), pages, "manuel"),))
+    return entrees
+
+
+def lancer_job(mode, entree, sortie, verifier):
+    debut = time.perf_counter()
+    erreur = None
+    try:
+        if mode == "recto_verso":
+            Imperator.imperator(*entree, sortie, verifier=verifier)
+        elif mode == "combine":
+            Imperator.imperator_combine(*entree, sortie, verifier=verifier)
+        elif mode == "manuel":
+            Imperator.imperator_manuel(*entree, sortie, verifier=verifier)
+        else:
+            Imperator.envoyer_excel_vers_anki(entree[0], deck_name=f"Charge::{os.path.basename(entree[0])}")
+    except Exception as e:
+        erreur = f"{type(e).__name__}: {e}"
+    return time.perf_counter() - debut, erreur
+
+
+def mesurer_mode(mode, entrees, dossier, concurrence, verifier, serveurs):
+    for serveur in serveurs:
+        serveur.stats.remettre_a_zero()
+    sorties = [os.path.join(dossier, f"{mode}_{k}.xlsx") for k in range(len(entrees))]
+    debut = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrence) as pool:
+        resultats = list(pool.map(lambda args: lancer_job(mode, args[0], args[1], verifier), zip(entrees, sorties)))
+    duree = time.perf_counter() - debut
+
+    durees = [d for d, _ in resultats]
+    erreurs = [e for _, e in resultats if e]
+    rapport = {
+        "jobs": len(resultats),
+        "erreurs": len(erreurs),
+        "exemples_erreurs": erreurs[:3],
+        "duree_totale_s": duree,
+        "jobs_par_s": len(resultats) / duree if duree else None,
+        "job_p50_s": centile(durees, 50),
+        "job_p99_s": centile(durees, 99),
+        "routes": {},
+    }
+    for serveur in serveurs:
+        stats = serveur.stats.instantane()
+        for route, n in stats["requetes"].items():
+            latences = stats["latences"][route]
+            rapport["routes"][route] = {
+                "requetes": n,
+                "par_s": n / duree if duree else None,
+                "p50_s": centile(latences, 50),
+                "p99_s": centile(latences, 99),
+            }
+        for cle, n in stats["cles"].items():
+            rapport.setdefault("cles", {})
+            rapport["cles"][cle] = rapport["cles"].get(cle, 0) + n
+        for statut, n in stats["statuts"].items():
+            rapport.setdefault("statuts", {})
+            rapport["statuts"][statut] = rapport["statuts"].get(statut, 0) + n
+    return rapport, sorties
+
+
+def afficher(mode, rapport):
+    print(f"\n=== {mode} : {rapport['jobs']} jobs, {rapport['erreurs']} en erreur, "
+          f"{rapport['duree_totale_s']:.2f} s ({rapport['jobs_par_s']:.2f} jobs/s), "
+          f"p50 {rapport['job_p50_s']:.3f} s, p99 {rapport['job_p99_s']:.3f} s")
+    for route, r in sorted(rapport["routes"].items()):
+        print(f"  {route:<32} {r['requetes']:>6} req  {r['par_s']:>8.1f}/s  "
+              f"p50 {r['p50_s'] * 1000:7.1f} ms  p99 {r['p99_s'] * 1000:7.1f} ms")
+    if rapport.get("statuts"):
+        print(f"  statuts HTTP : {rapport['statuts']}")
+    if rapport.get("cles"):
+        print(f"  requêtes par clé : {rapport['cles']}")
+    for e in rapport["exemples_erreurs"]:
+        print(f"  ⚠️ {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--jobs", type=int, default=4, help="Documents traités par mode")
+    parser.add_argument("--concurrence", type=int, default=2, help="Jobs lancés en parallèle")
+    parser.add_argument("--pages", type=int, default=20, help="Pages par PDF synthétique")
+    parser.add_argument("--lignes-par-page", type=int, default=20)
+    parser.add_argument("--verifier", action="store_true", help="Activer la vérification des traductions")
+    parser.add_argument("--latence", type=float, default=0.0)
+    parser.add_argument("--gigue", type=float, default=0.0)
+    parser.add_argument("--taux-erreur", type=float, default=0.0)
+    parser.add_argument("--taux-429", type=float, default=0.0)
+    parser.add_argument("--graine", type=int, default=0)
+    parser.add_argument("--cles", type=int, default=1, help="Nombre de clés API dans le pool")
+    parser.add_argument("--cles-refusees", type=int, default=0, help="Dont N clés refusées (401) par le serveur")
+    parser.add_argument("--max-requetes", type=int, default=Imperator.MAX_REQUETES_MISTRAL,
+                        help="Requêtes simultanées par clé")
+    parser.add_argument("--sortie", help="Fichier JSON où enregistrer le rapport")
+    args = parser.parse_args()
+
+    cles = [f"charge-{i + 1}" for i in range(args.cles)]
+    config = Config(args.latence, args.gigue, args.taux_erreur, args.taux_429,
+                    lignes_par_page=args.lignes_par_page, graine=args.graine,
+                    cles_refusees=cles[:args.cles_refusees])
+    with FauxMistral(config) as mistral, FauxAnkiConnect(config) as anki, \
+            tempfile.TemporaryDirectory() as dossier:
+        Imperator.clients = PoolClients(cles, server_url=mistral.url, max_requetes=args.max_requetes)
+        Imperator.ANKI_CONNECT_URL = anki.url
+
+        entrees = preparer_entrees(dossier, args.jobs, args.pages)
+        rapport = {"parametres": vars(args), "modes": {}}
+        sorties = []
+        for mode in args.modes:
+            if mode == "anki":
+                if not sorties:  # pas encore de classeurs : on en produit avec le mode combiné
+                    _, sorties = mesurer_mode("combine", entrees["combine"], dossier, args.concurrence, False, [mistral])
+                resultat, _ = mesurer_mode("anki", [(s,) for s in sorties if os.path.exists(s)], dossier,
+                                           args.concurrence, False, [anki])
+            else:
+                resultat, sorties = mesurer_mode(mode, entrees[mode], dossier, args.concurrence,
+                                                 args.verifier, [mistral])
+            resultat["pages_par_s"] = (args.jobs * args.pages * (2 if mode == "recto_verso" else 1)
+                                       / resultat["duree_totale_s"]) if mode != "anki" else None
+            rapport["modes"][mode] = resultat
+            afficher(mode, resultat)
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(rapport, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
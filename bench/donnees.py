@@ -0,0 +1,115 @@
+"""Générateurs de données synthétiques (texte OCR bilingue, classeurs) pour les benchmarks."""
+import random
+
+MOTS_FR = ("la", "maison", "est", "grande", "nous", "allons", "à", "plage", "demain", "une", "pomme",
+           "rouge", "le", "chien", "mange", "été", "école", "travail", "enfant", "joue", "dans", "jardin")
+MOTS_ES = ("la", "casa", "es", "grande", "vamos", "a", "playa", "mañana", "una", "manzana", "roja",
+           "el", "perro", "come", "verano", "escuela", "trabajo", "niño", "juega", "en", "jardín")
+
+
+def phrase(rnd, mots):
+    return " ".join(rnd.choice(mots) for _ in range(rnd.randint(4, 12))).capitalize() + "."
+
+
+def texte_ocr(n_lignes, mots, graine=0, bruit=True):
+    """Texte OCR markdown numéroté, avec des titres et du bruit comme dans les vrais dumps."""
+    rnd = random.Random(graine)
+    lignes = []
+    for i in range(n_lignes):
+        if bruit and i % 50 == 0:
+            lignes.append(f"# THÈME {i // 50 + 1}")
+        if bruit and i % 23 == 0:
+            lignes.append("---")
+        lignes.append(f"{i % 99 + 1}. {phrase(rnd, mots)}")
+        lignes.append("")
+    return "\n".join(lignes)
+
+
+def paires(n, graine=0):
+    """Liste de paires {"Recto", "Verso"} comme celles produites par les modes de traitement."""
+    rnd = random.Random(graine)
+    return [{"Recto": f"{phrase(rnd, MOTS_FR)} #{i}", "Verso": f"{phrase(rnd, MOTS_ES)} #{i}"} for i in range(n)]
+
+
+def lignes_separees(n, separateur, graine=0):
+    """Lignes "recto <sep> verso" telles que renvoyées par les agents combine / manuel."""
+    return [f"{p['Recto']} {separateur} {p['Verso']}" for p in paires(n, graine)]
+
+
+def ligne_ocr(style, page, i):
+    """Ligne déterministe renvoyée par le faux OCR pour (style, page, i) : recto et verso restent alignés."""
+    rnd = random.Random(page * 100_003 + i)
+    fr, es = phrase(rnd, MOTS_FR), phrase(rnd, MOTS_ES)
+    numero = i % 99 + 1
+    if style == "fr":
+        return f"{numero}. {fr}"
+    if style == "es":
+        return f"{numero}. {es}"
+    if style == "combine":
+        return f"{numero} {es} | {fr}"
+    return f"{es} : {fr}"
+
+
+def pdf_synthetique(chemin, n_pages, style):
+    """Écrit un PDF de pages blanches marquées "% imperator:<style>:<page>".
+
+    Le marqueur est un commentaire dans le flux de contenu : il survit au découpage
+    en lots de process_pdf_with_mistral et permet au faux OCR de savoir quoi renvoyer.
+    """
+    from PyPDF2 import PageObject, PdfWriter
+    from PyPDF2.generic import DecodedStreamObject, NameObject
+
+    writer = PdfWriter()
+    for k in range(n_pages):
+        page = PageObject.create_blank_page(width=595, height=842)
+        contenu = DecodedStreamObject()
+        contenu.set_data(f"% imperator:{style}:{k}\n".encode())
+        page[NameObject("/Contents")] = contenu
+        writer.add_page(page)
+    with open(chemin, "wb") as f:
+        writer.write(f)
+    return chemin
+
+
+def pdf_scanne(chemin, n_pages, octets_image=100_000, ressources_partagees=False, style="fr"):
+    """Écrit, objet par objet (sans tout garder en mémoire), un PDF « scanné » : une image
+    incompressible par page, et le marqueur "% imperator:<style>:<page>" du faux OCR.
+
+    Avec ressources_partagees, toutes les pages pointent vers un même /Resources qui
+    liste toutes les images (cas courant des scanners).
+    """
+    import os
+
+    cote = int(octets_image ** 0.5)
+    partage = 3
+    objet = lambda k, rang: 4 + 3 * k + rang  # noqa: E731  page, contenu, image de la page k
+    positions = {}
+    with open(chemin, "wb") as f:
+        def ecrire(numero, corps, flux=None):
+            positions[numero] = f.tell()
+            f.write(f"{numero} 0 obj\n".encode() + corps)
+            if flux is not None:
+                f.write(b"\nstream\n" + flux + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        ecrire(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        kids = " ".join(f"{objet(k, 0)} 0 R" for k in range(n_pages))
+        ecrire(2, f"<< /Type /Pages /Count {n_pages} /Kids [{kids}] >>".encode())
+        images = " ".join(f"/Im{k} {objet(k, 2)} 0 R" for k in range(n_pages))
+        ecrire(partage, f"<< /XObject << {images} >> >>".encode())
+        for k in range(n_pages):
+            ressources = f"{partage} 0 R" if ressources_partagees else f"<< /XObject << /Im{k} {objet(k, 2)} 0 R >> >>"
+            ecrire(objet(k, 0), f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources {ressources} "
+                                f"/Contents {objet(k, 1)} 0 R >>".encode())
+            contenu = f"% imperator:{style}:{k}\nq 595 0 0 842 0 0 cm /Im{k} Do Q".encode()
+            ecrire(objet(k, 1), f"<< /Length {len(contenu)} >>".encode(), contenu)
+            ecrire(objet(k, 2), f"<< /Type /XObject /Subtype /Image /Width {cote} /Height {cote} /ColorSpace "
+                                f"/DeviceGray /BitsPerComponent 8 /Length {cote * cote} >>".encode(),
+                   os.urandom(cote * cote))
+        xref = f.tell()
+        total = objet(n_pages, 0)
+        f.write(f"xref\n0 {total}\n0000000000 65535 f \n".encode())
+        f.write(b"".join(f"{positions[n]:010d} 00000 n \n".encode() for n in range(1, total)))
+        f.write(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return chemin
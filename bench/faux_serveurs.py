@@ -0,0 +1,433 @@
+"""Serveurs locaux imitant l'API Mistral (files / OCR / chat / agents / batch) et AnkiConnect.
+
+Ils servent aux tests de charge : aucune requête ne sort de la machine et aucun
+quota n'est consommé. Latence, taux d'erreurs 500 et de 429 sont réglables (les 429
+ne concernent que le faux Mistral : AnkiConnect n'en renvoie jamais).
+
+    python bench/faux_serveurs.py --latence 0.2 --taux-429 0.05
+"""
+import argparse
+import io
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import donnees
+
+MARQUEUR_PAGE = re.compile(rb"% imperator:(\w+):(\d+)")
+LARGEUR_PAGE, HAUTEUR_PAGE = 595, 842   # pages de donnees.pdf_synthetique
+
+
+class Config:
+    """Comportement injecté par un faux serveur."""
+
+    def __init__(self, latence=0.0, gigue=0.0, taux_erreur=0.0, taux_429=0.0, retry_after=1,
+                 lignes_par_page=20, taux_non=0.0, graine=None, cles_refusees=(), duree_batch=0.5):
+        self.latence = latence
+        self.gigue = gigue
+        self.taux_erreur = taux_erreur
+        self.taux_429 = taux_429
+        self.retry_after = retry_after
+        self.lignes_par_page = lignes_par_page
+        self.taux_non = taux_non
+        # Clés API auxquelles le serveur répond 401 (test de l'éviction des clés du pool)
+        self.cles_refusees = set(cles_refusees)
+        # Temps de traitement d'un job batch (en plus de la latence de chaque requête du lot)
+        self.duree_batch = duree_batch
+        self.rnd = random.Random(graine)
+
+
+class Statistiques:
+    """Compteurs et latences par route, partagés entre les threads du serveur."""
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.requetes = {}
+        self.statuts = {}
+        self.latences = {}
+        self.cles = {}
+
+    def enregistrer(self, route, statut, duree, cle=None):
+        with self.verrou:
+            if cle:
+                self.cles[cle] = self.cles.get(cle, 0) + 1
+            self.requetes[route] = self.requetes.get(route, 0) + 1
+            self.statuts[str(statut)] = self.statuts.get(str(statut), 0) + 1
+            self.latences.setdefault(route, []).append(duree)
+
+    def instantane(self):
+        with self.verrou:
+            return {
+                "requetes": dict(self.requetes),
+                "statuts": dict(self.statuts),
+                "latences": {route: list(v) for route, v in self.latences.items()},
+                "cles": dict(self.cles),
+            }
+
+    def remettre_a_zero(self):
+        with self.verrou:
+            self.requetes.clear()
+            self.statuts.clear()
+            self.latences.clear()
+            self.cles.clear()
+
+
+class _Gestionnaire(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    serveur_parent = None  # défini par sous-classe dynamique
+
+    def log_message(self, format, *args):
+        pass
+
+    def _lire_corps(self):
+        longueur = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(longueur) if longueur else b""
+
+    def _repondre(self, statut, corps, type_contenu="application/json", entetes=None):
+        donnees_brutes = corps if isinstance(corps, bytes) else json.dumps(corps).encode()
+        self.send_response(statut)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Length", str(len(donnees_brutes)))
+        for cle, valeur in (entetes or {}).items():
+            self.send_header(cle, valeur)
+        self.end_headers()
+        self.wfile.write(donnees_brutes)
+
+    def _traiter(self, methode):
+        serveur = self.serveur_parent
+        debut = time.perf_counter()
+        corps = self._lire_corps()
+        route, statut = serveur.route(methode, urlparse(self.path).path, corps), 500
+        cle = (self.headers.get("Authorization") or "").removeprefix("Bearer ").strip()
+        try:
+            cfg = serveur.config
+            if cfg.latence or cfg.gigue:
+                time.sleep(max(0.0, cfg.latence + cfg.rnd.uniform(-cfg.gigue, cfg.gigue)))
+            tirage = cfg.rnd.random()
+            taux_429 = cfg.taux_429 if serveur.limite_debit else 0.0
+            if cle and cle in cfg.cles_refusees:
+                statut = 401
+                self._repondre(401, {"message": "Unauthorized"})
+            elif tirage < taux_429:
+                statut = 429
+                self._repondre(429, {"message": "Requests rate limit exceeded"},
+                               entetes={"Retry-After": str(cfg.retry_after)})
+            elif tirage < taux_429 + cfg.taux_erreur:
+                statut = 500
+                self._repondre(500, {"message": "Erreur injectée"})
+            else:
+                statut, reponse, type_contenu = serveur.repondre(methode, self.path, self.headers, corps)
+                self._repondre(statut, reponse, type_contenu)
+        finally:
+            serveur.stats.enregistrer(route, statut, time.perf_counter() - debut, cle)
+
+    def do_GET(self):
+        self._traiter("GET")
+
+    def do_POST(self):
+        self._traiter("POST")
+
+    def do_DELETE(self):
+        self._traiter("DELETE")
+
+
+class _FauxServeur:
+    limite_debit = True  # le serveur réel répond 429 (Config.taux_429 s'applique)
+
+    def __init__(self, config=None, hote="127.0.0.1", port=0):
+        self.config = config or Config()
+        self.stats = Statistiques()
+        gestionnaire = type("Gestionnaire", (_Gestionnaire,), {"serveur_parent": self})
+        self.httpd = ThreadingHTTPServer((hote, port), gestionnaire)
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        hote, port = self.httpd.server_address[:2]
+        return f"http://{hote}:{port}"
+
+    def demarrer(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def arreter(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.demarrer()
+
+    def __exit__(self, *exc):
+        self.arreter()
+
+    def route(self, methode, chemin, corps):
+        return f"{methode} {chemin}"
+
+    def repondre(self, methode, chemin, entetes, corps):
+        raise NotImplementedError
+
+
+class FauxMistral(_FauxServeur):
+    """Imite /v1/files, /v1/files/{id}/url, /v1/files/{id}/content, /v1/ocr, /v1/chat/completions,
+    /v1/agents/completions et /v1/batch/jobs."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fichiers = {}
+        self.batchs = {}
+        self.verrou = threading.Lock()
+        self.jetons = {"prompt": 0, "completion": 0}
+
+    def route(self, methode, chemin, corps):
+        chemin = re.sub(r"/v1/files/[^/]+", "/v1/files/{id}", chemin)
+        chemin = re.sub(r"/documents/[^/]+", "/documents/{id}", chemin)
+        chemin = re.sub(r"/v1/batch/jobs/[^/]+", "/v1/batch/jobs/{id}", chemin)
+        return f"{methode} {chemin}"
+
+    def repondre(self, methode, chemin, entetes, corps):
+        chemin = urlparse(chemin).path
+        if methode == "POST" and chemin == "/v1/files":
+            return self._upload(entetes, corps)
+        m = re.fullmatch(r"/v1/files/([^/]+)/url", chemin)
+        if methode == "GET" and m:
+            return 200, {"url": f"{self.url}/documents/{m.group(1)}"}, "application/json"
+        m = re.fullmatch(r"/v1/files/([^/]+)/content", chemin)
+        if methode == "GET" and m:
+            return 200, self.fichiers.get(m.group(1), b""), "application/octet-stream"
+        if methode == "POST" and chemin == "/v1/batch/jobs":
+            return self._creer_batch(json.loads(corps))
+        m = re.fullmatch(r"/v1/batch/jobs/([^/]+)", chemin)
+        if methode == "GET" and m:
+            with self.verrou:
+                job = self.batchs.get(m.group(1))
+            return (200, dict(job), "application/json") if job else (404, {"message": "Job inconnu"}, "application/json")
+        m = re.fullmatch(r"/documents/([^/]+)", chemin)
+        if methode == "GET" and m:
+            return 200, self.fichiers.get(m.group(1), b""), "application/pdf"
+        if methode == "POST" and chemin == "/v1/ocr":
+            return self._ocr(json.loads(corps))
+        if methode == "POST" and chemin in ("/v1/chat/completions", "/v1/agents/completions"):
+            return self._chat(json.loads(corps))
+        return 404, {"message": f"Route inconnue : {methode} {chemin}"}, "application/json"
+
+    def _upload(self, entetes, corps):
+        # Multipart minimal : on garde le contenu de la partie "file" (les marqueurs de page y figurent en clair)
+        file_id = str(uuid.uuid4())
+        nom = re.search(rb'filename="([^"]+)"', corps)
+        with self.verrou:
+            self.fichiers[file_id] = _partie_fichier(entetes, corps)
+        return 200, {
+            "id": file_id, "object": "file", "bytes": len(corps), "created_at": int(time.time()),
+            "filename": nom.group(1).decode() if nom else "document.pdf", "purpose": "ocr",
+            "sample_type": "ocr_input", "source": "upload",
+        }, "application/json"
+
+    def _ocr(self, requete):
+        url = requete["document"]["document_url"]
+        file_id = url.rsplit("/", 1)[-1]
+        contenu = self.fichiers.get(file_id, b"")
+        pages = []
+        for index, (style, numero) in enumerate(_marqueurs(contenu)):
+            lignes = [donnees.ligne_ocr(style, numero, i) for i in range(self.config.lignes_par_page)]
+            markdown = f"# THÈME {numero + 1}\n\n" + "\n\n".join(lignes)
+            pages.append({"index": index, "markdown": markdown, "images": [],
+                          "dimensions": {"dpi": 200, "height": 2200, "width": 1700}})
+        return 200, {
+            "pages": pages, "model": requete.get("model", "mistral-ocr-latest"),
+            "usage_info": {"pages_processed": len(pages), "doc_size_bytes": len(contenu)},
+        }, "application/json"
+
+    def _creer_batch(self, requete):
+        job_id = str(uuid.uuid4())
+        with self.verrou:
+            lignes = [json.loads(ligne) for f in requete.get("input_files", [])
+                      for ligne in self.fichiers.get(f, b"").decode().splitlines() if ligne.strip()]
+            job = self.batchs[job_id] = {
+                "id": job_id, "object": "batch", "input_files": requete.get("input_files", []),
+                "endpoint": requete["endpoint"], "model": requete.get("model"), "metadata": requete.get("metadata"),
+                "errors": [], "status": "QUEUED", "created_at": int(time.time()), "total_requests": len(lignes),
+                "completed_requests": 0, "succeeded_requests": 0, "failed_requests": 0,
+                "output_file": None, "error_file": None,
+            }
+        threading.Thread(target=self._executer_batch, args=(job_id, lignes), daemon=True).start()
+        return 200, dict(job), "application/json"
+
+    def _executer_batch(self, job_id, lignes):
+        time.sleep(self.config.duree_batch)
+        with self.verrou:
+            job = self.batchs[job_id]
+            job["status"] = "RUNNING"
+            job["started_at"] = int(time.time())
+        sorties = []
+        for ligne in lignes:
+            corps = dict(ligne.get("body", {}))
+            corps.setdefault("model", job["model"])
+            statut, reponse, _ = self._ocr(corps) if job["endpoint"] == "/v1/ocr" else self._chat(corps)
+            sorties.append({"id": str(uuid.uuid4()), "custom_id": ligne.get("custom_id"),
+                            "response": {"status_code": statut, "body": reponse}, "error": None})
+            with self.verrou:
+                job["completed_requests"] += 1
+                job["succeeded_requests"] += 1
+        sortie_id = str(uuid.uuid4())
+        with self.verrou:
+            self.fichiers[sortie_id] = "".join(json.dumps(s) + "\n" for s in sorties).encode()
+            job.update(status="SUCCESS", output_file=sortie_id, completed_at=int(time.time()))
+
+    def _chat(self, requete):
+        texte = json.dumps(requete.get("messages", []))
+        jetons_prompt = max(1, len(texte) // 4)
+        fin = "stop"
+        if (requete.get("response_format") or {}).get("type") == "json_object":
+            reponse = json.dumps({"paires": _apparier_prompt(requete["messages"][-1]["content"])}, ensure_ascii=False)
+            max_tokens = requete.get("max_tokens")
+            if max_tokens and len(reponse) // 4 > max_tokens:
+                reponse, fin = reponse[:max_tokens * 4], "length"
+        else:
+            reponse = "NON" if self.config.rnd.random() < self.config.taux_non else "OUI"
+        jetons_reponse = max(1, len(reponse) // 4)
+        with self.verrou:
+            self.jetons["prompt"] += jetons_prompt
+            self.jetons["completion"] += jetons_reponse
+        return 200, {
+            "id": str(uuid.uuid4()), "object": "chat.completion", "created": int(time.time()),
+            "model": requete.get("model") or requete.get("agent_id") or "mistral-large-latest",
+            "usage": {"prompt_tokens": jetons_prompt, "completion_tokens": jetons_reponse,
+                      "total_tokens": jetons_prompt + jetons_reponse},
+            "choices": [{"index": 0, "finish_reason": fin,
+                         "message": {"role": "assistant", "content": reponse}}],
+        }, "application/json"
+
+
+LIGNE_NUMEROTEE = re.compile(r"^\[(\d+)\] (.*)$", re.M)
+
+
+def _apparier_prompt(prompt):
+    """Réponse d'appariement plausible : recto/verso dans l'ordre, ou lignes « a | b » / « a : b »."""
+    if "\nVERSO :\n" in prompt:
+        recto, verso = prompt.split("\nVERSO :\n", 1)
+        lignes_recto = LIGNE_NUMEROTEE.findall(recto.split("RECTO :\n", 1)[-1])
+        lignes_verso = LIGNE_NUMEROTEE.findall(verso)
+        # Les plages se correspondent à peu près : appariement par rang relatif
+        return [{"ligne": int(i), "recto": r, "verso": lignes_verso[k * len(lignes_verso) // len(lignes_recto)][1]}
+                for k, (i, r) in enumerate(lignes_recto) if lignes_verso]
+    paires = []
+    for i, ligne in LIGNE_NUMEROTEE.findall(prompt):
+        morceaux = re.split(r"\s*[|:]\s*", ligne, maxsplit=1)
+        if len(morceaux) == 2 and all(morceaux):
+            paires.append({"ligne": int(i), "recto": morceaux[0], "verso": morceaux[1]})
+    return paires
+
+
+def _marqueurs(contenu):
+    """(style, numéro) de chaque page du PDF envoyé à l'OCR.
+
+    Une page combine rognée à une moitié (decoupage_pdf.rogner) ne montre qu'une
+    colonne : es à gauche / en haut, fr à droite / en bas.
+    """
+    try:
+        from PyPDF2 import PdfReader
+
+        marqueurs = []
+        for page in PdfReader(io.BytesIO(contenu)).pages:
+            m = MARQUEUR_PAGE.search(page.get_contents().get_data())
+            style, numero = m.group(1).decode(), int(m.group(2))
+            x0, y0, x1, y1 = map(float, page.mediabox)
+            if style == "combine" and x1 - x0 < 0.75 * LARGEUR_PAGE:
+                style = "es" if x0 < 1 else "fr"
+            elif style == "combine" and y1 - y0 < 0.75 * HAUTEUR_PAGE:
+                style = "es" if y0 > 1 else "fr"
+            marqueurs.append((style, numero))
+        return marqueurs
+    except Exception:  # PDF illisible (ou PyPDF2 absent) : marqueurs dans l'ordre du fichier
+        return [(style.decode(), int(numero)) for style, numero in MARQUEUR_PAGE.findall(contenu)]
+
+
+def _partie_fichier(entetes, corps):
+    """Contenu de la partie fichier d'un corps multipart/form-data (le corps entier à défaut)."""
+    limite = re.search(r'boundary="?([^";]+)"?', entetes.get("Content-Type", ""))
+    if not limite:
+        return corps
+    for partie in corps.split(b"--" + limite.group(1).encode()):
+        if b'filename="' in partie and b"\r\n\r\n" in partie:
+            return partie.split(b"\r\n\r\n", 1)[1].removesuffix(b"\r\n")
+    return corps
+
+
+class FauxAnkiConnect(_FauxServeur):
+    """Imite l'API JSON d'AnkiConnect : version, addNote, addNotes, canAddNotes."""
+
+    limite_debit = False  # AnkiConnect (local) ne répond jamais 429
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.notes = {}
+        self.verrou = threading.Lock()
+        self.ids = itertools.count(1_700_000_000_000)
+
+    def route(self, methode, chemin, corps):
+        action = re.search(rb'"action"\s*:\s*"(\w+)"', corps)
+        return f"anki {action.group(1).decode() if action else '?'}"
+
+    def _cle(self, note):
+        return note.get("deckName"), tuple(sorted(note.get("fields", {}).items()))
+
+    def _ajouter(self, note):
+        cle = self._cle(note)
+        with self.verrou:
+            if cle in self.notes:
+                return None
+            self.notes[cle] = next(self.ids)
+            return self.notes[cle]
+
+    def repondre(self, methode, chemin, entetes, corps):
+        requete = json.loads(corps or b"{}")
+        action, params = requete.get("action"), requete.get("params", {})
+        if action == "version":
+            return 200, {"result": 6, "error": None}, "application/json"
+        if action == "addNote":
+            note_id = self._ajouter(params["note"])
+            erreur = None if note_id else "cannot create note because it is a duplicate"
+            return 200, {"result": note_id, "error": erreur}, "application/json"
+        if action == "addNotes":
+            return 200, {"result": [self._ajouter(n) for n in params["notes"]], "error": None}, "application/json"
+        if action == "canAddNotes":
+            with self.verrou:
+                resultat = [self._cle(n) not in self.notes for n in params["notes"]]
+            return 200, {"result": resultat, "error": None}, "application/json"
+        return 200, {"result": None, "error": f"unsupported action {action}"}, "application/json"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port-mistral", type=int, default=8900)
+    parser.add_argument("--port-anki", type=int, default=8765)
+    parser.add_argument("--latence", type=float, default=0.0)
+    parser.add_argument("--gigue", type=float, default=0.0)
+    parser.add_argument("--taux-erreur", type=float, default=0.0)
+    parser.add_argument("--taux-429", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = Config(args.latence, args.gigue, args.taux_erreur, args.taux_429)
+    mistral = FauxMistral(config, port=args.port_mistral).demarrer()
+    anki = FauxAnkiConnect(config, port=args.port_anki).demarrer()
+    print(f"MISTRAL_SERVER_URL={mistral.url}\nANKI_CONNECT_URL={anki.url}\n(Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        mistral.arreter()
+        anki.arreter()
+        sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+import metriques
+
+# =======================================================
+# 🔹 CACHE DES PAGES OCR
+# =======================================================
+# Le markdown de chaque page OCR est gardé dans une base sqlite, sous l'empreinte
+# du PDF (sha256 du fichier) et le numéro de page. Un aperçu puis le traitement
+# complet, un changement de mode ou le retraitement d'un document ne paient
+# l'OCR que des pages jamais vues (compteur cache_hits des métriques).
+# IMPERATOR_CACHE_OCR=<fichier .sqlite> (défaut : ~/.cache/imperator/ocr.sqlite),
+# IMPERATOR_CACHE_OCR=0 pour le désactiver. Les moitiés de page (combine découpé
+# en deux) sont gardées à part, sous le modèle suffixé de la moitié (variante).
+
+MODELE_OCR = "mistral-ocr-latest"
+_REGLAGE = os.getenv("IMPERATOR_CACHE_OCR", "")
+CHEMIN = _REGLAGE or os.path.join(os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+                                  "imperator", "ocr.sqlite")
+ACTIF = _REGLAGE != "0"
+
+
+class CacheOCR:
+    def __init__(self, chemin):
+        self.chemin = chemin
+        dossier = os.path.dirname(os.path.abspath(chemin))
+        os.makedirs(dossier, exist_ok=True)
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        with self.connexion:
+            self.connexion.execute("""
+                CREATE TABLE IF NOT EXISTS pages (empreinte TEXT, page INTEGER, modele TEXT, markdown TEXT,
+                                                  date REAL, PRIMARY KEY (empreinte, page, modele))""")
+
+    def lire(self, empreinte, numeros, modele=MODELE_OCR, colonne="markdown"):
+        """{numéro de page: markdown} des pages `numeros` déjà en cache."""
+        numeros = list(numeros)
+        trouvees = {}
+        with self.verrou:
+            for debut in range(0, len(numeros), 500):
+                lot = numeros[debut:debut + 500]
+                trouvees.update(self.connexion.execute(
+                    f"SELECT page, {colonne} FROM pages WHERE empreinte = ? AND modele = ? "
+                    f"AND page IN ({','.join('?' * len(lot))})", (empreinte, modele, *lot)).fetchall())
+        return trouvees
+
+    def connues(self, empreinte, numeros, modele=MODELE_OCR):
+        """Numéros des pages `numeros` déjà en cache (sans lire leur markdown)."""
+        return set(self.lire(empreinte, numeros, modele, colonne="NULL"))
+
+    def ecrire(self, empreinte, pages, modele=MODELE_OCR):
+        """Ajoute les pages [(numéro, markdown)] au cache."""
+        maintenant = time.time()
+        with self.verrou, self.connexion:
+            self.connexion.executemany("INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+                                       [(empreinte, numero, modele, texte, maintenant) for numero, texte in pages])
+
+    def fermer(self):
+        with self.verrou:
+            self.connexion.close()
+
+
+_cache = None
+_verrou_cache = threading.Lock()
+_empreintes = {}
+
+
+def cache():
+    """Cache partagé du processus (None s'il est désactivé ou inutilisable)."""
+    global _cache, ACTIF
+    if not ACTIF:
+        return None
+    with _verrou_cache:
+        if _cache is None:
+            try:
+                _cache = CacheOCR(CHEMIN)
+            except (OSError, sqlite3.Error) as e:
+                print(f"⚠️ Cache OCR désactivé ({CHEMIN}) : {e}")
+                ACTIF = False
+        return _cache
+
+
+def empreinte_fichier(chemin):
+    """sha256 du fichier, gardé en mémoire tant que sa taille et sa date ne changent pas."""
+    infos = os.stat(chemin)
+    cle = (os.path.abspath(chemin), infos.st_size, infos.st_mtime_ns)
+    if cle not in _empreintes:
+        h = hashlib.sha256()
+        with open(chemin, "rb") as f:
+            for bloc in iter(lambda: f.read(1 << 20), b""):
+                h.update(bloc)
+        _empreintes[cle] = h.hexdigest()
+    return _empreintes[cle]
+
+
+def variante(moitie=None):
+    """Modèle sous lequel sont gardées les pages OCR (entières, ou la moitié `moitie` de chaque page)."""
+    return f"{MODELE_OCR}:{moitie}" if moitie else MODELE_OCR
+
+
+def pages_en_cache(pdf_path, numeros, modele=MODELE_OCR):
+    """(empreinte du PDF, {numéro: markdown} des pages déjà connues) ; (None, {}) sans cache."""
+    c = cache()
+    if c is None:
+        return None, {}
+    empreinte = empreinte_fichier(pdf_path)
+    trouvees = c.lire(empreinte, numeros, modele)
+    metriques.compter("cache_hits", len(trouvees))
+    return empreinte, trouvees
+
+
+def pages_connues(pdf_path, numeros, modele=MODELE_OCR):
+    """Numéros des pages `numeros` du PDF déjà en cache (estimations : rien n'est compté)."""
+    c = cache()
+    return c.connues(empreinte_fichier(pdf_path), numeros, modele) if c is not None else set()
+
+
+def memoriser(empreinte, pages, modele=MODELE_OCR):
+    c = cache()
+    if c is not None and empreinte is not None and pages:
+        try:
+            c.ecrire(empreinte, pages, modele)
+        except sqlite3.Error as e:
+            print(f"⚠️ Pages OCR non mises en cache : {e}")
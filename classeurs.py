@@ -0,0 +1,277 @@
+import csv
+import hashlib
+import os
+import time
+from typing import NamedTuple
+
+from openpyxl import Workbook, load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet optionnel : pip install pyarrow
+    pa = pq = None
+
+# =======================================================
+# 🔹 LECTURE / ÉCRITURE EN FLUX DES PAIRES (xlsx, csv, tsv, parquet)
+# =======================================================
+# Les fonctions ci-dessous ne chargent jamais tout le classeur : openpyxl en
+# read_only / write_only, csv ligne à ligne, parquet par lots. Une feuille de
+# 500 000 lignes se lit et se réécrit en mémoire constante (hors index de
+# dédoublonnage : 16 octets d'empreinte par paire).
+
+FORMATS = (".xlsx", ".csv", ".tsv", ".parquet")
+TAILLE_LOT_PARQUET = 10_000
+# Provenance écrite avec chaque paire produite : de quel PDF et de quelle page elle vient
+COLONNES_PROVENANCE = ("Document", "Page")
+
+
+class Paire(NamedTuple):
+    recto: str
+    verso: str
+
+
+def _format(chemin):
+    ext = os.path.splitext(chemin)[1].lower()
+    if ext not in FORMATS:
+        raise ValueError(f"Format non pris en charge : {ext or chemin} (attendu : {', '.join(FORMATS)})")
+    if ext == ".parquet" and pq is None:
+        raise ImportError("Le format Parquet nécessite pyarrow : pip install pyarrow")
+    return ext
+
+
+def _texte(valeur):
+    return "" if valeur is None else str(valeur).strip()
+
+
+def _lignes_brutes(chemin, ext):
+    """Itère sur les lignes (en-tête compris) sous forme de tuples de valeurs."""
+    if ext == ".xlsx":
+        classeur = load_workbook(chemin, read_only=True)
+        try:
+            yield from classeur.active.iter_rows(values_only=True)
+        finally:
+            classeur.close()
+    elif ext == ".parquet":
+        fichier = pq.ParquetFile(chemin)
+        yield tuple(fichier.schema_arrow.names)
+        for lot in fichier.iter_batches(batch_size=TAILLE_LOT_PARQUET):
+            yield from zip(*(colonne.to_pylist() for colonne in lot.columns))
+    else:
+        with open(chemin, newline="", encoding="utf-8-sig") as f:
+            yield from csv.reader(f, delimiter="\t" if ext == ".tsv" else ",")
+
+
+def lire_paires(chemin, field_front="Recto", field_back="Verso"):
+    """Génère les Paire(recto, verso) non vides du fichier, en mémoire constante."""
+    lignes = _lignes_brutes(chemin, _format(chemin))
+    entete = [_texte(v) for v in next(lignes, ())]
+    if field_front not in entete or field_back not in entete:
+        return
+    i_recto, i_verso = entete.index(field_front), entete.index(field_back)
+    for ligne in lignes:
+        if len(ligne) <= max(i_recto, i_verso):
+            continue
+        recto, verso = _texte(ligne[i_recto]), _texte(ligne[i_verso])
+        if recto and verso:
+            yield Paire(recto, verso)
+
+
+def lire_lignes(chemin, field_front="Recto", field_back="Verso"):
+    """Comme lire_paires, avec la provenance : (recto, verso, document, page), None si inconnue."""
+    lignes = _lignes_brutes(chemin, _format(chemin))
+    entete = [_texte(v) for v in next(lignes, ())]
+    if field_front not in entete or field_back not in entete:
+        return
+    i_recto, i_verso = entete.index(field_front), entete.index(field_back)
+    i_document, i_page = (entete.index(c) if c in entete else None for c in COLONNES_PROVENANCE)
+    for ligne in lignes:
+        if len(ligne) <= max(i_recto, i_verso):
+            continue
+        recto, verso = _texte(ligne[i_recto]), _texte(ligne[i_verso])
+        if recto and verso:
+            document = _texte(ligne[i_document]) if i_document is not None and i_document < len(ligne) else ""
+            page = _texte(ligne[i_page]) if i_page is not None and i_page < len(ligne) else ""
+            yield recto, verso, document or None, int(page) if page.isdigit() else None
+
+
+class _Ecrivain:
+    """Écrit des paires une à une dans le format du chemin (fichier complet, en-tête compris).
+
+    Avec provenance=True, les colonnes Document et Page suivent Recto et Verso.
+    `entete` (et `schema` en parquet) remplace l'en-tête par défaut : les lignes
+    sont alors écrites telles quelles avec ecrire_ligne.
+    """
+
+    def __init__(self, chemin, ext, provenance=False, entete=None, schema=None):
+        self.ext = ext
+        self.provenance = provenance
+        if entete is None:
+            entete = ["Recto", "Verso"] + (list(COLONNES_PROVENANCE) if provenance else [])
+        if ext == ".xlsx":
+            self.classeur = Workbook(write_only=True)
+            self.feuille = self.classeur.create_sheet()
+            self.feuille.append(entete)
+            self.chemin = chemin
+        elif ext == ".parquet":
+            champs = [("Recto", pa.string()), ("Verso", pa.string())]
+            if provenance:
+                champs += [("Document", pa.string()), ("Page", pa.int32())]
+            self.schema = schema or pa.schema(champs)
+            self.parquet = pq.ParquetWriter(chemin, self.schema)
+            self.tampon = []
+        else:
+            self.fichier = open(chemin, "w", newline="", encoding="utf-8")
+            self.csv = csv.writer(self.fichier, delimiter="\t" if ext == ".tsv" else ",")
+            self.csv.writerow(entete)
+
+    def ecrire(self, recto, verso, document=None, page=None):
+        self.ecrire_ligne((recto, verso, document, page) if self.provenance else (recto, verso))
+
+    def ecrire_ligne(self, valeurs):
+        if self.ext == ".xlsx":
+            self.feuille.append(list(valeurs))
+        elif self.ext == ".parquet":
+            self.tampon.append(valeurs)
+            if len(self.tampon) >= TAILLE_LOT_PARQUET:
+                self._vider_parquet()
+        else:
+            self.csv.writerow(["" if v is None else v for v in valeurs])
+
+    def _vider_parquet(self):
+        if self.tampon:
+            self.parquet.write_table(pa.table([list(c) for c in zip(*self.tampon)], schema=self.schema))
+            self.tampon = []
+
+    def fermer(self):
+        if self.ext == ".xlsx":
+            self.classeur.save(self.chemin)
+        elif self.ext == ".parquet":
+            self._vider_parquet()
+            self.parquet.close()
+        else:
+            self.fichier.close()
+
+
+def _en_paire(ligne):
+    if isinstance(ligne, dict):
+        return _texte(ligne.get("Recto")), _texte(ligne.get("Verso"))
+    return _texte(ligne[0]), _texte(ligne[1])
+
+
+def _en_ligne(ligne):
+    """(recto, verso, document, page) d'un dict, d'un couple ou d'une ligne de TablePaires.lignes()."""
+    if isinstance(ligne, dict):
+        document, page = ligne.get("Document"), ligne.get("Page")
+    elif len(ligne) >= 4:
+        document, page = ligne[2], ligne[3]
+    else:
+        document = page = None
+    return (*_en_paire(ligne), document or None, page or None)
+
+
+def _cle(recto, verso):
+    return hashlib.blake2b(f"{recto}\x1f{verso}".encode(), digest_size=16).digest()
+
+
+def ecrire_paires(chemin, paires):
+    """Écrit les paires (dicts {"Recto", "Verso"} ou couples) dans un nouveau fichier ; renvoie le nombre écrit."""
+    ecrivain = _Ecrivain(chemin, _format(chemin))
+    n = 0
+    try:
+        for ligne in paires:
+            ecrivain.ecrire(*_en_paire(ligne))
+            n += 1
+    finally:
+        ecrivain.fermer()
+    return n
+
+
+class _FichierIllisible(Exception):
+    pass
+
+
+def _lire_ou_signaler(lignes):
+    """Itère sur `lignes` ; une erreur de lecture devient _FichierIllisible (distincte d'une erreur d'écriture)."""
+    while True:
+        try:
+            ligne = next(lignes)
+        except StopIteration:
+            return
+        except Exception as e:
+            raise _FichierIllisible(e) from e
+        yield ligne
+
+
+def fusionner_paires(lignes, chemin):
+    """Ajoute les lignes au fichier en flux, sans doublon, par remplacement atomique.
+
+    Le fichier existant est relu ligne à ligne et recopié tel quel (toutes ses
+    colonnes, lignes incomplètes comprises) dans un fichier temporaire, suivi des
+    nouvelles lignes ; seul un ensemble d'empreintes est gardé en mémoire pour le
+    dédoublonnage. Les lignes (dicts, couples ou lignes de TablePaires.lignes())
+    gardent leur provenance (colonnes Document, Page, ajoutées si besoin).
+    Un fichier existant illisible n'est jamais écrasé : il est mis de côté
+    (<nom>.illisible-<date>) et un nouveau fichier est créé.
+    Renvoie le nombre de lignes ajoutées.
+    """
+    ext = _format(chemin)
+    base = os.path.splitext(chemin)[0]
+    temporaire = f"{base}.{os.getpid()}.tmp{ext}"
+    vues = set()
+    ajoutees = 0
+    ecrivain = None
+    try:
+        existantes = _lire_ou_signaler(iter(_lignes_brutes(chemin, ext))) if os.path.exists(chemin) else iter(())
+        entete = [_texte(v) for v in next(existantes, ())]
+        colonnes = entete + [c for c in ("Recto", "Verso", *COLONNES_PROVENANCE) if c not in entete]
+        ecrivain = _Ecrivain(temporaire, ext, provenance=True, entete=colonnes, schema=_schema_fusion(chemin, colonnes)
+                             if ext == ".parquet" and entete else None)
+        position = {c: colonnes.index(c) for c in ("Recto", "Verso", *COLONNES_PROVENANCE)}
+        for ligne in existantes:
+            ligne = list(ligne) + [None] * (len(colonnes) - len(ligne))
+            recto, verso = _texte(ligne[position["Recto"]]), _texte(ligne[position["Verso"]])
+            if recto and verso:  # les lignes incomplètes sont recopiées sans dédoublonnage
+                cle = _cle(recto, verso)
+                if cle in vues:
+                    continue
+                vues.add(cle)
+            ecrivain.ecrire_ligne(ligne)
+        for ligne in lignes:
+            recto, verso, document, page = _en_ligne(ligne)
+            cle = _cle(recto, verso)
+            if recto and verso and cle not in vues:
+                vues.add(cle)
+                valeurs = [None] * len(colonnes)
+                for colonne, valeur in zip(("Recto", "Verso", *COLONNES_PROVENANCE), (recto, verso, document, page)):
+                    valeurs[position[colonne]] = valeur
+                ecrivain.ecrire_ligne(valeurs)
+                ajoutees += 1
+        ecrivain.fermer()
+    except BaseException as e:
+        if ecrivain is not None:
+            ecrivain.fermer()
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        if not isinstance(e, _FichierIllisible):
+            raise
+        sauvegarde = f"{base}.illisible-{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        os.replace(chemin, sauvegarde)
+        print(f"⚠️ {chemin} illisible ({e}) : conservé tel quel sous {sauvegarde}, nouveau fichier créé")
+        return fusionner_paires(lignes, chemin)
+    os.replace(temporaire, chemin)
+    return ajoutees
+
+
+def _schema_fusion(chemin, colonnes):
+    """Schéma parquet du fichier existant, complété des colonnes de paires qui lui manquent."""
+    schema = pq.ParquetFile(chemin).schema_arrow
+    types = {"Recto": pa.string(), "Verso": pa.string(), "Document": pa.string(), "Page": pa.int32()}
+    for colonne in colonnes[len(schema.names):]:
+        schema = schema.append(pa.field(colonne, types[colonne]))
+    return schema
+
+
+def convertir(source, destination):
+    """Recopie les paires d'un format vers un autre (ex. xlsx -> csv), en flux."""
+    return ecrire_paires(destination, lire_paires(source))
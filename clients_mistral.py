@@ -0,0 +1,291 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import httpx
+from mistralai import Mistral
+
+import estimation
+import metriques
+
+# =======================================================
+# 🔹 POOL DE CLÉS / AGENTS MISTRAL
+# =======================================================
+# MISTRAL_KEYS=cle1,cle2,cle3   (à défaut MISTRAL_KEY)
+# MISTRAL_AGENT_RECTO_VERSO / MISTRAL_AGENT_COMBINE / MISTRAL_AGENT_MANUEL :
+#   un identifiant, ou une liste séparée par des virgules (un agent par clé, dans l'ordre)
+# MISTRAL_MAX_REQUETES : requêtes simultanées par clé
+#
+# Chaque appel passe par PoolClients.appeler(lambda client: ...) :
+#   - la clé la moins chargée (requêtes en vol / capacité) est choisie ;
+#   - chaque clé a son propre limiteur de concurrence ;
+#   - une clé qui échoue `seuil_echecs` fois de suite est écartée quelques
+#     secondes (durée doublée à chaque récidive), puis réessayée ;
+#   - un appel en échec (429, 5xx, réseau, clé refusée) est rejoué sur une autre clé ;
+#   - sous un budget (estimation.avec_budget), l'appel est d'abord réservé : il
+#     attend ou échoue (BudgetAtteint) plutôt que de dépasser le plafond.
+
+MODES_AGENTS = ("recto_verso", "combine", "manuel")
+PAUSE_REESSAI = 0.1
+
+
+def _statut(erreur):
+    statut = getattr(erreur, "status_code", None)
+    if statut is None:
+        statut = getattr(getattr(erreur, "raw_response", None) or getattr(erreur, "response", None),
+                         "status_code", None)
+    return statut
+
+
+def reessayable(erreur):
+    """Erreur due à la clé ou au serveur (et non à la requête elle-même) ?"""
+    statut = _statut(erreur)
+    if statut is None:
+        return isinstance(erreur, (httpx.TransportError, ConnectionError, TimeoutError))
+    return statut in (401, 403, 408, 429) or statut >= 500
+
+
+class CleMistral:
+    """Un client Mistral, son limiteur et son état de santé."""
+
+    def __init__(self, nom, client, max_requetes, agents=None):
+        self.nom = nom
+        self.client = client
+        self.max_requetes = max_requetes
+        self.limiteur = threading.BoundedSemaphore(max_requetes)
+        self.agents = agents or {}
+        self.en_vol = 0
+        self.requetes = 0
+        self.erreurs = 0
+        self.echecs_consecutifs = 0
+        self.exclusions = 0
+        self.exclue_jusqua = 0.0
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def semaphore_async(self):
+        """Équivalent asyncio du limiteur (un par boucle d'événements)."""
+        boucle = asyncio.get_running_loop()
+        if boucle not in self._semaphores:
+            self._semaphores[boucle] = asyncio.Semaphore(self.max_requetes)
+        return self._semaphores[boucle]
+
+    def etat(self):
+        return {"en_vol": self.en_vol, "requetes": self.requetes, "erreurs": self.erreurs,
+                "ecartee": time.monotonic() < self.exclue_jusqua}
+
+
+class PoolClients:
+    def __init__(self, cles, server_url=None, max_requetes=4, agents=None, seuil_echecs=3,
+                 exclusion=30.0, tentatives=3, fabrique=Mistral):
+        """`cles` : liste de clés API ; `agents` : {mode: [agent par clé] ou [agent commun]}."""
+        cles = list(cles) or [None]
+        agents = agents or {}
+        self.cles = []
+        for i, cle in enumerate(cles):
+            agents_cle = {}
+            for mode, ids in agents.items():
+                if ids:
+                    agents_cle[mode] = ids[i] if len(ids) == len(cles) else ids[0]
+            nom = f"cle{i + 1}" + (f"…{cle[-4:]}" if cle and len(cle) > 8 else "")
+            self.cles.append(CleMistral(nom, fabrique(api_key=cle, server_url=server_url),
+                                        max_requetes, agents_cle))
+        self.seuil_echecs = seuil_echecs
+        self.exclusion = exclusion
+        self.tentatives = tentatives
+        self.verrou = threading.Lock()
+        self._tour = 0
+
+    @classmethod
+    def depuis_env(cls):
+        cles = [c.strip() for c in (os.getenv("MISTRAL_KEYS") or os.getenv("MISTRAL_KEY") or "").split(",") if c.strip()]
+        agents = {mode: [a.strip() for a in (os.getenv(f"MISTRAL_AGENT_{mode.upper()}") or "").split(",") if a.strip()]
+                  for mode in MODES_AGENTS}
+        return cls(cles, server_url=os.getenv("MISTRAL_SERVER_URL") or None,
+                   max_requetes=int(os.getenv("MISTRAL_MAX_REQUETES", "4")), agents=agents)
+
+    @classmethod
+    def depuis_client(cls, client, max_requetes=4):
+        """Pool d'une seule clé autour d'un client Mistral existant."""
+        return cls([], max_requetes=max_requetes, fabrique=lambda **_: client)
+
+    def __len__(self):
+        return len(self.cles)
+
+    @property
+    def capacite(self):
+        return sum(c.max_requetes for c in self.cles)
+
+    def agent(self, mode):
+        """Agent configuré pour le mode (celui de la première clé qui en a un)."""
+        for cle in self.cles:
+            if mode in cle.agents:
+                return cle.agents[mode]
+        return None
+
+    # --- Sélection et santé ---
+    def choisir(self, exclues=(), mode=None):
+        """Réserve la clé saine la moins chargée (hors `exclues` si possible).
+
+        Avec `mode`, seules les clés qui ont un agent pour ce mode sont candidates (s'il y en a).
+        """
+        with self.verrou:
+            maintenant = time.monotonic()
+            cles = [c for c in self.cles if mode in c.agents] if mode else []
+            cles = cles or self.cles
+            saines = [c for c in cles if c.exclue_jusqua <= maintenant]
+            candidates = [c for c in saines if c not in exclues] or saines
+            if not candidates:
+                # Toutes écartées : on réessaie celle dont l'exclusion finit le plus tôt
+                candidates = [min(cles, key=lambda c: c.exclue_jusqua)]
+            self._tour += 1
+            n = len(self.cles)
+            choisie = min(candidates, key=lambda c: (c.en_vol / c.max_requetes,
+                                                     (self.cles.index(c) - self._tour) % n))
+            choisie.en_vol += 1
+            choisie.requetes += 1
+            return choisie
+
+    def _liberer(self, cle, erreur=None):
+        with self.verrou:
+            cle.en_vol -= 1
+            if erreur is None:
+                cle.echecs_consecutifs = 0
+                cle.exclusions = 0
+                return
+            cle.erreurs += 1
+            cle.echecs_consecutifs += 1
+            # Une clé déjà écartée qui échoue encore à son retour est écartée aussitôt, pour plus longtemps
+            if cle.echecs_consecutifs >= self.seuil_echecs or cle.exclusions:
+                duree = self.exclusion * 2 ** min(cle.exclusions, 5)
+                cle.exclue_jusqua = time.monotonic() + duree
+                cle.exclusions += 1
+                cle.echecs_consecutifs = 0
+                print(f"⚠️ Clé Mistral {cle.nom} écartée {duree:.0f}s après des échecs répétés ({erreur})")
+
+    @contextmanager
+    def reserver(self, nom=None):
+        """Réserve une clé pour une suite d'appels liés (fichiers + job batch) : celle nommée, sinon la moins chargée."""
+        cle = next((c for c in self.cles if c.nom == nom), None) if nom else None
+        if cle is None:
+            cle = self.choisir()
+        else:
+            with self.verrou:
+                cle.en_vol += 1
+                cle.requetes += 1
+        try:
+            yield cle
+        finally:
+            self._liberer(cle)
+
+    # --- Budget ---
+    @staticmethod
+    def _prevision(depense):
+        """Budget courant et dépense prévue de l'appel ({"pages", "appels_api", "jetons"})."""
+        return estimation.budget_courant(), {"appels_api": 1, **(depense or {})}
+
+    @staticmethod
+    def _regler(budget, prevu, resultat=None):
+        """Après l'appel : jetons réels à la place de l'estimation ; appel en échec (resultat None) remboursé."""
+        if resultat is None:
+            budget.ajuster(pages=-prevu.get("pages", 0), jetons=-prevu.get("jetons", 0))
+        elif getattr(resultat, "usage", None) is not None:
+            budget.ajuster(jetons=estimation.jetons_reponse(resultat) - prevu.get("jetons", 0))
+
+    # --- Appels ---
+    def appeler(self, fonction, mode=None, depense=None):
+        """Exécute fonction(client) sur la clé la moins chargée, avec repli sur une autre clé.
+
+        Avec `mode`, appelle fonction(client, agent_id) sur une clé qui a un agent pour ce mode
+        (un agent n'est utilisable qu'avec la clé du compte qui l'a créé) ; agent_id vaut None
+        si aucune clé n'en a. `depense` : ce que l'appel coûte au budget courant
+        (par défaut un appel ; ex. {"pages": 10, "appels_api": 3} pour un lot OCR).
+        """
+        budget, prevu = self._prevision(depense)
+        if budget is None:
+            return self._appeler(fonction, mode)
+        budget.reserver(**prevu)
+        try:
+            resultat = self._appeler(fonction, mode)
+        except BaseException:
+            self._regler(budget, prevu)
+            raise
+        self._regler(budget, prevu, resultat)
+        return resultat
+
+    def _appeler(self, fonction, mode=None):
+        essayees = set()
+        for tentative in range(self.tentatives):
+            cle = self.choisir(essayees, mode)
+            try:
+                with cle.limiteur:
+                    resultat = fonction(cle.client) if mode is None else fonction(cle.client, cle.agents.get(mode))
+            except Exception as e:
+                if not reessayable(e):
+                    self._liberer(cle)
+                    raise
+                self._liberer(cle, e)
+                if tentative == self.tentatives - 1:
+                    raise
+                essayees.add(cle)
+                metriques.compter("retries")
+                time.sleep(PAUSE_REESSAI * 2 ** tentative)
+                continue
+            except BaseException:  # annulation, interruption : la clé n'est pas en cause
+                self._liberer(cle)
+                raise
+            self._liberer(cle)
+            return resultat
+
+    async def appeler_async(self, fonction, depense=None):
+        """Version asyncio : `fonction(client)` renvoie une coroutine (méthodes *_async du SDK)."""
+        budget, prevu = self._prevision(depense)
+        if budget is None:
+            return await self._appeler_async(fonction)
+        if not budget.reserver(**prevu, bloquer=False):
+            # En pause : l'attente se fait hors de la boucle d'événements
+            await asyncio.to_thread(budget.reserver, **prevu)
+        try:
+            resultat = await self._appeler_async(fonction)
+        except BaseException:
+            self._regler(budget, prevu)
+            raise
+        self._regler(budget, prevu, resultat)
+        return resultat
+
+    async def _appeler_async(self, fonction):
+        essayees = set()
+        for tentative in range(self.tentatives):
+            cle = self.choisir(essayees)
+            try:
+                async with cle.semaphore_async():
+                    resultat = await fonction(cle.client)
+            except Exception as e:
+                if not reessayable(e):
+                    self._liberer(cle)
+                    raise
+                self._liberer(cle, e)
+                if tentative == self.tentatives - 1:
+                    raise
+                essayees.add(cle)
+                metriques.compter("retries")
+                await asyncio.sleep(PAUSE_REESSAI * 2 ** tentative)
+                continue
+            except BaseException:  # annulation, interruption : la clé n'est pas en cause
+                self._liberer(cle)
+                raise
+            self._liberer(cle)
+            return resultat
+
+    def etat(self):
+        with self.verrou:
+            return {c.nom: c.etat() for c in self.cles}
+
+
+def en_pool(client):
+    """Accepte un PoolClients ou un simple client Mistral."""
+    if client is None or isinstance(client, PoolClients):
+        return client
+    return PoolClients.depuis_client(client)
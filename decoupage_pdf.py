@@ -0,0 +1,174 @@
+import gc
+import io
+import re
+from contextlib import contextmanager
+
+from PyPDF2 import PageObject, PdfReader, PdfWriter
+from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, RectangleObject
+
+import metriques
+
+# =======================================================
+# 🔹 DÉCOUPAGE DES PDF EN LOTS POUR L'OCR (mémoire bornée)
+# =======================================================
+# PdfReader(chemin) charge tout le fichier en mémoire, et son cache d'objets
+# résolus grossit au fil des pages : avec un scan de plusieurs centaines de Mo,
+# le pic de mémoire suit la taille du document. Ici, chaque lot ouvre son propre
+# PdfReader sur le fichier (lecture à la demande, seuls les objets des pages du
+# lot sont lus) ; lecteur, writer et octets du lot sont libérés dès qu'il est
+# envoyé. Les /Resources d'une page sont réduites aux images (/XObject) et
+# polices (/Font) que son contenu nomme : un dictionnaire de ressources partagé
+# par toutes les pages n'est plus recopié (avec toutes ses images) dans chaque lot.
+
+# Nom PDF dans un flux de contenu : "/Im12 Do", "/F1 10 Tf"...
+NOM = re.compile(rb"/([^\s/\[\]()<>{}%]+)")
+CATEGORIES_ALLEGEES = ("/XObject", "/Font")
+# Attributs qu'une page hérite des nœuds /Pages au-dessus d'elle
+ATTRIBUTS_HERITES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+# Découpe locale des pages en deux (mode combine) : moitiés (recto, verso) vues à l'écran
+DECOUPES = {"colonnes": ("gauche", "droite"), "lignes": ("haut", "bas")}
+# Moitié vue à l'écran -> (axe de la boîte : 0 = x, 1 = y ; 1 si c'est la moitié haute de l'axe), selon /Rotate
+_MOITIES = {
+    0: {"gauche": (0, 0), "droite": (0, 1), "haut": (1, 1), "bas": (1, 0)},
+    90: {"gauche": (1, 0), "droite": (1, 1), "haut": (0, 0), "bas": (0, 1)},
+    180: {"gauche": (0, 1), "droite": (0, 0), "haut": (1, 0), "bas": (1, 1)},
+    270: {"gauche": (1, 1), "droite": (1, 0), "haut": (0, 1), "bas": (0, 0)},
+}
+
+
+@contextmanager
+def lecteur_pdf(chemin):
+    """PdfReader adossé au fichier ouvert (et non à une copie en mémoire du fichier entier)."""
+    with open(chemin, "rb") as f:
+        yield PdfReader(f)
+
+
+def nombre_pages(chemin):
+    with lecteur_pdf(chemin) as reader:
+        return len(reader.pages)
+
+
+def page_pdf(reader, index):
+    """Page `index` du document, lue en descendant l'arbre des pages.
+
+    reader.pages aplatit tout l'arbre (lecture de chaque page) au premier accès :
+    refait à chaque lot, ce coût suivrait le nombre de pages du document. Ici, seuls
+    les nœuds sur le chemin de la page sont lus ; arbre inhabituel : reader.pages.
+    """
+    try:
+        noeud = reader.trailer["/Root"]["/Pages"].get_object()
+        herites, reste = {}, index
+        while True:
+            herites.update({a: noeud[a] for a in ATTRIBUTS_HERITES if a in noeud})
+            kids = noeud["/Kids"]
+            if noeud["/Count"] == len(kids):  # que des feuilles (cas courant) : accès direct
+                reference = kids[reste]
+                page = reference.get_object()
+                if page.get("/Type") != "/Page":
+                    raise ValueError("nœud /Pages inattendu")
+                break
+            for reference in kids:
+                enfant = reference.get_object()
+                taille = enfant["/Count"] if enfant.get("/Type") == "/Pages" else 1
+                if reste < taille:
+                    break
+                reste -= taille
+            else:
+                raise IndexError(index)
+            if enfant.get("/Type") != "/Pages":
+                page = enfant
+                break
+            noeud = enfant
+    except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+        return reader.pages[index]
+    resultat = PageObject(reader, reference)
+    resultat.update(page)
+    for attribut, valeur in herites.items():
+        if attribut not in resultat:
+            resultat[NameObject(attribut)] = valeur
+    return resultat
+
+
+def _noms_du_contenu(page):
+    """Noms cités par le flux de contenu de la page ; None s'il est illisible."""
+    contenus = page.get("/Contents")
+    if contenus is None:
+        return set()
+    try:
+        contenus = contenus.get_object()
+        flux = [c.get_object() for c in contenus] if isinstance(contenus, ArrayObject) else [contenus]
+        return {nom.decode("latin-1") for f in flux for nom in NOM.findall(f.get_data())}
+    except Exception:  # filtre inconnu, flux abîmé : on garde toutes les ressources
+        return None
+
+
+def alleger_ressources(page):
+    """Remplace les /Resources de la page par une copie limitée aux /XObject et /Font nommés dans
+    son contenu ; renvoie le nombre de ressources retirées. Les objets du fichier ne sont pas modifiés."""
+    ressources = page.get("/Resources")
+    if ressources is None:
+        return 0
+    noms = _noms_du_contenu(page)
+    if noms is None or any("#" in nom for nom in noms):  # noms échappés (#20...) : comparaison peu sûre
+        return 0
+    ressources = ressources.get_object()
+    allegees = DictionaryObject(ressources)  # copie de surface : les valeurs restent des références
+    retirees = 0
+    for categorie in CATEGORIES_ALLEGEES:
+        if categorie not in ressources:
+            continue
+        dico = ressources[categorie]
+        gardees = DictionaryObject({cle: valeur for cle, valeur in dico.items() if cle[1:] in noms})
+        retirees += len(dico) - len(gardees)
+        allegees[NameObject(categorie)] = gardees
+    if retirees:
+        page[NameObject("/Resources")] = allegees
+    return retirees
+
+
+def rogner(page, moitie):
+    """Réduit la page à une moitié ("gauche", "droite", "haut" ou "bas", telle qu'affichée)
+    en rognant ses boîtes /MediaBox et /CropBox ; le contenu n'est pas touché."""
+    rotation = int(page.get("/Rotate", 0) or 0) % 360
+    axe, haute = _MOITIES.get(rotation, _MOITIES[0])[moitie]
+    boite = [float(v) for v in page.cropbox]  # x0, y0, x1, y1 (/CropBox, à défaut /MediaBox)
+    bas, haut = sorted((boite[axe], boite[axe + 2]))
+    milieu = (bas + haut) / 2
+    boite[axe], boite[axe + 2] = (milieu, haut) if haute else (bas, milieu)
+    page.mediabox = RectangleObject(boite)
+    page.cropbox = RectangleObject(boite)
+    return page
+
+
+def lot_pdf(chemin, indices, moitie=None):
+    """Un lot à envoyer à l'OCR : (nom, octets du PDF des pages `indices`, indices).
+
+    Avec `moitie` (voir rogner), chaque page est réduite à cette moitié.
+    """
+    with metriques.span("decoupage_pdf"), lecteur_pdf(chemin) as reader:
+        writer = PdfWriter()
+        for i in indices:
+            page = page_pdf(reader, i)
+            if moitie:
+                rogner(page, moitie)
+            alleger_ressources(page)
+            writer.add_page(page)
+        tampon = io.BytesIO()
+        writer.write(tampon)
+    suffixe = f"_{moitie}" if moitie else ""
+    return f"chunk_{indices[0] + 1}_to_{indices[-1] + 1}{suffixe}.pdf", tampon.getvalue(), indices
+
+
+def lots_pdf(chemin, indices, pages_per_batch=10, moitie=None):
+    """Génère les lots de pages à envoyer à l'OCR : (nom, octets du PDF, indices des pages).
+
+    Un lot n'est construit qu'à la demande : en mémoire, il n'y a que celui en cours
+    (et ceux que l'appelant garde, ex. en cours d'envoi).
+    """
+    for start in range(0, len(indices), pages_per_batch):
+        lot = lot_pdf(chemin, indices[start:start + pages_per_batch], moitie)
+        # Lecteur et writer se référencent (pages <-> document) : sans collecte, les objets
+        # de plusieurs lots s'accumuleraient jusqu'au passage du ramasse-miettes
+        gc.collect()
+        yield lot
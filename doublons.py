@@ -0,0 +1,238 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+import numpy as np
+
+import metriques
+
+# =======================================================
+# 🔹 INDEX DE QUASI-DOUBLONS (MinHash + LSH)
+# =======================================================
+# Le dédoublonnage exact (classeurs.fusionner_paires) laisse passer les variantes
+# d'une même carte : faute d'OCR, guillemets différents, chapitres qui se
+# recouvrent. Chaque paire est résumée par une signature MinHash des n-grammes
+# de caractères de "recto + verso" normalisés ; la signature est découpée en
+# bandes, et deux paires qui partagent au moins une bande sont candidates. Seules
+# les candidates sont comparées (similarité de Jaccard estimée) : la recherche ne
+# dépend pas de la taille du corpus.
+#
+# L'index est une base sqlite à côté de la sortie (<sortie>.doublons.sqlite),
+# mise à jour à chaque traitement. Une paire trop proche d'une paire connue est :
+#   - "fusionner" (défaut) : écartée, la carte existante est gardée ;
+#   - "signaler" : gardée quand même ;
+# et dans les deux cas notée dans <sortie>.doublons.jsonl.
+# IMPERATOR_QUASI_DOUBLONS=fusionner|signaler|0, IMPERATOR_SEUIL_DOUBLONS=0.7
+
+ACTION = os.getenv("IMPERATOR_QUASI_DOUBLONS", "fusionner")
+SEUIL = float(os.getenv("IMPERATOR_SEUIL_DOUBLONS", "0.7"))
+PERMUTATIONS = 128
+BANDES = 32
+TAILLE_SHINGLE = 5
+
+_PREMIER = np.uint64((1 << 61) - 1)
+_MASQUE = np.uint64(0xFFFFFFFF)
+_PONCTUATION = re.compile(r"[^\w\s]")
+_ESPACES = re.compile(r"\s+")
+
+
+def normaliser(texte):
+    """Minuscules, sans accents, ponctuation ni guillemets, espaces réduits."""
+    texte = unicodedata.normalize("NFKD", texte.casefold())
+    texte = "".join(c for c in texte if not unicodedata.combining(c))
+    return _ESPACES.sub(" ", _PONCTUATION.sub(" ", texte)).strip()
+
+
+def shingles(recto, verso, taille=TAILLE_SHINGLE):
+    texte = f"{normaliser(recto)}\x1f{normaliser(verso)}"
+    if len(texte) <= taille:
+        return {texte}
+    return {texte[i:i + taille] for i in range(len(texte) - taille + 1)}
+
+
+class IndexQuasiDoublons:
+    """Index persistant et incrémental des paires déjà produites."""
+
+    def __init__(self, chemin, seuil=SEUIL, permutations=PERMUTATIONS, bandes=BANDES, taille_shingle=TAILLE_SHINGLE):
+        if permutations % bandes:
+            raise ValueError("Le nombre de permutations doit être un multiple du nombre de bandes")
+        self.chemin = chemin
+        self.seuil = seuil
+        self.permutations = permutations
+        self.bandes = bandes
+        self.lignes = permutations // bandes
+        self.taille_shingle = taille_shingle
+        # Permutations fixes (graine constante) : les signatures restent comparables d'une exécution à l'autre
+        alea = np.random.RandomState(0x1A5E)
+        self._a = alea.randint(1, 1 << 32, size=permutations, dtype=np.uint64)
+        self._b = alea.randint(0, 1 << 32, size=permutations, dtype=np.uint64)
+
+        self.verrou = threading.Lock()
+        self.connexion = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        with self.connexion:
+            self.connexion.executescript("""
+                CREATE TABLE IF NOT EXISTS parametres (nom TEXT PRIMARY KEY, valeur TEXT);
+                CREATE TABLE IF NOT EXISTS paires (id INTEGER PRIMARY KEY, empreinte BLOB UNIQUE,
+                                                   recto TEXT, verso TEXT, signature BLOB);
+                CREATE TABLE IF NOT EXISTS bandes (cle INTEGER, paire INTEGER);
+                CREATE INDEX IF NOT EXISTS bandes_cle ON bandes (cle);
+            """)
+            parametres = json.dumps([permutations, bandes, taille_shingle])
+            self.connexion.execute("INSERT OR IGNORE INTO parametres VALUES ('minhash', ?)", (parametres,))
+            enregistres = self.connexion.execute("SELECT valeur FROM parametres WHERE nom = 'minhash'").fetchone()[0]
+        if enregistres != parametres:
+            raise ValueError(f"{chemin} a été créé avec d'autres paramètres MinHash ({enregistres})")
+
+    def __len__(self):
+        with self.verrou:
+            return self.connexion.execute("SELECT COUNT(*) FROM paires").fetchone()[0]
+
+    def fermer(self):
+        with self.verrou:
+            self.connexion.close()
+
+    # --- Signatures ---
+    def signature(self, recto, verso):
+        valeurs = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(s.encode(), digest_size=4).digest(), "little")
+             for s in shingles(recto, verso, self.taille_shingle)),
+            dtype=np.uint64)
+        # h(x) = (a·x + b) mod p sur 32 bits, pour toutes les permutations à la fois
+        hachages = (np.outer(valeurs, self._a) + self._b) % _PREMIER & _MASQUE
+        return hachages.min(axis=0).astype(np.uint32)
+
+    def cles_bandes(self, signature):
+        """Une clé par bande (le numéro de bande est inclus dans l'empreinte)."""
+        octets = signature.tobytes()
+        pas = self.lignes * 4
+        return [int.from_bytes(hashlib.blake2b(bytes([i]) + octets[i * pas:(i + 1) * pas], digest_size=8).digest(),
+                               "little", signed=True)
+                for i in range(self.bandes)]
+
+    @staticmethod
+    def similarite(sig1, sig2):
+        return float(np.mean(sig1 == sig2))
+
+    # --- Recherche / ajout ---
+    def _candidats(self, cles):
+        requete = ("SELECT DISTINCT p.id, p.signature FROM bandes b JOIN paires p ON p.id = b.paire "
+                   f"WHERE b.cle IN ({','.join('?' * len(cles))})")
+        with self.verrou:
+            return self.connexion.execute(requete, cles).fetchall()
+
+    def chercher(self, recto, verso, signature=None):
+        """Paire connue la plus proche au-dessus du seuil : (recto, verso, similarité), sinon None."""
+        signature = self.signature(recto, verso) if signature is None else signature
+        candidats = self._candidats(self.cles_bandes(signature))
+        if not candidats:
+            return None
+        signatures = np.frombuffer(b"".join(sig for _, sig in candidats), dtype=np.uint32).reshape(len(candidats), -1)
+        similarites = (signatures == signature).mean(axis=1)
+        meilleure = int(similarites.argmax())
+        if similarites[meilleure] < self.seuil:
+            return None
+        with self.verrou:
+            recto, verso = self.connexion.execute("SELECT recto, verso FROM paires WHERE id = ?",
+                                                  (candidats[meilleure][0],)).fetchone()
+        return recto, verso, float(similarites[meilleure])
+
+    def filtrer(self, paires, action=ACTION):
+        """Compare les paires (recto, verso) à l'index et entre elles.
+
+        Renvoie (indices des paires gardées, doublons) ; `doublons` : [(paire, paire proche,
+        similarité)]. Les paires gardées ne sont pas ajoutées à l'index : appeler ajouter()
+        une fois qu'elles sont vérifiées et écrites.
+        """
+        indices, gardees, signatures, doublons = [], [], [], []
+        locales = {}  # bande → rangs des paires gardées de ce lot
+        for k, (recto, verso) in enumerate(paires):
+            signature = self.signature(recto, verso)
+            cles = self.cles_bandes(signature)
+            proche = self.chercher(recto, verso, signature)
+            for j in {j for cle in cles for j in locales.get(cle, ())}:
+                sim = self.similarite(signature, signatures[j])
+                if sim >= self.seuil and (proche is None or sim > proche[2]):
+                    proche = (*gardees[j], sim)
+            if proche is not None:
+                doublons.append(((recto, verso), proche[:2], proche[2]))
+                if action != "signaler":
+                    continue
+            for cle in cles:
+                locales.setdefault(cle, []).append(len(gardees))
+            indices.append(k)
+            gardees.append((recto, verso))
+            signatures.append(signature)
+        return indices, doublons
+
+    def ajouter(self, paires):
+        """Ajoute les paires (recto, verso) à l'index ; renvoie le nombre de nouvelles."""
+        lignes, bandes = [], []
+        for recto, verso in paires:
+            signature = self.signature(recto, verso)
+            empreinte = hashlib.blake2b(f"{recto}\x1f{verso}".encode(), digest_size=16).digest()
+            lignes.append((empreinte, recto, verso, signature.tobytes(), self.cles_bandes(signature)))
+        ajoutees = 0
+        with self.verrou, self.connexion:
+            for empreinte, recto, verso, signature, cles in lignes:
+                curseur = self.connexion.execute(
+                    "INSERT OR IGNORE INTO paires (empreinte, recto, verso, signature) VALUES (?, ?, ?, ?)",
+                    (empreinte, recto, verso, signature))
+                if curseur.rowcount:
+                    ajoutees += 1
+                    bandes.extend((cle, curseur.lastrowid) for cle in cles)
+            self.connexion.executemany("INSERT INTO bandes VALUES (?, ?)", bandes)
+        return ajoutees
+
+
+def chemin_index(output_excel):
+    return os.path.splitext(output_excel)[0] + ".doublons.sqlite"
+
+
+_index = {}
+_verrou_index = threading.Lock()
+
+
+def index_pour(output_excel):
+    """Index partagé de la sortie `output_excel` (None si IMPERATOR_QUASI_DOUBLONS=0)."""
+    if ACTION == "0":
+        return None
+    cle = os.path.abspath(chemin_index(output_excel))
+    with _verrou_index:
+        if cle not in _index:
+            _index[cle] = IndexQuasiDoublons(cle)
+        return _index[cle]
+
+
+def filtrer_quasi_doublons(candidats, output_excel, action=None):
+    """Écarte (ou signale) les candidats (TablePaires) proches de paires déjà produites pour cette sortie."""
+    index = index_pour(output_excel)
+    if index is None or not candidats:
+        return candidats
+    with metriques.span("quasi_doublons"):
+        indices, doublons = index.filtrer(candidats, action or ACTION)
+    # Répétitions exactes (même document retraité) : déjà écartées sans bruit par fusionner_paires
+    doublons = [d for d in doublons if d[0] != d[1]]
+    metriques.compter("quasi_doublons", len(doublons))
+    if doublons:
+        rapport = os.path.splitext(output_excel)[0] + ".doublons.jsonl"
+        try:
+            with open(rapport, "a", encoding="utf-8") as f:
+                for (recto, verso), (r, v), sim in doublons:
+                    f.write(json.dumps({"Recto": recto, "Verso": verso, "proche": {"Recto": r, "Verso": v},
+                                        "similarite": round(sim, 3), "action": action or ACTION},
+                                       ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Rapport de quasi-doublons non écrit : {e}")
+    return candidats if len(indices) == len(candidats) else candidats.selection(indices)
+
+
+def indexer_paires(data, output_excel):
+    """Ajoute les paires écrites (TablePaires ou couples) à l'index de la sortie."""
+    index = index_pour(output_excel)
+    if index is not None and data:
+        with metriques.span("quasi_doublons"):
+            index.ajouter(data)
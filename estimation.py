@@ -0,0 +1,365 @@
+import contextvars
+import glob
+import json
+import math
+import os
+import statistics
+import threading
+from contextlib import contextmanager
+
+# =======================================================
+# 🔹 ESTIMATION DE LA DURÉE ET DU COÛT D'UN TRAITEMENT
+# =======================================================
+# Deux estimations du traitement complet (pages à passer à l'OCR, celles du cache
+# étant gratuites, paires, appels API, jetons, durée, coût) :
+#   - extrapoler : à partir des métriques d'un aperçu (Imperator.apercu) ;
+#   - prevoir : sans rien appeler, à partir de l'inspection locale des PDF
+#     (Imperator.inspecter_pdf) et des taux des exécutions passées (historique).
+# Les tarifs sont ceux publiés par Mistral, à ajuster si besoin :
+# IMPERATOR_PRIX_PAGE_OCR ($ par page), IMPERATOR_PRIX_MILLION_JETONS ($).
+#
+# Budget : un traitement lancé dans `avec_budget(Budget(cout=2.0))` réserve
+# chaque appel API avant de le faire (PoolClients.appeler) ; la limite atteinte,
+# le traitement se met en pause (ou s'arrête sur BudgetAtteint) au lieu de la dépasser.
+
+PRIX_PAGE_OCR = float(os.getenv("IMPERATOR_PRIX_PAGE_OCR", "0.001"))
+PRIX_MILLION_JETONS = float(os.getenv("IMPERATOR_PRIX_MILLION_JETONS", "2.0"))
+PAGES_PAR_LOT = 10
+APPELS_PAR_LOT = 3  # upload, URL signée, OCR
+
+# Valeurs de repli quand l'aperçu ou l'historique n'ont rien mesuré
+SECONDES_PAR_PAGE_OCR = 1.0
+SECONDES_PAR_VERIFICATION = 0.7
+SECONDES_PAR_APPEL_LLM = 8.0
+SECONDES_LOCALES_PAR_PAGE = 0.05
+PAIRES_PAR_PAGE = 20.0
+JETONS_PAR_VERIFICATION = 80
+JETONS_PAR_APPEL_LLM = 4000
+APPELS_LLM_PAR_PAGE = 0.5
+
+# Historique : une ligne JSON (rapport de métriques) par exécution terminée
+# (IMPERATOR_HISTORIQUE=<fichier .jsonl>, ou 0 pour ne rien garder)
+_REGLAGE_HISTORIQUE = os.getenv("IMPERATOR_HISTORIQUE", "")
+HISTORIQUE_ACTIF = _REGLAGE_HISTORIQUE != "0"
+HISTORIQUE = _REGLAGE_HISTORIQUE if HISTORIQUE_ACTIF and _REGLAGE_HISTORIQUE else os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "imperator", "historique.jsonl")
+HISTORIQUE_MAX = 200   # exécutions les plus récentes prises en compte
+ETAPES_OCR = ("upload", "url_signee", "ocr")
+ETAPES_API = ETAPES_OCR + ("verification", "appariement_llm", "batch_soumission", "batch_attente", "batch_resultats")
+
+
+def cout(pages_ocr, jetons):
+    """Coût en dollars de `pages_ocr` pages OCR et `jetons` jetons de chat / agents."""
+    return pages_ocr * PRIX_PAGE_OCR + jetons * PRIX_MILLION_JETONS / 1e6
+
+
+def secondes_ocr(rapport):
+    """Temps cumulé des étapes OCR (upload, URL signée, OCR) d'un rapport de métriques."""
+    return sum(rapport["etapes"].get(etape, {}).get("secondes", 0.0) for etape in ETAPES_OCR)
+
+
+def extrapoler(rapport, pages_echantillon, pages_documents, pages_a_ocr, lots_a_ocr, paires, jetons_verification,
+               verifier=False, parallelisme_ocr=1, parallelisme_api=1):
+    """Estimation du traitement complet à partir du rapport de métriques de l'aperçu.
+
+    `pages_echantillon` / `pages_documents` : pages du document (recto ou PDF unique) dans
+    l'aperçu / le traitement complet ; `pages_a_ocr`, `lots_a_ocr` : pages et lots de
+    l'ensemble des PDF absents du cache ; `paires` : paires de l'aperçu ;
+    `jetons_verification` : jetons moyens d'une vérification.
+    """
+    compteurs = rapport["compteurs"]
+    facteur = pages_documents / max(1, pages_echantillon)
+    pages_mesurees = compteurs.get("pages", 0)
+    par_page_ocr = secondes_ocr(rapport) / pages_mesurees if pages_mesurees else SECONDES_PAR_PAGE_OCR
+    # Appariement, nettoyage, filtre de langue, appels LLM d'appariement : proportionnels aux pages
+    reste = max(0.0, rapport["duree_secondes"] - secondes_ocr(rapport) / max(1, parallelisme_ocr))
+    appels_llm = max(0, compteurs.get("appels_api", 0) - APPELS_PAR_LOT * compteurs.get("chunks", 0))
+
+    paires_total = round(paires * facteur)
+    verifications = paires_total if verifier else 0
+    jetons = round(compteurs.get("tokens", 0) * facteur) + verifications * jetons_verification
+    duree = (pages_a_ocr * par_page_ocr / max(1, parallelisme_ocr) + reste * facteur
+             + verifications * SECONDES_PAR_VERIFICATION / max(1, parallelisme_api))
+    return {
+        "pages": pages_documents,
+        "pages_a_ocr": pages_a_ocr,
+        "paires": paires_total,
+        "appels_api": lots_a_ocr * APPELS_PAR_LOT + round(appels_llm * facteur) + verifications,
+        "jetons": jetons,
+        "duree_secondes": round(duree, 1),
+        "cout": round(cout(pages_a_ocr, jetons), 4),
+    }
+
+
+def lots(pages):
+    return math.ceil(pages / PAGES_PAR_LOT)
+
+
+def formater_duree(secondes):
+    minutes, secondes = divmod(round(secondes), 60)
+    heures, minutes = divmod(minutes, 60)
+    if heures:
+        return f"{heures} h {minutes:02d} min"
+    return f"{minutes} min {secondes:02d} s" if minutes else f"{secondes} s"
+
+
+# =======================================================
+# 🔹 PRÉVISION À PARTIR DE L'HISTORIQUE
+# =======================================================
+
+def historiser(rapport, chemin=None):
+    """Ajoute le rapport d'une exécution à l'historique (ni les aperçus, ni le mode batch, ni Anki)."""
+    etiquettes, compteurs = rapport.get("etiquettes", {}), rapport.get("compteurs", {})
+    if etiquettes.get("apercu") or etiquettes.get("batch") or not (chemin or HISTORIQUE_ACTIF):
+        return
+    if not compteurs.get("pages") and not compteurs.get("cache_hits"):
+        return  # envoi Anki, exécution vide : rien à apprendre
+    chemin = chemin or HISTORIQUE
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        with open(chemin, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rapport, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Historique des métriques non écrit : {e}")
+
+
+def charger_historique(sources=(), chemin=None):
+    """Rapports des exécutions passées : l'historique, plus les *.metrics.json des fichiers ou
+    dossiers `sources` (ex. METRIQUES_DIR). Les HISTORIQUE_MAX plus récents."""
+    rapports = []
+    chemin = chemin or (HISTORIQUE if HISTORIQUE_ACTIF else None)
+    if chemin and os.path.exists(chemin):
+        with open(chemin, encoding="utf-8") as f:
+            for ligne in f:
+                try:
+                    rapports.append(json.loads(ligne))
+                except json.JSONDecodeError:
+                    continue  # ligne tronquée (arrêt pendant l'écriture)
+    for source in sources:
+        fichiers = sorted(glob.glob(os.path.join(source, "*.metrics.json"))) if os.path.isdir(source) else [source]
+        for fichier in fichiers:
+            try:
+                with open(fichier, encoding="utf-8") as f:
+                    rapports.append(json.load(f))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Métriques ignorées ({fichier}) : {e}")
+    # Un même rapport peut être à la fois dans l'historique et à côté de sa sortie
+    uniques = {(r.get("debut"), r.get("duree_secondes"), json.dumps(r.get("etiquettes"), sort_keys=True)): r
+               for r in rapports if "compteurs" in r and "etapes" in r}
+    return sorted(uniques.values(), key=lambda r: r.get("debut") or "")[-HISTORIQUE_MAX:]
+
+
+def _cotes(etiquettes):
+    """PDF (ou moitiés de page) passés à l'OCR pour une page du document principal."""
+    return 2 if etiquettes.get("mode") == "recto_verso" or etiquettes.get("moities") else 1
+
+
+def _taux_execution(rapport):
+    """Taux d'une exécution (par page traitée, par appel...) ; seuls ceux mesurés sont présents.
+
+    Paires, vérifications et appels LLM sont rapportés aux pages du document principal
+    (celles que prevoir multiplie) ; l'OCR et le traitement local, aux pages de tous les côtés.
+    """
+    compteurs, etapes = rapport["compteurs"], rapport["etapes"]
+    pages_ocr = compteurs.get("pages", 0)
+    pages = pages_ocr + compteurs.get("cache_hits", 0)
+    if pages == 0:
+        return {}
+    pages_document = pages / _cotes(rapport.get("etiquettes", {}))
+    taux = {"paires_par_page": compteurs.get("paires", 0) / pages_document}
+    if pages_ocr:
+        taux["secondes_par_page_ocr"] = secondes_ocr(rapport) / pages_ocr
+    locales = sum(e["secondes"] for nom, e in etapes.items() if nom not in ETAPES_API)
+    taux["secondes_locales_par_page"] = locales / pages
+    verifications = etapes.get("verification", {}).get("appels", 0)
+    appels_llm = etapes.get("appariement_llm", {}).get("appels", 0)
+    jetons = compteurs.get("tokens", 0)
+    if verifications:
+        taux["verifications_par_page"] = verifications / pages_document
+        taux["secondes_par_verification"] = etapes["verification"]["secondes"] / verifications
+        if not appels_llm:
+            taux["jetons_par_verification"] = jetons / verifications
+    if appels_llm:
+        taux["appels_llm_par_page"] = appels_llm / pages_document
+        taux["secondes_par_appel_llm"] = etapes["appariement_llm"]["secondes"] / appels_llm
+        if not verifications:
+            taux["jetons_par_appel_llm"] = jetons / appels_llm
+    return taux
+
+
+def taux_historiques(rapports, mode):
+    """Médiane de chaque taux sur les exécutions du mode (à défaut, de tous les modes).
+
+    Renvoie ({taux: valeur}, nombre d'exécutions du mode prises en compte).
+    """
+    par_execution = [(r.get("etiquettes", {}).get("mode"), _taux_execution(r)) for r in rapports]
+    par_execution = [(m, t) for m, t in par_execution if t]
+    du_mode = [t for m, t in par_execution if m == mode]
+    taux = {}
+    for nom in {nom for _, t in par_execution for nom in t}:
+        valeurs = [t[nom] for t in du_mode if nom in t] or [t[nom] for _, t in par_execution if nom in t]
+        taux[nom] = statistics.median(valeurs)
+    return taux, len(du_mode)
+
+
+def prevoir(mode, documents, rapports=(), verifier=False, appariement="regles", parallelisme_ocr=1,
+            parallelisme_api=1, parallelisme_verification=1):
+    """Estimation d'un traitement avant de le lancer, sans appel API.
+
+    `documents` : inspection locale de chaque PDF (Imperator.inspecter_pdf), le document
+    principal (recto, ou PDF unique) en dernier ; `rapports` : historique des exécutions.
+    Les vérifications se suivent dans les modes synchrones (parallelisme_verification=1)
+    et partent ensemble dans un Job asynchrone.
+    """
+    taux, executions = taux_historiques(rapports, mode)
+    principal = documents[-1]
+    pages = sum(d["pages"] for d in documents)
+    pages_a_ocr = sum(d["pages"] - d["en_cache"] for d in documents)
+    lots_a_ocr = sum(lots(d["pages"] - d["en_cache"]) for d in documents)
+
+    # Couche texte : elle donne directement le nombre de lignes candidates par page
+    paires_par_page = principal.get("paires_par_page")
+    if paires_par_page is None:
+        paires_par_page = taux.get("paires_par_page", PAIRES_PAR_PAGE)
+    paires = round(principal["pages"] * paires_par_page)
+    verifications = 0
+    if verifier:
+        verifications = round(principal["pages"] * taux["verifications_par_page"]) \
+            if "verifications_par_page" in taux and principal.get("paires_par_page") is None else paires
+    appels_llm = 0
+    if appariement == "llm":
+        appels_llm = math.ceil(principal["pages"] * taux.get("appels_llm_par_page", APPELS_LLM_PAR_PAGE))
+
+    jetons = round(verifications * taux.get("jetons_par_verification", JETONS_PAR_VERIFICATION)
+                   + appels_llm * taux.get("jetons_par_appel_llm", JETONS_PAR_APPEL_LLM))
+    duree = (pages_a_ocr * taux.get("secondes_par_page_ocr", SECONDES_PAR_PAGE_OCR) / max(1, parallelisme_ocr)
+             + verifications * taux.get("secondes_par_verification", SECONDES_PAR_VERIFICATION)
+             / max(1, parallelisme_verification)
+             + appels_llm * taux.get("secondes_par_appel_llm", SECONDES_PAR_APPEL_LLM) / max(1, parallelisme_api)
+             + pages * taux.get("secondes_locales_par_page", SECONDES_LOCALES_PAR_PAGE))
+    return {
+        "pages": pages,
+        "pages_a_ocr": pages_a_ocr,
+        "paires": paires,
+        "appels_api": lots_a_ocr * APPELS_PAR_LOT + verifications + appels_llm,
+        "jetons": jetons,
+        "duree_secondes": round(duree, 1),
+        "cout": round(cout(pages_a_ocr, jetons), 4),
+        "executions_historique": executions,
+    }
+
+
+# =======================================================
+# 🔹 BUDGET D'UN TRAITEMENT
+# =======================================================
+
+class BudgetAtteint(Exception):
+    """Le budget du traitement ne permet pas l'appel suivant (et il n'a pas été relevé)."""
+
+
+class Budget:
+    """Plafonds d'un traitement : `cout` ($), `pages` (OCR), `appels_api`, `jetons` (None = sans limite).
+
+    Chaque appel API est réservé avant d'être fait (reserver) ; les jetons réellement
+    consommés corrigent ensuite la réservation (ajuster). Un appel qui ferait passer un
+    plafond n'est pas fait : avec `attendre`, le thread attend que le budget soit relevé
+    (reprendre) ou abandonné (abandonner) ; sinon BudgetAtteint est levée aussitôt.
+    `en_pause(budget, message)` est appelée une fois à chaque mise en pause.
+    """
+
+    LIMITES = ("cout", "pages", "appels_api", "jetons")
+
+    def __init__(self, cout=None, pages=None, appels_api=None, jetons=None, attendre=False, en_pause=None):
+        self.limites = {"cout": cout, "pages": pages, "appels_api": appels_api, "jetons": jetons}
+        self.consomme = {"pages": 0, "appels_api": 0, "jetons": 0}
+        self.attendre = attendre
+        self.en_pause = en_pause
+        self.pause = None          # message de la pause en cours
+        self.abandonne = False
+        # Réentrant : en_pause peut relever le budget depuis le thread arrêté (question en console)
+        self.condition = threading.Condition(threading.RLock())
+
+    @property
+    def cout(self):
+        return cout(self.consomme["pages"], self.consomme["jetons"])
+
+    def _depassement(self, pages, appels_api, jetons):
+        apres = {"pages": self.consomme["pages"] + pages, "appels_api": self.consomme["appels_api"] + appels_api,
+                 "jetons": self.consomme["jetons"] + jetons}
+        apres["cout"] = cout(apres["pages"], apres["jetons"])
+        for nom in self.LIMITES:
+            limite = self.limites[nom]
+            if limite is not None and apres[nom] > limite:
+                deja = self.cout if nom == "cout" else self.consomme[nom]
+                unite = " $" if nom == "cout" else f" {nom.replace('_', ' ')}"
+                return f"budget atteint : {deja:.4g}{unite} consommés sur {limite:.4g}{unite}"
+        return None
+
+    def reserver(self, pages=0, appels_api=1, jetons=0, bloquer=True):
+        """Réserve un appel ; False si le budget ne le permet pas et que `bloquer` est faux."""
+        with self.condition:
+            while True:
+                message = self._depassement(pages, appels_api, jetons)
+                if message is None:
+                    self.consomme["pages"] += pages
+                    self.consomme["appels_api"] += appels_api
+                    self.consomme["jetons"] += jetons
+                    return True
+                if self.abandonne or not self.attendre:
+                    raise BudgetAtteint(message)
+                if not bloquer:
+                    return False
+                if self.pause is None:
+                    self.pause = message
+                    if self.en_pause is not None:
+                        self.en_pause(self, message)
+                    continue  # le budget a pu être relevé pendant en_pause
+                self.condition.wait()
+
+    def ajuster(self, pages=0, jetons=0):
+        """Corrige la réservation (jetons réels, appel en échec remboursé)."""
+        with self.condition:
+            self.consomme["pages"] = max(0, self.consomme["pages"] + pages)
+            self.consomme["jetons"] = max(0, self.consomme["jetons"] + jetons)
+
+    def reprendre(self, **limites):
+        """Relève (ou retire, avec None) les plafonds donnés et relance les appels en attente."""
+        with self.condition:
+            for nom, valeur in limites.items():
+                if nom not in self.LIMITES:
+                    raise ValueError(f"Plafond inconnu : {nom}")
+                self.limites[nom] = valeur
+            self.pause = None
+            self.condition.notify_all()
+
+    def abandonner(self):
+        with self.condition:
+            self.abandonne = True
+            self.condition.notify_all()
+
+    def etat(self):
+        with self.condition:
+            return {"limites": dict(self.limites), "consomme": {**self.consomme, "cout": round(self.cout, 4)},
+                    "pause": self.pause}
+
+
+_budget = contextvars.ContextVar("budget", default=None)
+
+
+@contextmanager
+def avec_budget(budget):
+    """Les appels API faits dans ce bloc (et les threads lancés avec metriques.propager) sont plafonnés."""
+    jeton = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(jeton)
+
+
+def budget_courant():
+    return _budget.get()
+
+
+def jetons_reponse(reponse):
+    usage = getattr(reponse, "usage", None)
+    return (getattr(usage, "total_tokens", 0) or 0) if usage is not None else 0
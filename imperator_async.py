@@ -0,0 +1,328 @@
+import asyncio
+import contextlib
+import itertools
+import os
+
+import httpx
+
+import cache_ocr
+import estimation
+import metriques
+from clients_mistral import en_pool
+import Imperator
+from classeurs import lire_paires
+from decoupage_pdf import DECOUPES, nombre_pages
+from doublons import filtrer_quasi_doublons, indexer_paires
+from Imperator import (
+    analyser_pages, archiver_ocr, jetons_verification, lire_verification, lots_de_notes, lots_pdf,
+    nettoyer_pages_brutes, prompt_verification, safe_append_to_excel, candidats_mode, textes_des_pages,
+)
+
+# =======================================================
+# 🔹 API ASYNCHRONE (sans Tk) POUR INTÉGRER IMPERATOR DANS UN SERVICE
+# =======================================================
+# job = lancer_job("combine", ("livre.pdf",), "sortie.xlsx", verifier=True)
+# async for evenement in job:      # progression
+#     print(evenement)
+# resultat = await job             # {"sortie", "paires", "donnees", "metriques"}
+# job.annuler()                    # dernier événement "annule", `await job` lève CancelledError
+#
+# Les requêtes passent par le pool de clés Mistral (clients_mistral.py) : clé la
+# moins chargée, limiteur par clé (MAX_REQUETES_MISTRAL requêtes simultanées),
+# clés défaillantes écartées. Un `semaphore` peut en plus plafonner un job.
+#
+# Budget : Job(..., budget=estimation.Budget(cout=2.0, attendre=True)) ; le plafond
+# atteint, le job émet un événement "pause" et attend job.reprendre(cout=5.0)
+# (ou s'arrête sur BudgetAtteint si le budget n'attend pas).
+
+MODES_ASYNC = ("recto_verso", "combine", "manuel", "anki")
+
+_numeros = itertools.count(1)
+
+
+class Job:
+    """Traitement asynchrone : itérable (événements de progression) et attendable (résultat)."""
+
+    def __init__(self, mode, entrees, sortie=None, verifier=False, client=None, semaphore=None, pages=None,
+                 appariement="regles", budget=None, moities=None, **options_anki):
+        if mode not in MODES_ASYNC:
+            raise ValueError(f"Mode inconnu : {mode}")
+        self.id = next(_numeros)
+        self.mode = mode
+        self.entrees = tuple(entrees)
+        self.sortie = sortie
+        self.verifier = verifier
+        self.client = client
+        self.semaphore = semaphore
+        self.pages = pages
+        self.appariement = appariement
+        self.budget = budget
+        self.moities = moities if mode == "combine" else None  # combine coupé en deux (imperator_combine)
+        self.documents = {}
+        self.candidats = None  # avant quasi-doublons et vérification (archive_ocr)
+        self.options_anki = options_anki
+        self.evenements = asyncio.Queue()
+        self._tache = None
+        self._demarre = False
+
+    # --- Interface publique ---
+    def demarrer(self):
+        if self._tache is None:
+            self._tache = asyncio.ensure_future(self._executer())
+        return self._tache
+
+    def __await__(self):
+        return self.demarrer().__await__()
+
+    def __aiter__(self):
+        self.demarrer()
+        return self._flux()
+
+    async def _flux(self):
+        while True:
+            if self.evenements.empty() and self._tache.done():
+                return
+            lecture = asyncio.ensure_future(self.evenements.get())
+            await asyncio.wait({lecture, self._tache}, return_when=asyncio.FIRST_COMPLETED)
+            if not lecture.done():
+                lecture.cancel()
+                continue
+            evenement = lecture.result()
+            yield evenement
+            if evenement["type"] in ("termine", "erreur", "annule"):
+                return
+
+    def annuler(self):
+        if self.budget is not None:
+            self.budget.abandonner()  # libère les appels en attente d'un budget relevé
+        if self._tache is not None and self._tache.cancel() and not self._demarre:
+            self.emettre("annule", None, "Annulé")  # _executer ne tournera pas : pas d'autre événement final
+
+    def reprendre(self, **limites):
+        """Relève les plafonds du budget (ex. cout=5.0) et relance le job en pause."""
+        if self.budget is None:
+            raise ValueError("Ce job n'a pas de budget")
+        self.budget.reprendre(**limites)
+        self.emettre("reprise", None, "Reprise", budget=self.budget.etat())
+
+    # --- Déroulement ---
+    def emettre(self, type_, pourcentage=None, message="", **extra):
+        self.evenements.put_nowait({"job": self.id, "mode": self.mode, "type": type_,
+                                    "pourcentage": pourcentage, "message": message, **extra})
+
+    async def _executer(self):
+        self._demarre = True
+        self.clients = en_pool(self.client) or Imperator.clients
+        self.semaphore = self.semaphore or contextlib.nullcontext()
+        if self.budget is not None and self.budget.en_pause is None:
+            boucle = asyncio.get_running_loop()
+            # Appelée depuis le thread qui attend le budget : l'événement est remis à la boucle
+            self.budget.en_pause = lambda budget, message: boucle.call_soon_threadsafe(
+                lambda: self.emettre("pause", None, f"⏸ Pause, {message}", budget=budget.etat()))
+        self.emettre("debut", 0, "Démarrage")
+        try:
+            with estimation.avec_budget(self.budget), metriques.execution(
+                    mode=self.mode, job=self.id, **({"moities": self.moities} if self.moities else {})) as m:
+                if self.mode == "anki":
+                    resultat = await self._anki()
+                else:
+                    data = await self._paires()
+                    metriques.compter("paires", len(data))
+                    if self.sortie:
+                        self.emettre("etape", 90, "Écriture Excel")
+                        await asyncio.to_thread(metriques.propager(safe_append_to_excel), data, self.sortie)
+                        await asyncio.to_thread(metriques.propager(indexer_paires), data, self.sortie)
+                        await asyncio.to_thread(metriques.propager(archiver_ocr), self.sortie, self.mode,
+                                                self.documents, data, self.pages, self.verifier, self.candidats,
+                                                self.appariement, self.moities)
+                    resultat = {"sortie": self.sortie, "paires": len(data), "donnees": data}
+            resultat["metriques"] = m.rapport()
+            await asyncio.to_thread(estimation.historiser, resultat["metriques"])
+        except asyncio.CancelledError:
+            self.emettre("annule", None, "Annulé")
+            raise
+        except Exception as e:
+            self.emettre("erreur", None, f"{type(e).__name__}: {e}")
+            raise
+        self.emettre("termine", 100, f"Terminé ✅ ({resultat['metriques']['duree_secondes']}s)", resultat=resultat)
+        return resultat
+
+    async def _paires(self):
+        if self.mode == "recto_verso":
+            pdf_verso, pdf_recto = self.entrees
+            self.emettre("etape", 5, "OCR recto + verso")
+            (recto_brut, recto_lines), (verso_brut, verso_lines) = await asyncio.gather(
+                self._ocr_et_nettoyage(pdf_recto, "recto_verso"),
+                self._ocr_et_nettoyage(pdf_verso, "recto_verso"),
+            )
+            self.documents = {"recto": (pdf_recto, recto_brut), "verso": (pdf_verso, verso_brut)}
+            self.emettre("etape", 60, "Appariement")
+            candidats = await asyncio.to_thread(
+                metriques.propager(candidats_mode), self.mode, (recto_lines, verso_lines),
+                os.path.basename(pdf_recto), self.appariement)
+        elif self.moities:
+            pdf = self.entrees[0]
+            self.emettre("etape", 5, "OCR des deux moitiés")
+            recto_moitie, verso_moitie = DECOUPES[self.moities]
+            (recto_brut, recto_lines), (verso_brut, verso_lines) = await asyncio.gather(
+                self._ocr_et_nettoyage(pdf, "recto_verso", recto_moitie),
+                self._ocr_et_nettoyage(pdf, "recto_verso", verso_moitie),
+            )
+            self.documents = {"recto": (pdf, recto_brut), "verso": (pdf, verso_brut)}
+            self.emettre("etape", 60, "Appariement")
+            candidats = await asyncio.to_thread(
+                metriques.propager(candidats_mode), self.mode, (recto_lines, verso_lines), os.path.basename(pdf),
+                self.appariement)
+        else:
+            self.emettre("etape", 5, "OCR")
+            brut, lignes = await self._ocr_et_nettoyage(self.entrees[0], self.mode)
+            self.documents = {"pdf": (self.entrees[0], brut)}
+            self.emettre("etape", 60, "Appariement")
+            candidats = await asyncio.to_thread(
+                metriques.propager(candidats_mode), self.mode, lignes, os.path.basename(self.entrees[0]),
+                self.appariement)
+
+        self.candidats = candidats
+        if self.sortie:
+            candidats = await asyncio.to_thread(metriques.propager(filtrer_quasi_doublons), candidats, self.sortie)
+        if self.verifier:
+            self.emettre("etape", 65, f"Vérification de {len(candidats)} paires")
+            garder = await asyncio.gather(*(self._verifier(r, v) for r, v in candidats))
+            candidats = candidats.selection([i for i, ok in enumerate(garder) if ok])
+        return candidats
+
+    async def _ocr_et_nettoyage(self, pdf_path, profil, moitie=None):
+        brut = await self._ocr(pdf_path, moitie=moitie)
+        return brut, await asyncio.to_thread(metriques.propager(nettoyer_pages_brutes), brut, profil)
+
+    async def _ocr(self, pdf_path, pages_per_batch=10, moitie=None):
+        empreinte, en_cache, n_lots, lots = await asyncio.to_thread(metriques.propager(decouper_pdf), pdf_path,
+                                                                    pages_per_batch, self.pages, moitie)
+        faits = 0
+        # Lots construits à la demande : au plus `capacite` lots (octets compris) en mémoire à la fois
+        places = asyncio.Semaphore(max(1, self.clients.capacite))
+
+        async def traiter(nom, contenu, indices):
+            nonlocal faits
+            try:
+                textes = await self._ocr_lot(nom, contenu, indices)
+            finally:
+                del contenu
+                places.release()
+            # En cache dès réception : un job interrompu reprend sans repayer ces pages
+            await asyncio.to_thread(cache_ocr.memoriser, empreinte, textes, cache_ocr.variante(moitie))
+            faits += 1
+            self.emettre("progression", 5 + int(50 * faits / n_lots),
+                         f"OCR {os.path.basename(pdf_path)}{f' ({moitie})' if moitie else ''} : lot {faits}/{n_lots}")
+            return textes
+
+        taches = []
+        try:
+            while True:
+                await places.acquire()
+                if any(t.done() and not t.cancelled() and t.exception() for t in taches):
+                    break  # un lot a échoué : gather() remonte l'erreur sans découper la suite
+                lot = await asyncio.to_thread(metriques.propager(next), lots, None)
+                if lot is None:
+                    break
+                taches.append(asyncio.ensure_future(traiter(*lot)))
+            resultats = await asyncio.gather(*taches)
+        except BaseException:
+            for tache in taches:
+                tache.cancel()
+            raise
+        faites = [page for textes in resultats for page in textes]
+        return sorted([*en_cache.items(), *faites])
+
+    async def _ocr_lot(self, nom, contenu, indices):
+        async with self.semaphore:
+            ocr_res = await self.clients.appeler_async(lambda client: ocr_lot_async(client, nom, contenu),
+                                                       depense={"pages": len(indices), "appels_api": 3})
+        metriques.compter("chunks")
+        metriques.compter("appels_api", 3)
+        return textes_des_pages(ocr_res, indices)
+
+    async def _verifier(self, L1, L2):
+        try:
+            async with self.semaphore:
+                with metriques.span("verification"):
+                    response = await self.clients.appeler_async(lambda client: client.chat.complete_async(
+                        model="mistral-large-latest",
+                        messages=[{"role": "user", "content": prompt_verification(L1, L2)}],
+                        max_tokens=3,
+                        temperature=0.0,
+                    ), depense={"jetons": jetons_verification(L1, L2)})
+            return lire_verification(response)
+        except estimation.BudgetAtteint:
+            raise
+        except Exception as e:
+            print(f"⚠️ Erreur vérification : {e}")
+            return False
+
+    async def _anki(self):
+        excel_path = self.entrees[0]
+        deck_name = self.options_anki.get("deck_name", "RectoVerso")
+        model_name = self.options_anki.get("model_name", "Basic")
+        field_front = self.options_anki.get("field_front", "Recto")
+        field_back = self.options_anki.get("field_back", "Verso")
+        if not os.path.exists(excel_path):
+            raise FileNotFoundError(f"Le fichier {excel_path} n’existe pas.")
+
+        # Lecture en flux : chaque lot de notes est lu dans un thread juste avant son envoi
+        lots = lots_de_notes(lire_paires(excel_path, field_front, field_back), deck_name, model_name,
+                             field_front, field_back)
+        added = envoyees = 0
+        async with httpx.AsyncClient(timeout=60) as http:
+            res = await http.post(Imperator.ANKI_CONNECT_URL, json={"action": "version", "version": 6})
+            if res.status_code != 200 or "result" not in res.json():
+                raise ConnectionError("AnkiConnect ne répond pas.")
+            while (lot := await asyncio.to_thread(next, lots, None)) is not None:
+                with metriques.span("anki"):
+                    res = (await http.post(Imperator.ANKI_CONNECT_URL, json={
+                        "action": "addNotes", "version": 6, "params": {"notes": lot}})).json()
+                metriques.compter("appels_anki")
+                added += sum(1 for note_id in (res.get("result") or []) if note_id)
+                envoyees += len(lot)
+                self.emettre("progression", None, f"Anki : {envoyees} cartes envoyées")
+        metriques.compter("notes_anki", added)
+        return {"sortie": excel_path, "paires": added, "donnees": None}
+
+
+async def ocr_lot_async(client, nom, contenu):
+    """Upload d'un lot, URL signée puis OCR, avec un client donné (version asyncio de Imperator.ocr_lot)."""
+    with metriques.span("upload"):
+        upload_res = await client.files.upload_async(file={"file_name": nom, "content": contenu}, purpose="ocr")
+    with metriques.span("url_signee"):
+        signed = await client.files.get_signed_url_async(file_id=upload_res.id)
+    with metriques.span("ocr"):
+        return await client.ocr.process_async(
+            model="mistral-ocr-latest",
+            document={"type": "document_url", "document_url": signed.url},
+            include_image_base64=False,
+        )
+
+
+def decouper_pdf(pdf_path, pages_per_batch=10, pages=None, moitie=None):
+    """Découpe les pages choisies du PDF (ex. "1-10,15", toutes par défaut) qui ne sont pas dans le cache OCR.
+
+    Renvoie (empreinte du PDF, {numéro: markdown} des pages en cache, nombre de lots,
+    générateur des lots (nom, octets, indices) construits à la demande). Avec `moitie`,
+    les lots ne contiennent que cette moitié de chaque page (decoupage_pdf.rogner).
+    """
+    selection = analyser_pages(pages, nombre_pages(pdf_path))
+    empreinte, en_cache = cache_ocr.pages_en_cache(pdf_path, [i + 1 for i in selection], cache_ocr.variante(moitie))
+    a_faire = [i for i in selection if i + 1 not in en_cache]
+    return (empreinte, en_cache, -(-len(a_faire) // pages_per_batch),
+            lots_pdf(pdf_path, a_faire, pages_per_batch, moitie))
+
+
+def lancer_job(mode, entrees, sortie=None, **options):
+    """Crée et démarre un Job. `entrees` : (verso, recto) en recto_verso, (pdf,) ou (excel,) sinon."""
+    job = Job(mode, entrees, sortie, **options)
+    job.demarrer()
+    return job
+
+
+async def executer_jobs(jobs):
+    """Attend une liste de jobs ; renvoie les résultats (ou les exceptions) dans l'ordre."""
+    return await asyncio.gather(*jobs, return_exceptions=True)
@@ -0,0 +1,295 @@
+import os
+import re
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+import metriques
+
+# =======================================================
+# 🔹 IDENTIFICATION DE LA LANGUE DES LIGNES (locale, sans réseau)
+# =======================================================
+# Consignes, en-têtes et lignes dans la mauvaise langue survivent au nettoyage
+# et décalent l'appariement. Chaque ligne reçoit une langue par un classifieur
+# bayésien naïf sur les n-grammes de caractères (1 à 3), entraîné au premier
+# usage sur les échantillons ci-dessous. Toutes les lignes sont traitées en une
+# passe numpy : n-grammes hachés dans BUCKETS cases, scores cumulés par ligne
+# avec bincount.
+#
+# Une ligne trop courte (moins de LETTRES_MIN lettres) ou ambiguë reste
+# "inconnue" et n'est jamais écartée : seules les décisions sûres comptent. La
+# langue dominante du document reçoit un a priori favorable, pour ne pas écarter
+# une ligne légitime sur quelques n-grammes trompeurs.
+# IMPERATOR_FILTRE_LANGUES=0 désactive le filtre ; IMPERATOR_LANGUES_TEMOINS
+# (défaut "en") ajoute des langues à reconnaître pour les écarter.
+
+ACTIF = os.getenv("IMPERATOR_FILTRE_LANGUES", "1") != "0"
+LANGUES_TEMOINS = tuple(l for l in os.getenv("IMPERATOR_LANGUES_TEMOINS", "en").split(",") if l)
+LETTRES_MIN = 12
+SEUIL_CONFIANCE = 0.9
+TEMPERATURE = 5           # les n-grammes qui se recouvrent ne sont pas indépendants : scores adoucis
+A_PRIORI_DOMINANTE = 20   # une ligne doit être nettement dans une autre langue que celle du document
+BUCKETS = 1 << 15
+LISSAGE = 0.5
+
+ECHANTILLONS = {
+    "fr": """
+        Complétez les phrases avec le mot qui convient, puis traduisez-les en espagnol. Je ne sais pas
+        où elle habite. Nous avons mangé chez nos amis hier soir et nous sommes rentrés très tard. Il
+        faut que tu viennes avec moi demain matin. Les enfants jouent dans le jardin pendant que leurs
+        parents préparent le déjeuner. C'est une belle journée d'été, le soleil brille et il fait chaud.
+        Quelle heure est-il ? Je voudrais un café au lait, s'il vous plaît. Elle a acheté une nouvelle
+        voiture pour aller au travail. Ils se sont rencontrés à l'université il y a dix ans. Qu'est-ce
+        que vous faites ce week-end ? On va au cinéma ou on reste à la maison. Le chien de mon voisin
+        aboie toute la nuit. Réponds aux questions suivantes en utilisant le vocabulaire de la leçon.
+        L'hiver dernier, nous avons fait du ski dans les montagnes. Cette chanson me rappelle mon
+        enfance. Il pleut beaucoup en automne, mais le printemps est doux. Où sont mes clés ? Je les
+        cherche depuis ce matin. Avoir besoin de, être en train de, aujourd'hui, peut-être, beaucoup.
+    """,
+    "es": """
+        Completa las frases con la palabra adecuada y tradúcelas al francés. No sé dónde vive ella.
+        Anoche cenamos en casa de unos amigos y volvimos muy tarde. Es necesario que vengas conmigo
+        mañana por la mañana. Los niños juegan en el jardín mientras sus padres preparan la comida.
+        Es un hermoso día de verano, el sol brilla y hace calor. ¿Qué hora es? Quisiera un café con
+        leche, por favor. Ella compró un coche nuevo para ir al trabajo. Se conocieron en la
+        universidad hace diez años. ¿Qué hacéis este fin de semana? Vamos al cine o nos quedamos en
+        casa. El perro de mi vecino ladra toda la noche. Contesta a las preguntas siguientes usando el
+        vocabulario de la lección. El invierno pasado esquiamos en las montañas. Esta canción me
+        recuerda mi niñez. Llueve mucho en otoño, pero la primavera es suave. ¿Dónde están mis llaves?
+        Las busco desde esta mañana. Tener que, estar a punto de, hoy, quizás, mucho, también, pequeño.
+    """,
+    "en": """
+        Complete the sentences with the right word, then translate them into Spanish. I don't know
+        where she lives. Last night we had dinner with some friends and came home very late. You have
+        to come with me tomorrow morning. The children are playing in the garden while their parents
+        are cooking lunch. It is a beautiful summer day, the sun is shining and it is hot. What time is
+        it? I would like a white coffee, please. She bought a new car to go to work. They met at the
+        university ten years ago. What are you doing this weekend? We could go to the cinema or stay at
+        home. My neighbour's dog barks all night long. Answer the following questions using the
+        vocabulary of the lesson. Last winter we went skiing in the mountains. This song reminds me of
+        my childhood. It rains a lot in autumn, but spring is mild. Where are my keys? I have been
+        looking for them since this morning. Exercise, chapter, unit, page, see also, which, through.
+    """,
+    "de": """
+        Ergänze die Sätze mit dem passenden Wort und übersetze sie ins Französische. Ich weiß nicht,
+        wo sie wohnt. Gestern Abend haben wir bei Freunden gegessen und sind sehr spät nach Hause
+        gekommen. Du musst morgen früh mit mir kommen. Die Kinder spielen im Garten, während ihre
+        Eltern das Mittagessen kochen. Es ist ein schöner Sommertag, die Sonne scheint und es ist
+        heiß. Wie spät ist es? Ich hätte gern einen Milchkaffee, bitte. Sie hat ein neues Auto
+        gekauft, um zur Arbeit zu fahren. Sie haben sich vor zehn Jahren an der Universität
+        kennengelernt. Was macht ihr am Wochenende? Wir gehen ins Kino oder bleiben zu Hause. Der Hund
+        meines Nachbarn bellt die ganze Nacht. Beantworte die folgenden Fragen mit dem Wortschatz der
+        Lektion. Letzten Winter sind wir in den Bergen Ski gefahren. Dieses Lied erinnert mich an
+        meine Kindheit. Im Herbst regnet es viel, aber der Frühling ist mild. Wo sind meine Schlüssel?
+    """,
+    "it": """
+        Completa le frasi con la parola giusta e poi traducile in francese. Non so dove abita lei.
+        Ieri sera abbiamo cenato da alcuni amici e siamo tornati molto tardi. Bisogna che tu venga con
+        me domani mattina. I bambini giocano in giardino mentre i loro genitori preparano il pranzo.
+        È una bella giornata d'estate, il sole splende e fa caldo. Che ore sono? Vorrei un caffellatte,
+        per favore. Lei ha comprato una macchina nuova per andare al lavoro. Si sono conosciuti
+        all'università dieci anni fa. Che cosa fate questo fine settimana? Andiamo al cinema o restiamo
+        a casa. Il cane del mio vicino abbaia tutta la notte. Rispondi alle domande seguenti usando il
+        vocabolario della lezione. L'inverno scorso abbiamo sciato in montagna. Questa canzone mi
+        ricorda la mia infanzia. Piove molto in autunno, ma la primavera è mite. Dove sono le mie
+        chiavi? Le cerco da stamattina. Avere bisogno di, stare per, oggi, forse, molto, anche, gli.
+    """,
+    "pt": """
+        Complete as frases com a palavra certa e depois traduza-as para o francês. Não sei onde ela
+        mora. Ontem à noite jantámos em casa de uns amigos e voltámos muito tarde. É preciso que
+        venhas comigo amanhã de manhã. As crianças brincam no jardim enquanto os pais preparam o
+        almoço. É um lindo dia de verão, o sol brilha e está calor. Que horas são? Queria um café com
+        leite, por favor. Ela comprou um carro novo para ir para o trabalho. Conheceram-se na
+        universidade há dez anos. O que vocês fazem neste fim de semana? Vamos ao cinema ou ficamos em
+        casa. O cão do meu vizinho ladra a noite toda. Responda às perguntas seguintes usando o
+        vocabulário da lição. No inverno passado esquiámos nas montanhas. Esta canção lembra-me a
+        minha infância. Chove muito no outono, mas a primavera é amena. Onde estão as minhas chaves?
+        Procuro-as desde esta manhã. Ter de, estar prestes a, hoje, talvez, muito, também, não, são.
+    """,
+}
+
+# Tout ce qui n'est pas une lettre devient une espace (les fins de ligne sont gardées)
+_NON_LETTRES = re.compile(r"[^\w\n]+|[\d_]+")
+_ESPACES = re.compile(r" {2,}")
+_SALAGES = (np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F), np.uint64(0x165667B19E3779F9))
+_DECALAGE = np.uint64(64 - BUCKETS.bit_length() + 1)
+
+
+def _grammes(lignes):
+    """N-grammes hachés (1 à 3 caractères) de toutes les lignes à la fois.
+
+    Renvoie (cases, rang de la ligne de chaque n-gramme, nombre de lettres par ligne).
+    """
+    texte = _NON_LETTRES.sub(" ", "\n".join(lignes).casefold())
+    texte = " " + _ESPACES.sub(" ", texte.replace("\n", " \n ")) + " "
+    codes = np.frombuffer(texte.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    fin_ligne = codes == 10
+    rang = np.cumsum(fin_ligne)
+    lettre = ~fin_ligne & (codes != 32)
+    lettres = np.bincount(rang[lettre], minlength=len(lignes))
+
+    cases, rangs = [], []
+    for n in (1, 2, 3):
+        m = len(codes) - n + 1
+        if m <= 0:
+            continue
+        valide = ~fin_ligne[:m].copy()
+        h = np.zeros(m, dtype=np.uint64)
+        for k in range(n):
+            valide &= ~fin_ligne[k:k + m]
+            h = (h ^ codes[k:k + m]) * _SALAGES[k]
+        if n == 1:
+            valide &= lettre[:m]
+        h = (h + np.uint64(n)) * _SALAGES[2] >> _DECALAGE
+        cases.append(h[valide].astype(np.int64) & (BUCKETS - 1))
+        rangs.append(rang[:m][valide])
+    return np.concatenate(cases), np.concatenate(rangs), lettres
+
+
+class IdentifiantLangue:
+    """Classifieur bayésien naïf sur n-grammes de caractères, limité aux langues données."""
+
+    def __init__(self, langues):
+        inconnues = [l for l in langues if l not in ECHANTILLONS]
+        if inconnues:
+            raise ValueError(f"Pas d'échantillon pour la langue : {', '.join(inconnues)} "
+                             f"(connues : {', '.join(ECHANTILLONS)})")
+        self.langues = tuple(dict.fromkeys(langues))
+        self.log_probas = np.empty((BUCKETS, len(self.langues)))
+        for k, langue in enumerate(self.langues):
+            lignes = ECHANTILLONS[langue].split("\n")
+            cases, _, _ = _grammes(lignes)
+            comptes = np.bincount(cases, minlength=BUCKETS) + LISSAGE
+            self.log_probas[:, k] = np.log(comptes / comptes.sum())
+
+    def scores(self, lignes):
+        """(log-vraisemblances adoucies [ligne, langue], nombre de lettres par ligne)."""
+        n = len(lignes)
+        if n == 0:
+            return np.zeros((0, len(self.langues))), np.zeros(0, dtype=np.int64)
+        cases, rangs, lettres = _grammes(lignes)
+        scores = np.stack([np.bincount(rangs, weights=self.log_probas[cases, k], minlength=n)
+                           for k in range(len(self.langues))], axis=1)
+        return scores / TEMPERATURE, lettres
+
+    def decider(self, scores, lettres, dominante=None):
+        """(indice de la meilleure langue, confiance) ; `dominante` : indice de langue favorisé a priori.
+
+        La confiance est la probabilité a posteriori de la meilleure langue ; elle vaut 0
+        sous LETTRES_MIN lettres.
+        """
+        scores = scores.copy()
+        if dominante is not None:
+            scores[:, dominante] += np.log(A_PRIORI_DOMINANTE)
+        scores -= scores.max(axis=1, keepdims=True)
+        probas = np.exp(scores)
+        probas /= probas.sum(axis=1, keepdims=True)
+        meilleure = probas.argmax(axis=1)
+        confiance = np.where(lettres >= LETTRES_MIN, probas[np.arange(len(probas)), meilleure], 0.0)
+        return meilleure, confiance
+
+    def identifier(self, lignes):
+        """(indice de langue, confiance, nombre de lettres) de chaque ligne, en tableaux numpy."""
+        scores, lettres = self.scores(lignes)
+        return (*self.decider(scores, lettres), lettres)
+
+    def langues_des_lignes(self, lignes, seuil=SEUIL_CONFIANCE):
+        """Langue de chaque ligne, ou None si la décision n'est pas sûre."""
+        meilleure, confiance, _ = self.identifier(lignes)
+        return [self.langues[k] if c >= seuil else None for k, c in zip(meilleure, confiance)]
+
+
+@lru_cache(maxsize=None)
+def identifiant_pour(langues):
+    """Identifiant partagé pour les langues cibles `langues` (+ les langues témoins)."""
+    return IdentifiantLangue(tuple(langues) + LANGUES_TEMOINS)
+
+
+def filtrer_lignes(lignes, langues, seuil=SEUIL_CONFIANCE):
+    """Lignes d'un document dans sa langue dominante (parmi `langues`).
+
+    Sont écartées les lignes sans lettre (numéros de page, filets) et celles qui
+    sont sûrement dans une autre langue. Les lignes courtes ou ambiguës restent.
+    La page des lignes (nettoyage.LignesPaginees) est conservée.
+    """
+    if not ACTIF or not lignes:
+        return lignes
+    identifiant = identifiant_pour(tuple(langues))
+    scores, lettres = identifiant.scores(lignes)
+    meilleure, confiance = identifiant.decider(scores, lettres)
+    sures = confiance >= seuil
+    cibles = np.isin(meilleure, [identifiant.langues.index(l) for l in langues])
+    votes = np.bincount(meilleure[sures & cibles], minlength=len(identifiant.langues))
+    if votes.any():
+        dominante = int(votes.argmax())
+        meilleure, confiance = identifiant.decider(scores, lettres, dominante)
+        hors_langue = (confiance >= seuil) & (meilleure != dominante)
+    else:
+        hors_langue = sures & ~cibles
+    garder = np.flatnonzero((lettres > 0) & ~hors_langue)
+    ecartees = len(lignes) - len(garder)
+    if not ecartees:
+        return lignes
+    metriques.compter("lignes_hors_langue", ecartees)
+    filtrees = type(lignes)()
+    pages = getattr(lignes, "pages", None)
+    for i in garder:
+        filtrees.append(lignes[i])
+        if pages is not None:
+            filtrees.pages.append(pages[i])
+    return filtrees
+
+
+def controler_paires(table, langues, seuil=SEUIL_CONFIANCE):
+    """Vérifie que Recto et Verso d'une TablePaires sont dans les langues attendues.
+
+    Le sens (langue du recto, langue du verso) est celui de la majorité des paires
+    sûres du document. Une paire dans le sens inverse est retournée ; une paire dont
+    un côté est sûrement dans une autre langue (ou sans lettre) est écartée.
+    """
+    if not ACTIF or not table:
+        return table
+    identifiant = identifiant_pour(tuple(langues))
+    rectos, versos = zip(*table)
+    scores, lettres = identifiant.scores(rectos + versos)
+    langue, confiance = identifiant.decider(scores, lettres)
+    n = len(table)
+    l_recto, l_verso = langue[:n], langue[n:]
+    sur_recto, sur_verso = confiance[:n] >= seuil, confiance[n:] >= seuil
+    cibles = [identifiant.langues.index(l) for l in langues]
+
+    sens = Counter(zip(l_recto[sur_recto & sur_verso].tolist(), l_verso[sur_recto & sur_verso].tolist()))
+    sens = [s for s, _ in sens.most_common() if s[0] != s[1] and s[0] in cibles and s[1] in cibles]
+    if sens:
+        attendu_recto, attendu_verso = sens[0]
+
+        def juger(langue_recto, langue_verso):
+            """Paires compatibles avec ce sens, chaque côté rejugé avec sa langue attendue a priori."""
+            l_r, c_r = identifiant.decider(scores[:n], lettres[:n], langue_recto)
+            l_v, c_v = identifiant.decider(scores[n:], lettres[n:], langue_verso)
+            sur_r, sur_v = c_r >= seuil, c_v >= seuil
+            compatibles = ~(sur_r & (l_r != langue_recto)) & ~(sur_v & (l_v != langue_verso))
+            return compatibles, sur_r | sur_v
+
+        dans_le_sens, _ = juger(attendu_recto, attendu_verso)
+        a_l_envers, decidees = juger(attendu_verso, attendu_recto)
+        inversees = ~dans_le_sens & a_l_envers & decidees
+        hors_langue = ~dans_le_sens & ~inversees
+    else:
+        inversees = np.zeros(n, dtype=bool)
+        hors_langue = ((sur_recto & ~np.isin(l_recto, cibles)) | (sur_verso & ~np.isin(l_verso, cibles))
+                       | (sur_recto & sur_verso & (l_recto == l_verso)))
+    hors_langue |= (lettres[:n] == 0) | (lettres[n:] == 0)
+    if not inversees.any() and not hors_langue.any():
+        return table
+
+    metriques.compter("paires_hors_langue", int(hors_langue.sum()))
+    metriques.compter("paires_inversees", int(inversees.sum()))
+    controlee = type(table)()
+    for i in np.flatnonzero(~hors_langue):
+        recto, verso, document, page, ligne = table.ligne_complete(i)
+        if inversees[i]:
+            recto, verso = verso, recto
+        controlee.ajouter(recto, verso, document, page, ligne)
+    return controlee
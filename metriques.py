@@ -0,0 +1,172 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+# =======================================================
+# 🔹 MÉTRIQUES D'EXÉCUTION (durées par étape + compteurs)
+# =======================================================
+# Une exécution (un appel à imperator*, un envoi Anki...) ouvre un objet
+# Metriques, rendu "courant" via une ContextVar. Les fonctions du pipeline
+# appellent simplement span("ocr") / compter("pages", n) : sans exécution
+# en cours, ces appels ne font rien.
+
+# Compteurs toujours présents dans les rapports (à 0 s'ils n'ont pas servi)
+COMPTEURS = ("pages", "chunks", "paires", "appels_api", "tokens", "retries", "cache_hits")
+
+_courantes = contextvars.ContextVar("metriques", default=None)
+
+
+class Metriques:
+    def __init__(self, **etiquettes):
+        self.etiquettes = etiquettes
+        self.debut = time.time()
+        self.fin = None
+        self.verrou = threading.Lock()
+        self.etapes = {}
+        self.compteurs = dict.fromkeys(COMPTEURS, 0)
+        # Fonctions appelées en (nom, "debut" | "fin") autour de chaque étape (cf. profilage.py)
+        self.observateurs = []
+
+    @contextmanager
+    def span(self, nom):
+        for observateur in self.observateurs:
+            observateur(nom, "debut")
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.ajouter_duree(nom, time.perf_counter() - debut)
+            for observateur in self.observateurs:
+                observateur(nom, "fin")
+
+    def ajouter_duree(self, nom, duree):
+        with self.verrou:
+            etape = self.etapes.setdefault(nom, {"appels": 0, "secondes": 0.0, "max_secondes": 0.0})
+            etape["appels"] += 1
+            etape["secondes"] += duree
+            etape["max_secondes"] = max(etape["max_secondes"], duree)
+
+    def compter(self, nom, n=1):
+        with self.verrou:
+            self.compteurs[nom] = self.compteurs.get(nom, 0) + n
+
+    def terminer(self):
+        self.fin = time.time()
+
+    def rapport(self):
+        with self.verrou:
+            fin = self.fin or time.time()
+            return {
+                "etiquettes": dict(self.etiquettes),
+                "debut": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.debut)),
+                "duree_secondes": round(fin - self.debut, 4),
+                "etapes": {nom: dict(v) for nom, v in self.etapes.items()},
+                "compteurs": dict(self.compteurs),
+            }
+
+    def vers_prometheus(self, prefixe="imperator"):
+        """Format texte Prometheus (compatible avec le textfile collector de node_exporter)."""
+        rapport = self.rapport()
+        etiquettes = ",".join(f'{_nom_metrique(k)}="{_echapper(v)}"' for k, v in rapport["etiquettes"].items())
+
+        def serie(nom, valeur, extra=""):
+            tout = ",".join(x for x in (etiquettes, extra) if x)
+            return f"{nom}{{{tout}}} {valeur}" if tout else f"{nom} {valeur}"
+
+        lignes = [
+            f"# HELP {prefixe}_execution_secondes Durée totale de l'exécution",
+            f"# TYPE {prefixe}_execution_secondes gauge",
+            serie(f"{prefixe}_execution_secondes", rapport["duree_secondes"]),
+            f"# HELP {prefixe}_etape_secondes_total Temps cumulé par étape",
+            f"# TYPE {prefixe}_etape_secondes_total counter",
+        ]
+        for nom, etape in rapport["etapes"].items():
+            lignes.append(serie(f"{prefixe}_etape_secondes_total", round(etape["secondes"], 6), f'etape="{nom}"'))
+        lignes += [
+            f"# HELP {prefixe}_etape_appels_total Nombre de passages par étape",
+            f"# TYPE {prefixe}_etape_appels_total counter",
+        ]
+        for nom, etape in rapport["etapes"].items():
+            lignes.append(serie(f"{prefixe}_etape_appels_total", etape["appels"], f'etape="{nom}"'))
+        for nom, valeur in rapport["compteurs"].items():
+            metrique = f"{prefixe}_{_nom_metrique(nom)}_total"
+            lignes += [f"# TYPE {metrique} counter", serie(metrique, valeur)]
+        return "\n".join(lignes) + "\n"
+
+    def ecrire(self, chemin_base):
+        """Écrit <chemin_base>.metrics.json et <chemin_base>.prom ; renvoie le chemin du JSON.
+
+        Si METRIQUES_DIR est défini, les fichiers y sont écrits (ex. dossier du textfile collector).
+        """
+        base = os.path.splitext(chemin_base)[0]
+        dossier = os.getenv("METRIQUES_DIR")
+        if dossier:
+            os.makedirs(dossier, exist_ok=True)
+            base = os.path.join(dossier, os.path.basename(base))
+        with open(base + ".metrics.json", "w", encoding="utf-8") as f:
+            json.dump(self.rapport(), f, indent=2, ensure_ascii=False)
+        with open(base + ".prom", "w", encoding="utf-8") as f:
+            f.write(self.vers_prometheus())
+        return base + ".metrics.json"
+
+
+def _nom_metrique(nom):
+    return re.sub(r"[^a-zA-Z0-9_]", "_", str(nom))
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# --- API utilisée par le pipeline ---
+
+def courantes():
+    return _courantes.get()
+
+
+@contextmanager
+def execution(**etiquettes):
+    """Ouvre une exécution mesurée ; réutilise celle en cours si elle existe déjà."""
+    existantes = _courantes.get()
+    if existantes is not None:
+        for cle, valeur in etiquettes.items():
+            existantes.etiquettes.setdefault(cle, valeur)
+        yield existantes
+        return
+    m = Metriques(**etiquettes)
+    jeton = _courantes.set(m)
+    try:
+        yield m
+    finally:
+        m.terminer()
+        _courantes.reset(jeton)
+
+
+@contextmanager
+def span(nom):
+    m = _courantes.get()
+    if m is None:
+        yield
+        return
+    with m.span(nom):
+        yield
+
+
+def propager(fonction):
+    """Enveloppe `fonction` pour qu'elle s'exécute dans une copie du contexte courant.
+
+    À utiliser pour les tâches soumises à un ThreadPoolExecutor : sans cela, les
+    threads du pool ne voient pas l'exécution en cours et rien n'est compté.
+    """
+    contexte = contextvars.copy_context()
+    return lambda *args, **kwargs: contexte.run(fonction, *args, **kwargs)
+
+
+def compter(nom, n=1):
+    m = _courantes.get()
+    if m is not None:
+        m.compter(nom, n)
@@ -0,0 +1,175 @@
+import re
+from array import array
+from functools import lru_cache
+
+# =======================================================
+# 🔹 RÈGLES DE NETTOYAGE (déclaratives)
+# =======================================================
+# Chaque profil décrit ce qu'il faut retirer d'une ligne OCR. Les profils sont
+# compilés une seule fois (voir Nettoyeur) puis appliqués ligne par ligne.
+
+# Mots d'en-tête : la ligne est coupée à partir du mot trouvé.
+# "partout" = n'importe où dans la ligne, "debut" = seulement en tête de ligne.
+ENTETES_PAR_LANGUE = {
+    "fr": {
+        "partout": ("Thème", "Corrigé", "Exercice", "Exercices", "Partie", "VOCABULAIRE",
+                    "Chapitre", "Première", "Troisième"),
+        "debut": ("Deuxième", "Leçon", "Unité"),
+    },
+    "es": {
+        "partout": (),
+        "debut": ("Tema", "Ejercicio", "Ejercicios", "Capítulo", "Vocabulario", "Lección", "Unidad"),
+    },
+    "en": {
+        "partout": (),
+        "debut": ("Exercise", "Exercises", "Chapter", "Vocabulary", "Lesson", "Unit"),
+    },
+}
+
+# Bruit markdown : supprimé là où il apparaît.
+BRUIT_MARKDOWN = (r"#+", r"={2,}", r"-{2,}")
+
+# Numérotation en tête de ligne ("1.", "12)", "3 ").
+NUMEROTATION = r"^[\s#>*]*\d{1,3}[\.\)]?\s+"
+
+PROFILS = {
+    "defaut": {"langues": ("fr",), "bruit_markdown": True, "numerotation": False},
+    # La numérotation est conservée : apparier_phrases s'en sert pour aligner.
+    "recto_verso": {"langues": ("fr", "es"), "bruit_markdown": True, "numerotation": False},
+    # L'agent renvoie "1 recto | verso" : le numéro n'a rien à faire dans la carte.
+    "combine": {"langues": ("fr", "es"), "bruit_markdown": True, "numerotation": True},
+    "manuel": {"langues": ("fr", "es"), "bruit_markdown": True, "numerotation": True},
+}
+
+
+def _alternative(mots):
+    return "|".join(re.escape(m) for m in sorted(set(mots), key=len, reverse=True))
+
+
+def _regex_balayage(mots):
+    """Regex en minuscules pour les en-têtes "partout" et le bruit markdown.
+
+    Elle commence par une classe de caractères (premières lettres des mots, #, =, -),
+    ce qui permet au moteur `re` de sauter directement aux positions candidates
+    au lieu d'essayer toutes les alternatives à chaque caractère.
+    """
+    par_initiale = {}
+    for mot in mots:
+        mot = mot.lower()
+        par_initiale.setdefault(mot[0], []).append(mot[1:])
+    branches = [r"(?<=#)#*", r"(?<==)=+", r"(?<=-)-+"]
+    for initiale, suites in par_initiale.items():
+        branches.append(rf"(?<=\b{re.escape(initiale)})(?:{_alternative(suites)})\b.*")
+    initiales = re.escape("#=-" + "".join(par_initiale))
+    return re.compile(rf"[{initiales}](?:{'|'.join(branches)})")
+
+
+class Nettoyeur:
+    """Profil compilé : une passe regex par bloc de lignes + un `match` ancré par ligne."""
+
+    def __init__(self, partout, debut, numerotation, bruit_markdown):
+        morceaux = []
+        if partout:
+            morceaux.append(rf"\b(?:{_alternative(partout)})\b.*")
+        if bruit_markdown:
+            morceaux.extend(BRUIT_MARKDOWN)
+            self.balayage = _regex_balayage(partout)
+        else:
+            # Appliquée au texte en minuscules ; IGNORECASE plutôt que lower() du motif (\W → \w...)
+            self.balayage = re.compile("|".join(morceaux), flags=re.IGNORECASE) if morceaux else None
+        # Repli (sans passage en minuscules) si lower() change la longueur du texte
+        self.balayage_i = re.compile("|".join(morceaux), flags=re.IGNORECASE) if morceaux else None
+
+        ancres = []
+        if debut:
+            ancres.append(rf"[\W\d]*\b(?:{_alternative(debut)})\b.*")
+        if numerotation:
+            ancres.append(NUMEROTATION.lstrip("^"))
+        self.debut = re.compile("|".join(ancres), flags=re.IGNORECASE) if ancres else None
+
+    def nettoyer_bloc(self, bloc):
+        if self.balayage is None:
+            return bloc
+        bas = bloc.lower()
+        if len(bas) != len(bloc):
+            return self.balayage_i.sub("", bloc)
+        morceaux, pos = [], 0
+        for m in self.balayage.finditer(bas):
+            morceaux.append(bloc[pos:m.start()])
+            pos = m.end()
+        if not morceaux:
+            return bloc
+        morceaux.append(bloc[pos:])
+        return "".join(morceaux)
+
+    def lignes(self, lignes, taille_bloc=2048):
+        """Nettoie un itérable de lignes au fil de l'eau, par blocs de `taille_bloc` lignes."""
+        bloc = []
+        for ligne in lignes:
+            bloc.append(ligne.rstrip("\n"))
+            if len(bloc) >= taille_bloc:
+                yield from self._finir_bloc(bloc)
+                bloc = []
+        if bloc:
+            yield from self._finir_bloc(bloc)
+
+    def _finir_bloc(self, bloc):
+        debut = self.debut.match if self.debut else None
+        for ligne in self.nettoyer_bloc("\n".join(bloc)).split("\n"):
+            if debut:
+                m = debut(ligne)
+                if m:
+                    ligne = ligne[m.end():]
+            ligne = " ".join(ligne.split())
+            if ligne:
+                yield ligne
+
+
+@lru_cache(maxsize=None)
+def compiler_profil(nom="defaut"):
+    """Compile un profil déclaré dans PROFILS en un Nettoyeur réutilisable."""
+    if nom not in PROFILS:
+        raise ValueError(f"Profil de nettoyage inconnu : {nom}")
+    profil = PROFILS[nom]
+
+    partout, debut = [], []
+    for langue in profil["langues"]:
+        partout.extend(ENTETES_PAR_LANGUE[langue]["partout"])
+        debut.extend(ENTETES_PAR_LANGUE[langue]["debut"])
+    return Nettoyeur(partout, debut, profil["numerotation"], profil["bruit_markdown"])
+
+
+def nettoyer_lignes(lignes, profil="defaut"):
+    """Nettoie un itérable de lignes OCR au fil de l'eau et renvoie les lignes non vides."""
+    return compiler_profil(profil).lignes(lignes)
+
+
+def nettoyer_texte(texte, profil="defaut"):
+    """Nettoie un texte OCR complet : supprime les titres, espaces, caractères inutiles."""
+    return list(nettoyer_lignes(texte.splitlines(), profil))
+
+
+class LignesPaginees(list):
+    """Lignes nettoyées (une liste ordinaire) + numéro de page source de chacune (`pages`)."""
+
+    def __init__(self, lignes=(), pages=()):
+        super().__init__(lignes)
+        self.pages = array("i", pages)
+
+    def par_page(self):
+        """{numéro de page: [indices des lignes]}, dans l'ordre du document."""
+        groupes = {}
+        for i, page in enumerate(self.pages):
+            groupes.setdefault(page, []).append(i)
+        return groupes
+
+
+def nettoyer_pages(pages, profil="defaut"):
+    """Nettoie des pages OCR [(numéro, texte)] en gardant la page d'origine de chaque ligne."""
+    nettoyeur = compiler_profil(profil)
+    lignes = LignesPaginees()
+    for numero, texte in pages:
+        for ligne in nettoyeur.lignes(texte.splitlines()):
+            lignes.append(ligne)
+            lignes.pages.append(numero)
+    return lignes
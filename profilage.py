@@ -0,0 +1,142 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import metriques
+
+# =======================================================
+# 🔹 MODE PROFILAGE (CPU + mémoire)
+# =======================================================
+# profiler() exécute une fonction imperator* sous :
+#   - cProfile (thread appelant)        -> hotspots.txt + profil.pstats
+#   - un échantillonneur de piles       -> pile.collapsed (tous les threads, pour flamegraph.pl / speedscope)
+#   - tracemalloc, instantané par étape -> allocations.txt (sites d'allocation par étape du pipeline)
+
+
+class _Echantillonneur(threading.Thread):
+    """Relève périodiquement la pile de chaque thread et compte les piles identiques."""
+
+    def __init__(self, intervalle=0.005):
+        super().__init__(daemon=True, name="profilage-echantillonneur")
+        self.intervalle = intervalle
+        self.piles = Counter()
+        self.arret = threading.Event()
+
+    def run(self):
+        moi = threading.get_ident()
+        noms = {}
+        while not self.arret.wait(self.intervalle):
+            for t in threading.enumerate():
+                noms[t.ident] = t.name
+            for ident, frame in sys._current_frames().items():
+                if ident == moi:
+                    continue
+                pile = []
+                while frame is not None:
+                    code = frame.f_code
+                    pile.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                pile.append(noms.get(ident, str(ident)))
+                self.piles[";".join(reversed(pile))] += 1
+
+    def ecrire(self, chemin):
+        with open(chemin, "w", encoding="utf-8") as f:
+            for pile, n in self.piles.most_common():
+                f.write(f"{pile} {n}\n")
+
+
+class _AllocationsParEtape:
+    """Observateur de Metriques : diff tracemalloc entre le début et la fin de chaque étape.
+
+    Seuls les `max_par_etape` premiers passages d'une étape sont mesurés, pour que
+    les étapes appelées des centaines de fois (vérification) ne ralentissent pas tout.
+    """
+
+    def __init__(self, max_par_etape=3, top=10):
+        self.max_par_etape = max_par_etape
+        self.top = top
+        self.ouverts = {}
+        self.passages = Counter()
+        self.sites = {}
+        self.verrou = threading.Lock()
+
+    def __call__(self, nom, phase):
+        cle = (threading.get_ident(), nom)
+        if phase == "debut":
+            if self.passages[nom] < self.max_par_etape:
+                self.ouverts[cle] = tracemalloc.take_snapshot()
+            return
+        avant = self.ouverts.pop(cle, None)
+        if avant is None:
+            return
+        with self.verrou:
+            self.passages[nom] += 1
+            sites = self.sites.setdefault(nom, Counter())
+            for stat in tracemalloc.take_snapshot().compare_to(avant, "lineno"):
+                if stat.size_diff > 0:
+                    sites[str(stat.traceback)] += stat.size_diff
+
+    def ecrire(self, f):
+        for nom, sites in self.sites.items():
+            f.write(f"\n=== Étape {nom} ({self.passages[nom]} passage(s) mesuré(s)) ===\n")
+            for site, taille in sites.most_common(self.top):
+                f.write(f"{taille / 1024:12.1f} Kio  {site}\n")
+
+
+def profiler(fonction, *args, dossier="profil", intervalle=0.005, **kwargs):
+    """Exécute fonction(*args, **kwargs) sous profilage et écrit les rapports dans `dossier`.
+
+    Renvoie (résultat de la fonction, chemin du dossier de rapports).
+    """
+    os.makedirs(dossier, exist_ok=True)
+    allocations = _AllocationsParEtape()
+    echantillonneur = _Echantillonneur(intervalle)
+    profileur = cProfile.Profile()
+
+    tracemalloc.start()
+    debut = time.perf_counter()
+    with metriques.execution(profilage=True) as m:
+        m.observateurs.append(allocations)
+        echantillonneur.start()
+        profileur.enable()
+        try:
+            resultat = fonction(*args, **kwargs)
+        finally:
+            profileur.disable()
+            echantillonneur.arret.set()
+            echantillonneur.join()
+            duree = time.perf_counter() - debut
+            final = tracemalloc.take_snapshot()
+            pic = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            m.observateurs.remove(allocations)
+            _ecrire_rapports(dossier, profileur, echantillonneur, allocations, final, pic, duree)
+    return resultat, dossier
+
+
+def _ecrire_rapports(dossier, profileur, echantillonneur, allocations, final, pic, duree):
+    profileur.dump_stats(os.path.join(dossier, "profil.pstats"))
+
+    tampon = io.StringIO()
+    stats = pstats.Stats(profileur, stream=tampon).strip_dirs()
+    tampon.write(f"Durée totale : {duree:.2f} s\n\n--- Trié par temps propre (tottime) ---\n")
+    stats.sort_stats("tottime").print_stats(40)
+    tampon.write("\n--- Trié par temps cumulé (cumtime) ---\n")
+    stats.sort_stats("cumulative").print_stats(40)
+    with open(os.path.join(dossier, "hotspots.txt"), "w", encoding="utf-8") as f:
+        f.write(tampon.getvalue())
+
+    with open(os.path.join(dossier, "allocations.txt"), "w", encoding="utf-8") as f:
+        f.write(f"Pic mémoire suivi par tracemalloc : {pic / 1024 / 1024:.1f} Mio\n")
+        f.write("\n=== Mémoire encore allouée en fin d'exécution (top 20) ===\n")
+        for stat in final.statistics("lineno")[:20]:
+            f.write(f"{stat.size / 1024:12.1f} Kio  {stat.traceback}\n")
+        allocations.ecrire(f)
+
+    echantillonneur.ecrire(os.path.join(dossier, "pile.collapsed"))
@@ -0,0 +1,473 @@
+"""Service HTTP local : file de jobs persistante + pool de workers partagé.
+
+    python service.py --port 8080 --workers 4 --dossier service_data
+
+Routes :
+    POST /fichiers?nom=livre.pdf          corps = octets du fichier       -> {"id"}
+    POST /jobs                            JSON {"mode", "fichiers": {"pdf"} ou {"recto", "verso"},
+                                                "utilisateur", "verifier", "pages", "appariement",
+                                                "deck_name", "budget" ($), "budget_pages",
+                                                "moities" (combine : "colonnes" ou "lignes")}  -> {"id", "statut"}
+    POST /estimations                     même JSON que /jobs -> pages OCR, appels, jetons, durée, coût
+    GET  /jobs[?utilisateur=...]          liste des jobs
+    GET  /jobs/<id>                       état du job
+    GET  /jobs/<id>/evenements            progression en Server-Sent Events
+    GET  /jobs/<id>/resultat?format=xlsx|csv|tsv|apkg
+    POST /jobs/<id>/annuler
+    POST /jobs/<id>/reprendre             JSON {"budget", "budget_pages"} : relève le budget d'un job en pause
+
+L'utilisateur peut aussi être donné par l'en-tête X-Utilisateur. Les jobs sont
+servis équitablement : à chaque place libre, on prend le job en attente de
+l'utilisateur qui a le moins de jobs en cours ou en pause (puis le moins récemment servi).
+L'état est conservé dans SQLite : au redémarrage, les jobs en attente ou
+interrompus sont remis dans la file. Un job dont le budget est atteint passe
+"en_pause" (il garde sa place de worker) jusqu'à /reprendre ou /annuler.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import estimation
+import Imperator
+from classeurs import convertir, lire_paires
+from decoupage_pdf import DECOUPES
+from imperator_async import Job
+
+try:
+    import genanki
+except ImportError:  # export .apkg optionnel
+    genanki = None
+
+MODES_SERVICE = ("recto_verso", "combine", "manuel")
+STATUTS_FINAUX = ("termine", "erreur", "annule")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    utilisateur TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    entrees TEXT NOT NULL,
+    options TEXT NOT NULL,
+    statut TEXT NOT NULL,
+    cree_le REAL NOT NULL,
+    debut REAL,
+    fin REAL,
+    paires INTEGER,
+    sortie TEXT,
+    erreur TEXT
+);
+CREATE TABLE IF NOT EXISTS evenements (
+    job_id TEXT NOT NULL,
+    numero INTEGER NOT NULL,
+    donnees TEXT NOT NULL,
+    PRIMARY KEY (job_id, numero)
+);
+"""
+
+
+class Stockage:
+    """Accès SQLite partagé entre les threads HTTP et la boucle des workers."""
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.verrou = threading.Lock()
+        self.nouveaux_evenements = threading.Condition()
+        with self._connexion() as cx:
+            cx.executescript(SCHEMA)
+
+    def _connexion(self):
+        cx = sqlite3.connect(self.chemin, timeout=30)
+        cx.row_factory = sqlite3.Row
+        return cx
+
+    def executer(self, requete, parametres=()):
+        with self.verrou, self._connexion() as cx:
+            return [dict(r) for r in cx.execute(requete, parametres).fetchall()]
+
+    def creer_job(self, utilisateur, mode, entrees, options):
+        job_id = uuid.uuid4().hex[:12]
+        self.executer(
+            "INSERT INTO jobs (id, utilisateur, mode, entrees, options, statut, cree_le) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (job_id, utilisateur, mode, json.dumps(entrees), json.dumps(options), "en_attente", time.time()),
+        )
+        return job_id
+
+    def job(self, job_id):
+        lignes = self.executer("SELECT * FROM jobs WHERE id = ?", (job_id,))
+        return lignes[0] if lignes else None
+
+    def reprendre_interrompus(self):
+        """Au démarrage : les jobs restés "en_cours" ou "en_pause" (arrêt brutal) repassent en attente."""
+        self.executer("UPDATE jobs SET statut = 'en_attente', debut = NULL WHERE statut IN ('en_cours', 'en_pause')")
+
+    def prendre_prochain(self):
+        """Réserve le prochain job selon l'équité par utilisateur ; None si la file est vide."""
+        with self.verrou, self._connexion() as cx:
+            ligne = cx.execute("""
+                SELECT j.id FROM jobs j
+                WHERE j.statut = 'en_attente'
+                ORDER BY
+                    (SELECT COUNT(*) FROM jobs k WHERE k.utilisateur = j.utilisateur
+                                                         AND k.statut IN ('en_cours', 'en_pause')),
+                    COALESCE((SELECT MAX(k.debut) FROM jobs k WHERE k.utilisateur = j.utilisateur), 0),
+                    j.cree_le
+                LIMIT 1
+            """).fetchone()
+            if ligne is None:
+                return None
+            cx.execute("UPDATE jobs SET statut = 'en_cours', debut = ? WHERE id = ?", (time.time(), ligne["id"]))
+            return dict(cx.execute("SELECT * FROM jobs WHERE id = ?", (ligne["id"],)).fetchone())
+
+    def ajouter_evenement(self, job_id, evenement):
+        with self.verrou, self._connexion() as cx:
+            numero = cx.execute("SELECT COALESCE(MAX(numero), 0) + 1 FROM evenements WHERE job_id = ?",
+                                (job_id,)).fetchone()[0]
+            cx.execute("INSERT INTO evenements VALUES (?, ?, ?)", (job_id, numero, json.dumps(evenement)))
+        with self.nouveaux_evenements:
+            self.nouveaux_evenements.notify_all()
+
+    def evenements(self, job_id, apres=0):
+        return self.executer("SELECT numero, donnees FROM evenements WHERE job_id = ? AND numero > ? ORDER BY numero",
+                             (job_id, apres))
+
+    def terminer(self, job_id, statut, paires=None, sortie=None, erreur=None):
+        self.executer("UPDATE jobs SET statut = ?, fin = ?, paires = ?, sortie = ?, erreur = ? WHERE id = ?",
+                      (statut, time.time(), paires, sortie, erreur, job_id))
+        with self.nouveaux_evenements:
+            self.nouveaux_evenements.notify_all()
+
+
+class PoolWorkers:
+    """Boucle asyncio dédiée + N workers qui consomment la file stockée en base."""
+
+    def __init__(self, stockage, dossier, n_workers=4):
+        self.stockage = stockage
+        self.dossier = dossier
+        self.n_workers = n_workers
+        self.boucle = asyncio.new_event_loop()
+        self.reveil = None
+        self.en_cours = {}
+        self.thread = threading.Thread(target=self._tourner, daemon=True, name="service-workers")
+
+    def demarrer(self):
+        self.stockage.reprendre_interrompus()
+        self.thread.start()
+
+    def signaler(self):
+        """Appelé depuis un thread HTTP quand un job est ajouté."""
+        if self.reveil is not None:
+            self.boucle.call_soon_threadsafe(self.reveil.set)
+
+    def annuler(self, job_id):
+        job = self.en_cours.get(job_id)
+        if job is not None:
+            self.boucle.call_soon_threadsafe(job.annuler)
+
+    def reprendre(self, job_id, limites):
+        job = self.en_cours.get(job_id)
+        if job is None or job.budget is None:
+            raise ValueError("Job sans budget ou qui n'est pas en cours")
+        self.boucle.call_soon_threadsafe(lambda: job.reprendre(**limites))
+
+    def _tourner(self):
+        asyncio.set_event_loop(self.boucle)
+        self.reveil = asyncio.Event()
+        self.boucle.run_until_complete(asyncio.gather(*(self._worker() for _ in range(self.n_workers))))
+
+    async def _worker(self):
+        # SQLite (verrou d'écriture compris) hors de la boucle : SSE et HTTP ne l'attendent pas
+        while True:
+            ligne = await asyncio.to_thread(self.stockage.prendre_prochain)
+            if ligne is None:
+                self.reveil.clear()
+                try:
+                    await asyncio.wait_for(self.reveil.wait(), timeout=5)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._executer(ligne)
+            # D'autres jobs ont pu arriver pendant l'exécution : réveiller les workers inactifs
+            self.reveil.set()
+
+    async def _executer(self, ligne):
+        job_id = ligne["id"]
+        options = json.loads(ligne["options"])
+        sortie = os.path.join(self.dossier, "resultats", f"{job_id}.xlsx")
+        budget = None
+        if options.get("budget") is not None or options.get("budget_pages") is not None:
+            budget = estimation.Budget(cout=options.get("budget"), pages=options.get("budget_pages"), attendre=True)
+        job = Job(ligne["mode"], json.loads(ligne["entrees"]), sortie, verifier=options.get("verifier", False),
+                  pages=options.get("pages"), appariement=options.get("appariement", "regles"), budget=budget,
+                  moities=options.get("moities"))
+        self.en_cours[job_id] = job
+        dernier = None
+        try:
+            async for evenement in job:
+                dernier = evenement["type"]
+                evenement.pop("resultat", None)
+                evenement["job"] = job_id
+                if evenement["type"] in ("pause", "reprise"):
+                    statut = "en_pause" if evenement["type"] == "pause" else "en_cours"
+                    await asyncio.to_thread(self.stockage.executer, "UPDATE jobs SET statut = ? WHERE id = ?",
+                                            (statut, job_id))
+                await asyncio.to_thread(self.stockage.ajouter_evenement, job_id, evenement)
+            if dernier == "annule":  # annulé par /annuler : `await job` lèverait CancelledError
+                await asyncio.to_thread(self.stockage.terminer, job_id, "annule")
+                return
+            resultat = await job
+            await asyncio.to_thread(self.stockage.terminer, job_id, "termine", paires=resultat["paires"],
+                                    sortie=sortie)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.stockage.terminer, job_id, "annule")
+        except Exception as e:
+            await asyncio.to_thread(self.stockage.terminer, job_id, "erreur", erreur=f"{type(e).__name__}: {e}")
+        finally:
+            self.en_cours.pop(job_id, None)
+
+
+def exporter_apkg(excel, chemin, deck_name):
+    """Paquet Anki (.apkg) à partir du classeur d'un job (nécessite genanki)."""
+    modele = genanki.Model(
+        1607392319, "Imperator Recto/Verso",
+        fields=[{"name": "Recto"}, {"name": "Verso"}],
+        templates=[{"name": "Carte", "qfmt": "{{Recto}}", "afmt": "{{FrontSide}}<hr id=answer>{{Verso}}"}],
+    )
+    # Identifiant stable (hash() change à chaque démarrage) : un même deck se retrouve dans Anki
+    deck_id = int.from_bytes(hashlib.sha256(deck_name.encode()).digest()[:4], "big") >> 1
+    deck = genanki.Deck(deck_id, deck_name)
+    for recto, verso in lire_paires(excel):
+        deck.add_note(genanki.Note(model=modele, fields=[recto, verso], tags=["auto_import"]))
+    genanki.Package(deck).write_to_file(chemin)
+    return chemin
+
+
+class Gestionnaire(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stockage = None
+    pool = None
+    dossier = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- Réponses ---
+    def _json(self, statut, corps):
+        donnees = json.dumps(corps, ensure_ascii=False).encode()
+        self.send_response(statut)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(donnees)))
+        self.end_headers()
+        self.wfile.write(donnees)
+
+    def _fichier(self, chemin, type_contenu):
+        with open(chemin, "rb") as f:
+            donnees = f.read()
+        self.send_response(200)
+        self.send_header("Content-Type", type_contenu)
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(chemin)}"')
+        self.send_header("Content-Length", str(len(donnees)))
+        self.end_headers()
+        self.wfile.write(donnees)
+
+    def _corps(self):
+        longueur = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(longueur) if longueur else b""
+
+    # --- Routage ---
+    def do_POST(self):
+        url = urlparse(self.path)
+        try:
+            if url.path == "/fichiers":
+                return self._televerser(parse_qs(url.query))
+            if url.path == "/jobs":
+                return self._creer_job()
+            if url.path == "/estimations":
+                return self._estimer()
+            m = re.fullmatch(r"/jobs/(\w+)/(reprendre|annuler)", url.path)
+            if m and self.stockage.job(m.group(1)) is None:
+                return self._json(404, {"erreur": "Job introuvable"})
+            m = re.fullmatch(r"/jobs/(\w+)/reprendre", url.path)
+            if m:
+                demande = json.loads(self._corps() or b"{}")
+                limites = {nom: demande[cle] for cle, nom in (("budget", "cout"), ("budget_pages", "pages"))
+                           if cle in demande}
+                self.pool.reprendre(m.group(1), limites)
+                return self._json(200, self._etat(m.group(1)))
+            m = re.fullmatch(r"/jobs/(\w+)/annuler", url.path)
+            if m:
+                self.pool.annuler(m.group(1))
+                self.stockage.executer("UPDATE jobs SET statut = 'annule' WHERE id = ? AND statut = 'en_attente'",
+                                       (m.group(1),))
+                return self._json(200, self._etat(m.group(1)))
+            self._json(404, {"erreur": "Route inconnue"})
+        except ValueError as e:
+            self._json(400, {"erreur": str(e)})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        requete = parse_qs(url.query)
+        if url.path == "/jobs":
+            utilisateur = requete.get("utilisateur", [None])[0]
+            if utilisateur:
+                lignes = self.stockage.executer("SELECT id FROM jobs WHERE utilisateur = ? ORDER BY cree_le", (utilisateur,))
+            else:
+                lignes = self.stockage.executer("SELECT id FROM jobs ORDER BY cree_le")
+            return self._json(200, [self._etat(l["id"]) for l in lignes])
+        m = re.fullmatch(r"/jobs/(\w+)(/evenements|/resultat)?", url.path)
+        if not m or self.stockage.job(m.group(1)) is None:
+            return self._json(404, {"erreur": "Job introuvable"})
+        job_id, suite = m.groups()
+        if suite == "/evenements":
+            return self._flux_evenements(job_id)
+        if suite == "/resultat":
+            return self._resultat(job_id, requete.get("format", ["xlsx"])[0])
+        self._json(200, self._etat(job_id))
+
+    # --- Actions ---
+    def _televerser(self, requete):
+        nom = os.path.basename(requete.get("nom", ["document.pdf"])[0])
+        fichier_id = uuid.uuid4().hex[:12]
+        chemin = os.path.join(self.dossier, "fichiers", f"{fichier_id}_{nom}")
+        with open(chemin, "wb") as f:
+            f.write(self._corps())
+        self._json(201, {"id": fichier_id, "nom": nom})
+
+    def _chemin_fichier(self, fichier_id):
+        dossier = os.path.join(self.dossier, "fichiers")
+        for nom in os.listdir(dossier):
+            if nom.startswith(f"{fichier_id}_"):
+                return os.path.join(dossier, nom)
+        raise ValueError(f"Fichier inconnu : {fichier_id}")
+
+    def _demande_job(self):
+        """(mode, entrées, demande) d'un JSON de job ; ValueError s'il est incomplet."""
+        demande = json.loads(self._corps() or b"{}")
+        mode = demande.get("mode")
+        if mode not in MODES_SERVICE:
+            raise ValueError(f"Mode invalide : {mode} (attendu : {', '.join(MODES_SERVICE)})")
+        fichiers = demande.get("fichiers", {})
+        if mode == "recto_verso":
+            if "recto" not in fichiers or "verso" not in fichiers:
+                raise ValueError("Le mode recto_verso demande les fichiers 'recto' et 'verso'.")
+            entrees = [self._chemin_fichier(fichiers["verso"]), self._chemin_fichier(fichiers["recto"])]
+        else:
+            if "pdf" not in fichiers:
+                raise ValueError(f"Le mode {mode} demande le fichier 'pdf'.")
+            entrees = [self._chemin_fichier(fichiers["pdf"])]
+        if demande.get("moities") is not None and (mode != "combine" or demande["moities"] not in DECOUPES):
+            raise ValueError(f"moities : {', '.join(DECOUPES)}, et seulement en mode combine.")
+        return mode, entrees, demande
+
+    def _creer_job(self):
+        mode, entrees, demande = self._demande_job()
+        utilisateur = demande.get("utilisateur") or self.headers.get("X-Utilisateur") or "anonyme"
+        options = {"verifier": bool(demande.get("verifier")), "deck_name": demande.get("deck_name", "RectoVerso"),
+                   "pages": demande.get("pages"), "appariement": demande.get("appariement", "regles"),
+                   "budget": demande.get("budget"), "budget_pages": demande.get("budget_pages"),
+                   "moities": demande.get("moities")}
+        job_id = self.stockage.creer_job(utilisateur, mode, entrees, options)
+        self.pool.signaler()
+        self._json(201, self._etat(job_id))
+
+    def _estimer(self):
+        mode, entrees, demande = self._demande_job()
+        prevision = Imperator.estimer(mode, entrees, pages=demande.get("pages"), verifier=bool(demande.get("verifier")),
+                                      appariement=demande.get("appariement", "regles"), asynchrone=True,
+                                      moities=demande.get("moities"))
+        for document in prevision["documents"]:
+            document["pdf"] = os.path.basename(document["pdf"])
+        self._json(200, prevision)
+
+    def _etat(self, job_id):
+        ligne = self.stockage.job(job_id)
+        ligne.pop("entrees", None)
+        ligne["options"] = json.loads(ligne["options"])
+        if ligne["statut"] == "en_attente":
+            ligne["position"] = self.stockage.executer(
+                "SELECT COUNT(*) AS n FROM jobs WHERE statut = 'en_attente' AND cree_le < ?", (ligne["cree_le"],))[0]["n"]
+        return ligne
+
+    def _flux_evenements(self, job_id):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        dernier = 0
+        try:
+            while True:
+                for ligne in self.stockage.evenements(job_id, dernier):
+                    dernier = ligne["numero"]
+                    self.wfile.write(f"id: {dernier}\ndata: {ligne['donnees']}\n\n".encode())
+                statut = self.stockage.job(job_id)["statut"]
+                if statut in STATUTS_FINAUX and not self.stockage.evenements(job_id, dernier):
+                    self.wfile.write(f"event: fin\ndata: {json.dumps({'statut': statut})}\n\n".encode())
+                    break
+                self.wfile.write(b": attente\n\n")
+                self.wfile.flush()
+                with self.stockage.nouveaux_evenements:
+                    self.stockage.nouveaux_evenements.wait(timeout=15)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+    def _resultat(self, job_id, format_):
+        ligne = self.stockage.job(job_id)
+        if ligne["statut"] != "termine" or not ligne["sortie"] or not os.path.exists(ligne["sortie"]):
+            return self._json(409, {"erreur": f"Résultat indisponible (statut : {ligne['statut']})"})
+        excel = ligne["sortie"]
+        if format_ == "xlsx":
+            return self._fichier(excel, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        if format_ in ("csv", "tsv"):
+            chemin = os.path.splitext(excel)[0] + "." + format_
+            convertir(excel, chemin)
+            return self._fichier(chemin, f"text/{'csv' if format_ == 'csv' else 'tab-separated-values'}; charset=utf-8")
+        if format_ == "apkg":
+            if genanki is None:
+                return self._json(501, {"erreur": "Export .apkg indisponible : pip install genanki"})
+            chemin = os.path.splitext(excel)[0] + ".apkg"
+            exporter_apkg(excel, chemin, json.loads(ligne["options"]).get("deck_name", "RectoVerso"))
+            return self._fichier(chemin, "application/octet-stream")
+        self._json(400, {"erreur": f"Format inconnu : {format_} (xlsx, csv, tsv ou apkg)"})
+
+
+def creer_serveur(dossier="service_data", hote="127.0.0.1", port=8080, n_workers=4):
+    for sous_dossier in ("fichiers", "resultats"):
+        os.makedirs(os.path.join(dossier, sous_dossier), exist_ok=True)
+    stockage = Stockage(os.path.join(dossier, "jobs.sqlite3"))
+    pool = PoolWorkers(stockage, dossier, n_workers)
+    gestionnaire = type("GestionnaireService", (Gestionnaire,),
+                        {"stockage": stockage, "pool": pool, "dossier": dossier})
+    serveur = ThreadingHTTPServer((hote, port), gestionnaire)
+    serveur.daemon_threads = True
+    pool.demarrer()
+    return serveur
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hote", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=4, help="Jobs traités en parallèle")
+    parser.add_argument("--dossier", default="service_data", help="Fichiers reçus, résultats et base SQLite")
+    args = parser.parse_args()
+
+    serveur = creer_serveur(args.dossier, args.hote, args.port, args.workers)
+    print(f"Service Imperator sur http://{args.hote}:{args.port} ({args.workers} workers, données dans {args.dossier})")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        serveur.server_close()
+
+
+if __name__ == "__main__":
+    main()
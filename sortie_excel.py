@@ -0,0 +1,169 @@
+import atexit
+import itertools
+import os
+import socket
+import threading
+import time
+
+from classeurs import fusionner_paires
+from table_paires import TablePaires
+
+# =======================================================
+# 🔹 SORTIE EXCEL PARTAGÉE (verrou fichier + écritures regroupées)
+# =======================================================
+# Plusieurs jobs (threads, processus, ou postes sur un lecteur partagé) peuvent
+# ajouter des paires au même classeur :
+#   - un fichier verrou <classeur>.lock (création exclusive) protège la séquence
+#     lecture → concaténation → réécriture (en flux, voir classeurs.py) entre processus ;
+#   - dans un processus, une seule SortieExcel par classeur : les ajouts arrivés
+#     pendant une écriture sont fusionnés dans l'écriture suivante (une seule
+#     relecture / réécriture pour N producteurs) ;
+#   - ajouter(..., attendre=False) met en tampon et vide sur seuil de temps
+#     (`delai`) ou de taille (`taille` lignes).
+
+DELAI_VIDAGE = float(os.getenv("IMPERATOR_SORTIE_DELAI", "2"))
+TAILLE_VIDAGE = int(os.getenv("IMPERATOR_SORTIE_TAILLE", "5000"))
+
+
+class VerrouFichier:
+    """Verrou inter-processus par fichier créé en O_CREAT | O_EXCL.
+
+    Un verrou plus vieux que `perime` secondes (processus tué) est repris.
+    """
+
+    def __init__(self, chemin, delai_max=120, perime=600):
+        self.chemin = chemin
+        self.delai_max = delai_max
+        self.perime = perime
+
+    def __enter__(self):
+        debut = time.monotonic()
+        pause = 0.02
+        while True:
+            try:
+                fd = os.open(self.chemin, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.chemin) > self.perime:
+                        print(f"⚠️ Verrou périmé repris : {self.chemin}")
+                        os.remove(self.chemin)
+                        continue
+                except FileNotFoundError:
+                    continue
+                if time.monotonic() - debut > self.delai_max:
+                    raise TimeoutError(f"Le fichier {self.chemin} est verrouillé par un autre traitement.")
+                time.sleep(pause)
+                pause = min(pause * 2, 0.5)
+                continue
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{socket.gethostname()} {os.getpid()} {time.strftime('%Y-%m-%dT%H:%M:%S')}\n")
+            return self
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.chemin)
+        except FileNotFoundError:
+            pass
+
+
+class SortieExcel:
+    """Écrivain unique d'un classeur pour tout le processus."""
+
+    def __init__(self, chemin, delai=DELAI_VIDAGE, taille=TAILLE_VIDAGE):
+        self.chemin = chemin
+        self.delai = delai
+        self.taille = taille
+        self.condition = threading.Condition()
+        self.en_attente = []     # lots ajoutés (TablePaires ou listes), gardés tels quels jusqu'à l'écriture
+        self.lignes_en_attente = 0
+        self.recu = 0            # numéro du dernier ajout reçu
+        self.ecrit = 0           # numéro du dernier ajout traité (écrit ou en échec)
+        self.echecs = []         # [(premier, dernier, exception)] des écritures ratées
+        self.ecrivain_actif = False
+        self.minuteur = None
+        self.ecritures = 0
+
+    def ajouter(self, lignes, attendre=True):
+        """Ajoute des lignes ; avec attendre=True, rend la main une fois les lignes écrites."""
+        with self.condition:
+            self.en_attente.append(lignes)
+            self.lignes_en_attente += len(lignes)
+            self.recu += 1
+            numero = self.recu
+            if not attendre:
+                if self.lignes_en_attente >= self.taille:
+                    threading.Thread(target=self._vider_en_fond, daemon=True).start()
+                elif self.minuteur is None:
+                    self.minuteur = threading.Timer(self.delai, self._vider_en_fond)
+                    self.minuteur.daemon = True
+                    self.minuteur.start()
+                return
+            while self.ecrit < numero:
+                if self.ecrivain_actif:
+                    self.condition.wait()
+                else:
+                    self._ecrire_en_attente()
+            for premier, dernier, erreur in self.echecs:
+                if premier <= numero <= dernier:
+                    raise erreur
+
+    def vider(self):
+        """Écrit tout ce qui est en tampon (et attend l'écriture en cours)."""
+        with self.condition:
+            cible = self.recu
+            while self.ecrit < cible:
+                if self.ecrivain_actif:
+                    self.condition.wait()
+                else:
+                    self._ecrire_en_attente()
+
+    def _vider_en_fond(self):
+        try:
+            self.vider()
+        except Exception as e:
+            print(f"⚠️ Écriture de {self.chemin} impossible : {e}")
+
+    def _ecrire_en_attente(self):
+        """Appelée condition tenue : prend tout le tampon et l'écrit en une fois."""
+        if self.minuteur is not None:
+            self.minuteur.cancel()
+            self.minuteur = None
+        lot, self.en_attente = self.en_attente, []
+        self.lignes_en_attente = 0
+        premier, dernier = self.ecrit + 1, self.recu
+        self.ecrivain_actif = True
+        self.condition.release()
+        erreur = None
+        try:
+            with VerrouFichier(self.chemin + ".lock"):
+                fusionner_paires(itertools.chain.from_iterable(
+                    l.lignes() if isinstance(l, TablePaires) else l for l in lot), self.chemin)
+        except Exception as e:
+            erreur = e
+        finally:
+            self.condition.acquire()
+            self.ecrivain_actif = False
+            self.ecrit = dernier
+            self.ecritures += 1
+            if erreur is not None:
+                self.echecs = self.echecs[-50:] + [(premier, dernier, erreur)]
+            self.condition.notify_all()
+
+
+_sorties = {}
+_verrou_sorties = threading.Lock()
+
+
+def sortie_pour(chemin):
+    """SortieExcel partagée du classeur `chemin` (une par chemin absolu)."""
+    cle = os.path.abspath(chemin)
+    with _verrou_sorties:
+        if cle not in _sorties:
+            _sorties[cle] = SortieExcel(chemin)
+        return _sorties[cle]
+
+
+@atexit.register
+def vider_tout():
+    for sortie in list(_sorties.values()):
+        sortie._vider_en_fond()
@@ -0,0 +1,246 @@
+"""Démon de dossier surveillé : traite automatiquement les PDF déposés par le scanner.
+
+    python surveillance.py depot --sortie resultats_traitement.xlsx --concurrence 2
+    python surveillance.py depot --une-fois        # traite le contenu actuel puis s'arrête
+
+Conventions de nommage (insensibles à la casse, "_" ou "-") :
+    <nom>_recto.pdf + <nom>_verso.pdf   -> mode recto_verso (attend les deux fichiers)
+    <nom>_combine.pdf                   -> mode combine
+    <nom>_manuel.pdf                    -> mode manuel
+
+Un fichier n'est pris qu'une fois stable (taille et date inchangées pendant
+--stabilite secondes). Les arrivées sont regroupées en lots, traitées par au plus
+--concurrence jobs, puis déplacées dans <depot>/traites ou <depot>/echecs.
+Le journal <depot>/.imperator_journal.jsonl garde l'empreinte de chaque fichier
+traité : un même contenu redéposé n'est jamais retraité (un fichier en échec redéposé l'est).
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from Imperator import MOTIF_NOM, lancer_mode
+
+NOM_JOURNAL = ".imperator_journal.jsonl"
+
+
+def empreinte(chemin):
+    h = hashlib.sha256()
+    with open(chemin, "rb") as f:
+        for bloc in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloc)
+    return h.hexdigest()
+
+
+class Journal:
+    """Fichiers déjà traités (JSON lines, un enregistrement par fichier).
+
+    Seuls les enregistrements "traite" comptent : un fichier en échec redéposé est retraité.
+    """
+
+    def __init__(self, chemin):
+        self.chemin = chemin
+        self.verrou = threading.Lock()  # ajouter() est appelé depuis les threads du pool
+        self.empreintes = set()
+        if os.path.exists(chemin):
+            with open(chemin, encoding="utf-8") as f:
+                for ligne in f:
+                    try:
+                        enregistrement = json.loads(ligne)
+                        if enregistrement.get("statut", "traite") == "traite":
+                            self.empreintes.add(enregistrement["empreinte"])
+                    except (ValueError, KeyError, AttributeError):
+                        continue
+
+    def __contains__(self, valeur):
+        with self.verrou:
+            return valeur in self.empreintes
+
+    def ajouter(self, fichier, valeur, statut, **extra):
+        ligne = json.dumps({"fichier": fichier, "empreinte": valeur, "statut": statut,
+                            "date": time.strftime("%Y-%m-%dT%H:%M:%S"), **extra}, ensure_ascii=False)
+        with self.verrou:
+            if statut == "traite":
+                self.empreintes.add(valeur)
+            with open(self.chemin, "a", encoding="utf-8") as f:
+                f.write(ligne + "\n")
+
+
+class Surveillance:
+    def __init__(self, depot, sortie, concurrence=2, intervalle=2.0, stabilite=2.0,
+                 lot_delai=5.0, lot_max=20, verifier=False):
+        self.depot = depot
+        self.sortie = sortie
+        self.intervalle = intervalle
+        self.stabilite = stabilite
+        self.lot_delai = lot_delai
+        self.lot_max = lot_max
+        self.verifier = verifier
+        self.dossier_traites = os.path.join(depot, "traites")
+        self.dossier_echecs = os.path.join(depot, "echecs")
+        for dossier in (self.dossier_traites, self.dossier_echecs):
+            os.makedirs(dossier, exist_ok=True)
+        self.journal = Journal(os.path.join(depot, NOM_JOURNAL))
+        self.pool = ThreadPoolExecutor(max_workers=concurrence, thread_name_prefix="surveillance")
+        # vus, empreintes et en_cours sont modifiés par les threads du pool (deplacer, fin de job)
+        # pendant que la boucle principale les parcourt : tout accès passe par ce verrou.
+        self.verrou = threading.RLock()
+        self.vus = {}          # chemin -> (taille, mtime_ns, instant du dernier changement)
+        self.empreintes = {}   # chemin stable -> sha256
+        self.en_cours = {}     # chemin -> Future du job qui l'utilise
+        self.ignores = set()
+        self.lot = []
+        self.derniere_arrivee = None
+
+    # --- Scrutation ---
+    def scruter(self):
+        """Un passage sur le dépôt : un seul scandir, l'empreinte n'est calculée qu'une fois le fichier stable."""
+        maintenant = time.monotonic()
+        presents = set()
+        stables = {}
+        with self.verrou, os.scandir(self.depot) as entrees:
+            for entree in entrees:
+                if not entree.is_file() or entree.name.startswith("."):
+                    continue
+                m = MOTIF_NOM.match(entree.name)
+                if m is None:
+                    if entree.name not in self.ignores:
+                        self.ignores.add(entree.name)
+                        print(f"⚠️ Nom non reconnu, fichier ignoré : {entree.name}")
+                    continue
+                chemin = entree.path
+                presents.add(chemin)
+                if chemin in self.en_cours:
+                    continue
+                st = entree.stat()
+                etat = (st.st_size, st.st_mtime_ns)
+                precedent = self.vus.get(chemin)
+                if precedent is None or precedent[:2] != etat:
+                    self.vus[chemin] = (*etat, maintenant)
+                    self.empreintes.pop(chemin, None)
+                    continue
+                if maintenant - precedent[2] < self.stabilite:
+                    continue
+                if chemin not in self.empreintes:
+                    self.empreintes[chemin] = empreinte(chemin)
+                if self.empreintes[chemin] in self.journal:
+                    print(f"↩️ Déjà traité, déplacé sans retraitement : {entree.name}")
+                    self.deplacer(chemin, self.dossier_traites)
+                    continue
+                stables[(m.group("base").lower(), m.group("role").lower())] = chemin
+
+            for chemin in list(self.vus):
+                if chemin not in presents:
+                    self.vus.pop(chemin)
+                    self.empreintes.pop(chemin, None)
+        return self.jobs_prets(stables)
+
+    def jobs_prets(self, stables):
+        """Regroupe les fichiers stables en jobs [(mode, pdfs)] ; un recto attend son verso."""
+        jobs = []
+        for (base, role), chemin in stables.items():
+            if role in ("combine", "manuel"):
+                jobs.append((role, (chemin,)))
+            elif role == "recto" and (base, "verso") in stables:
+                jobs.append(("recto_verso", (stables[(base, "verso")], chemin)))
+        return jobs
+
+    # --- Lots et exécution ---
+    def boucle(self, une_fois=False):
+        print(f"👀 Surveillance de {os.path.abspath(self.depot)} → {self.sortie}")
+        try:
+            while True:
+                prets = self.scruter()
+                with self.verrou:
+                    nouveaux = [j for j in prets if not any(p in self.en_cours for p in j[1])]
+                for job in nouveaux:
+                    if job not in self.lot:
+                        self.lot.append(job)
+                        self.derniere_arrivee = time.monotonic()
+                if self.lot and (len(self.lot) >= self.lot_max or une_fois
+                                 or time.monotonic() - self.derniere_arrivee >= self.lot_delai):
+                    self.envoyer_lot()
+                if une_fois and not self.lot and not self.en_attente_stabilite():
+                    return
+                time.sleep(self.intervalle)
+        except KeyboardInterrupt:
+            print("Arrêt demandé : fin des jobs en cours…")
+        finally:
+            self.pool.shutdown(wait=True)
+
+    def en_attente_stabilite(self):
+        """Vrai tant qu'un job tourne ou qu'un fichier vu n'est pas encore stable."""
+        with self.verrou:
+            return bool(self.en_cours) or any(c not in self.empreintes and c not in self.en_cours for c in self.vus)
+
+    def envoyer_lot(self):
+        print(f"📦 Lot de {len(self.lot)} document(s)")
+        for mode, pdfs in self.lot:
+            with self.verrou:  # en_cours rempli avant que le job ne puisse finir et le vider
+                futur = self.pool.submit(self.traiter, mode, pdfs)
+                for chemin in pdfs:
+                    self.en_cours[chemin] = futur
+            futur.add_done_callback(lambda _, pdfs=pdfs: self.liberer(pdfs))
+        self.lot = []
+
+    def liberer(self, pdfs):
+        with self.verrou:
+            for chemin in pdfs:
+                self.en_cours.pop(chemin, None)
+
+    def traiter(self, mode, pdfs):
+        noms = ", ".join(os.path.basename(p) for p in pdfs)
+        with self.verrou:
+            connues = [self.empreintes.get(p) for p in pdfs]
+        empreintes = [valeur or empreinte(p) for p, valeur in zip(pdfs, connues)]
+        try:
+            lancer_mode(mode, pdfs, self.sortie, verifier=self.verifier)
+        except Exception as e:
+            print(f"❌ {mode} {noms} : {e}")
+            for chemin, valeur in zip(pdfs, empreintes):
+                self.journal.ajouter(os.path.basename(chemin), valeur, "echec", mode=mode, erreur=str(e))
+                destination = self.deplacer(chemin, self.dossier_echecs)
+                with open(destination + ".erreur.txt", "w", encoding="utf-8") as f:
+                    f.write(f"{type(e).__name__}: {e}\n")
+            return False
+        print(f"✅ {mode} {noms}")
+        for chemin, valeur in zip(pdfs, empreintes):
+            self.journal.ajouter(os.path.basename(chemin), valeur, "traite", mode=mode, sortie=self.sortie)
+            self.deplacer(chemin, self.dossier_traites)
+        return True
+
+    def deplacer(self, chemin, dossier):
+        destination = os.path.join(dossier, os.path.basename(chemin))
+        if os.path.exists(destination):
+            base, ext = os.path.splitext(destination)
+            destination = f"{base}.{time.strftime('%Y%m%d-%H%M%S')}{ext}"
+        shutil.move(chemin, destination)
+        with self.verrou:
+            self.vus.pop(chemin, None)
+            self.empreintes.pop(chemin, None)
+        return destination
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("depot", help="Dossier surveillé (dépôt du scanner)")
+    parser.add_argument("--sortie", default="resultats_traitement.xlsx", help="Fichier Excel où ajouter les paires")
+    parser.add_argument("--concurrence", type=int, default=2, help="Jobs traités en parallèle")
+    parser.add_argument("--intervalle", type=float, default=2.0, help="Secondes entre deux scrutations")
+    parser.add_argument("--stabilite", type=float, default=2.0, help="Secondes sans changement avant de prendre un fichier")
+    parser.add_argument("--lot-delai", type=float, default=5.0, help="Attente sans nouvelle arrivée avant d'envoyer un lot")
+    parser.add_argument("--lot-max", type=int, default=20, help="Taille maximale d'un lot")
+    parser.add_argument("--verifier", action="store_true", help="Vérifier les traductions")
+    parser.add_argument("--une-fois", action="store_true", help="Traiter le contenu actuel puis s'arrêter")
+    args = parser.parse_args(argv)
+
+    Surveillance(args.depot, args.sortie, args.concurrence, args.intervalle, args.stabilite,
+                 args.lot_delai, args.lot_max, args.verifier).boucle(une_fois=args.une_fois)
+
+
+if __name__ == "__main__":
+    main()
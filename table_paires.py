@@ -0,0 +1,158 @@
+from array import array
+
+from classeurs import Paire
+
+# =======================================================
+# 🔹 TABLE DE PAIRES COMPACTE (colonnes contiguës)
+# =======================================================
+# Une liste de dicts {"Recto", "Verso"} coûte ~350 octets par paire en plus du
+# texte (dict + deux objets str). TablePaires range chaque colonne de texte dans
+# un seul tampon UTF-8 + un tableau d'offsets, et les métadonnées de provenance
+# (document, page, ligne) dans des tableaux d'entiers, les noms de documents
+# étant internés : ~30 octets par paire en plus du texte.
+#
+#   table = TablePaires()
+#   table.ajouter("la casa", "la maison", document="livre.pdf", page=12, ligne=3)
+#   for recto, verso in table: ...        # Paire(recto, verso)
+#   table[1000:2000]                      # vue sans copie
+#   table.selection([0, 5, 9])            # nouvelle table compacte
+#
+# Les paires sont décodées à la demande : seules celles en cours d'utilisation
+# existent en tant qu'objets Python.
+
+
+class _ColonneTexte:
+    def __init__(self):
+        self.octets = bytearray()
+        self.offsets = array("q", [0])
+
+    def ajouter(self, texte):
+        self.octets += texte.encode("utf-8")
+        self.offsets.append(len(self.octets))
+
+    def __getitem__(self, i):
+        return self.octets[self.offsets[i]:self.offsets[i + 1]].decode("utf-8")
+
+    def taille_octets(self):
+        return len(self.octets) + self.offsets.itemsize * len(self.offsets)
+
+
+class _Colonnes:
+    """Stockage partagé par une table et toutes ses vues."""
+
+    def __init__(self):
+        self.recto = _ColonneTexte()
+        self.verso = _ColonneTexte()
+        self.documents = []            # noms internés
+        self.codes_documents = {}
+        self.document = array("i")     # indice dans `documents` (-1 : inconnu)
+        self.page = array("i")         # numéro de page (0 : inconnue)
+        self.ligne = array("i")        # rang de la ligne dans le texte nettoyé (-1 : inconnu)
+
+    def code_document(self, nom):
+        if nom is None:
+            return -1
+        code = self.codes_documents.get(nom)
+        if code is None:
+            code = self.codes_documents[nom] = len(self.documents)
+            self.documents.append(nom)
+        return code
+
+    def __len__(self):
+        return len(self.page)
+
+
+class TablePaires:
+    def __init__(self, paires=(), document=None):
+        """Table vide, ou remplie avec des paires (dicts {"Recto", "Verso"} ou couples)."""
+        self._colonnes = _Colonnes()
+        self._debut = 0
+        self._fin = None               # None : table complète (suit les ajouts)
+        self.etendre(paires, document)
+
+    @classmethod
+    def _vue(cls, colonnes, debut, fin):
+        vue = cls.__new__(cls)
+        vue._colonnes, vue._debut, vue._fin = colonnes, debut, fin
+        return vue
+
+    # --- Construction ---
+    def ajouter(self, recto, verso, document=None, page=0, ligne=-1):
+        if self._fin is not None:
+            raise TypeError("Une vue de TablePaires est en lecture seule")
+        c = self._colonnes
+        c.recto.ajouter(recto)
+        c.verso.ajouter(verso)
+        c.document.append(c.code_document(document))
+        c.page.append(page)
+        c.ligne.append(ligne)
+
+    def etendre(self, paires, document=None):
+        for paire in paires:
+            if isinstance(paire, dict):
+                self.ajouter(paire["Recto"], paire["Verso"], document)
+            else:
+                self.ajouter(paire[0], paire[1], document)
+
+    def selection(self, indices):
+        """Nouvelle table compacte avec les lignes `indices` (métadonnées comprises)."""
+        table = TablePaires()
+        for i in indices:
+            recto, verso, document, page, ligne = self.ligne_complete(i)
+            table.ajouter(recto, verso, document, page, ligne)
+        return table
+
+    # --- Accès ---
+    def __len__(self):
+        fin = len(self._colonnes) if self._fin is None else self._fin
+        return fin - self._debut
+
+    def _index(self, i):
+        n = len(self)
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError("indice hors de la table")
+        return self._debut + i
+
+    def __getitem__(self, cle):
+        if isinstance(cle, slice):
+            debut, fin, pas = cle.indices(len(self))
+            if pas != 1:
+                return self.selection(range(debut, fin, pas))
+            return TablePaires._vue(self._colonnes, self._debut + debut, self._debut + max(debut, fin))
+        i = self._index(cle)
+        return Paire(self._colonnes.recto[i], self._colonnes.verso[i])
+
+    def __iter__(self):
+        c = self._colonnes
+        for i in range(self._debut, self._debut + len(self)):
+            yield Paire(c.recto[i], c.verso[i])
+
+    def __repr__(self):
+        return f"<TablePaires {len(self)} paires, {len(self.documents())} document(s)>"
+
+    def ligne_complete(self, i):
+        """(recto, verso, document, page, ligne) de la ligne i."""
+        j = self._index(i)
+        c = self._colonnes
+        code = c.document[j]
+        return c.recto[j], c.verso[j], (c.documents[code] if code >= 0 else None), c.page[j], c.ligne[j]
+
+    def lignes(self):
+        for i in range(len(self)):
+            yield self.ligne_complete(i)
+
+    def dicts(self):
+        """Paires au format historique {"Recto", "Verso"} (JSON, anciens appelants)."""
+        for recto, verso in self:
+            yield {"Recto": recto, "Verso": verso}
+
+    def documents(self):
+        return list(self._colonnes.documents)
+
+    def taille_octets(self):
+        """Mémoire occupée par le stockage (partagé avec les vues)."""
+        c = self._colonnes
+        entiers = sum(a.itemsize * len(a) for a in (c.document, c.page, c.ligne))
+        return c.recto.taille_octets() + c.verso.taille_octets() + entiers